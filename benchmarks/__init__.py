@@ -0,0 +1,33 @@
+"""
+Performance benchmarks for the german_school site.
+
+These are standalone scripts, not part of the test suite. Run them from the
+project root, e.g. ``python -m benchmarks.query_plans``. Unless DATABASE_URL
+is set they work on a throwaway SQLite file so the dev database is untouched.
+"""
+import os
+import tempfile
+
+DEFAULT_BENCH_DB = os.path.join(tempfile.gettempdir(), 'german_school_bench.sqlite3')
+
+
+def tailwind_cdn():
+    """'False' when site.css is built, else 'True': without DEBUG the pages need one of them."""
+    from courses import tailwind
+    return str(not tailwind.is_built())
+
+
+def setup_django(database_url=None, migrate=True):
+    """Point Django at the benchmark database, set it up and migrate it."""
+    os.environ.setdefault('DATABASE_URL', database_url or f"sqlite:///{DEFAULT_BENCH_DB}")
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'german_school.settings')
+    os.environ.setdefault('DEBUG', 'False')
+    os.environ.setdefault('STATIC_MANIFEST_STRICT', 'False')   # no collectstatic needed
+    os.environ.setdefault('TAILWIND_CDN', tailwind_cdn())
+
+    import django
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
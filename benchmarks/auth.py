@@ -0,0 +1,155 @@
+"""
+Cost of authentication, and what an auth flood does to the rest of the site.
+
+1. CPU seconds per `authenticate()` call for each password hasher policy,
+   measured in-process with time.process_time().
+2. A flood of wrong-password logins runs next to normal catalog traffic
+   against gunicorn, first with the auth rate limits off, then on, and
+   catalog throughput / latency and flood outcomes are reported for both.
+
+    python -m benchmarks.seed --flush
+    python -m benchmarks.auth --workers 2 --flood 16 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.load import (RESULTS_DIR, VirtualUser, free_port, git_commit, percentile,
+                             server_env, start_server, stop_server, summarize)
+
+CATALOG_ROUTES = ['home', 'courses', 'course_detail']
+HASHERS = {
+    'pbkdf2': 'courses.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'courses.hashers.ScryptPasswordHasher',
+    'argon2': 'courses.hashers.Argon2PasswordHasher',
+}
+
+
+def hasher_costs(rounds):
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.test.utils import override_settings
+
+    costs = {}
+    for name, preferred in HASHERS.items():
+        hashers = [preferred] + [path for path in HASHERS.values() if path != preferred]
+        with override_settings(PASSWORD_HASHERS=hashers):
+            try:
+                encoded = make_password('bench-password')
+            except ValueError as exc:   # argon2-cffi not installed
+                costs[name] = {'skipped': str(exc)}
+                continue
+            User.objects.filter(username='auth-bench').delete()
+            User.objects.create(username='auth-bench', password=encoded)
+            started = time.process_time()
+            for _ in range(rounds):
+                authenticate(username='auth-bench', password='bench-password')
+            costs[name] = {'cpu_ms_per_auth': round((time.process_time() - started) / rounds * 1000, 1)}
+    User.objects.filter(username='auth-bench').delete()
+    return costs
+
+
+async def flood_user(session, base_url, deadline, outcomes):
+    n = 0
+    while time.monotonic() < deadline:
+        n += 1
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{base_url}/login/", allow_redirects=False,
+                                    data={'username': f'victim{n % 50}', 'password': 'guess'},
+                                    headers={'X-CSRFToken': csrf_cookie(session)}) as resp:
+                await resp.read()
+                status = resp.status
+        except Exception:
+            status = 'error'
+        outcomes['latencies'].append((time.perf_counter() - started) * 1000)
+        outcomes['status'][str(status)] = outcomes['status'].get(str(status), 0) + 1
+
+
+def csrf_cookie(session):
+    return next((c.value for c in session.cookie_jar if c.key == 'csrftoken'), '')
+
+
+async def run_mix(base_url, concurrency, flood, duration, course_ids):
+    import aiohttp
+
+    results = {name: {'latencies': [], 'errors': 0} for name in CATALOG_ROUTES}
+    outcomes = {'latencies': [], 'status': {}}
+    timeout = aiohttp.ClientTimeout(total=60)
+    catalog_sessions = [aiohttp.ClientSession(timeout=timeout) for _ in range(concurrency)]
+    flood_sessions = [aiohttp.ClientSession(timeout=timeout, cookie_jar=aiohttp.CookieJar(unsafe=True))
+                      for _ in range(flood)]
+    try:
+        for session in flood_sessions:
+            async with session.get(f"{base_url}/login/") as resp:
+                await resp.read()
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(VirtualUser(session, base_url, '', '', course_ids, results).run(CATALOG_ROUTES, deadline)
+              for session in catalog_sessions),
+            *(flood_user(session, base_url, deadline, outcomes) for session in flood_sessions),
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        for session in catalog_sessions + flood_sessions:
+            await session.close()
+
+    latencies = sorted(outcomes['latencies'])
+    flood_summary = {
+        'requests': len(latencies),
+        'status': outcomes['status'],
+        'p50_ms': round(percentile(latencies, 50) or 0, 2),
+        'p95_ms': round(percentile(latencies, 95) or 0, 2),
+    }
+    return {**summarize(results, elapsed), 'flood': flood_summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing and auth floods.")
+    parser.add_argument('--rounds', type=int, default=5, help="authenticate() calls per hasher.")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=8, help="Catalog virtual users.")
+    parser.add_argument('--flood', type=int, default=16, help="Concurrent bad-login clients.")
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--database-url')
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    from benchmarks import setup_django
+    setup_django(args.database_url)
+    from courses.models import Course
+
+    report = {'commit': git_commit(), 'hashers': hasher_costs(args.rounds), 'flood': {}}
+    for name, cost in report['hashers'].items():
+        print(f"{name:8} {cost}")
+
+    course_ids = list(Course.objects.values_list('id', flat=True)[:500])
+    if not course_ids:
+        raise SystemExit("Benchmark database is empty; run `python -m benchmarks.seed` first.")
+
+    for label, limits in (('unlimited', {'AUTH_RATE_LIMIT_IP': '', 'AUTH_RATE_LIMIT_USERNAME': ''}),
+                          ('rate_limited', {'AUTH_RATE_LIMIT_IP': '20/m', 'AUTH_RATE_LIMIT_USERNAME': '5/m'})):
+        port = free_port()
+        proc = start_server('gunicorn', port, args.workers, server_env(**limits))
+        try:
+            result = asyncio.run(run_mix(f"http://127.0.0.1:{port}", args.concurrency, args.flood,
+                                         args.duration, course_ids))
+        finally:
+            stop_server(proc)
+        report['flood'][label] = result
+        print(f"\n{label}: catalog {result['total_rps']} req/s; flood {result['flood']}")
+        for route, row in result['routes'].items():
+            print(f"  {route:15} rps {row['rps']:6}  p50 {row['p50_ms']:8}  p95 {row['p95_ms']:8}")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        path = RESULTS_DIR / f"auth-{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json"
+        path.write_text(json.dumps(report, indent=2))
+        print(f"saved {path}")
+
+
+if __name__ == '__main__':
+    main()
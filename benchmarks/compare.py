@@ -0,0 +1,59 @@
+"""
+Compare two load-test result files written by ``benchmarks.load``.
+
+    python -m benchmarks.compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+With a single argument the newest file in benchmarks/results/ is compared
+against it.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from benchmarks.load import RESULTS_DIR
+
+METRICS = ('rps', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+
+def change(old, new):
+    if not old:
+        return '     n/a'
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show per-route deltas between two load-test runs.")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate', nargs='?', help="Defaults to the newest saved result.")
+    args = parser.parse_args()
+
+    candidate = args.candidate
+    if not candidate:
+        saved = sorted(RESULTS_DIR.glob('*.json'))
+        if not saved:
+            sys.exit("No saved results in benchmarks/results/.")
+        candidate = saved[-1]
+
+    old, new = load(args.baseline), load(candidate)
+    print(f"baseline:  {old['commit']} {old['timestamp']} {old.get('label', '')}")
+    print(f"candidate: {new['commit']} {new['timestamp']} {new.get('label', '')}")
+    if old['config'] != new['config']:
+        print(f"note: configs differ: {old['config']} vs {new['config']}")
+    print()
+    print(f"{'route':15} " + ' '.join(f"{m:>22}" for m in METRICS))
+    for name in sorted(set(old['routes']) | set(new['routes'])):
+        before, after = old['routes'].get(name), new['routes'].get(name)
+        if not before or not after:
+            print(f"{name:15} only in {'candidate' if after else 'baseline'}")
+            continue
+        cells = [f"{before[m]:>6} -> {after[m]:>6} {change(before[m], after[m])}" for m in METRICS]
+        print(f"{name:15} " + ' '.join(f"{c:>22}" for c in cells))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Enrollment rush: many students enroll in one small course at the same time.
+
+Each thread enrolls one student (some immediately drop the course again, so
+waitlist promotion races with new enrollments), all released together by a
+barrier. Afterwards the seat count must equal the number of enrolled
+registrations and never exceed capacity.
+
+    DATABASE_URL=postgres://... python -m benchmarks.enrollment --students 500 --capacity 50
+
+On SQLite writers are serialised by the database lock, so this mostly
+measures lock waits; run it against PostgreSQL to exercise the row locks.
+"""
+import argparse
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent enrollments into one course.")
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--capacity', type=int, default=20)
+    parser.add_argument('--drop-every', type=int, default=4,
+                        help="Every Nth student drops the course right after enrolling (0 = none).")
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    from benchmarks import setup_django
+    setup_django(args.database_url)
+
+    from django.db import connection
+
+    from courses import enrollment
+    from courses.models import Course, Registration, Student
+
+    code = f"RUSH{int(time.time()) % 100000}"
+    course = Course.objects.create(title=f"Enrollment rush {code}", code=code, level='A1',
+                                   duration_weeks=4, description='Benchmark', capacity=args.capacity)
+    students = Student.objects.bulk_create(
+        Student(full_name=f"Rush {code} {i}", email=f"rush{i}@bench.example", phone='+49')
+        for i in range(args.students)
+    )
+    barrier = threading.Barrier(len(students))
+    errors = []
+    latencies = []
+
+    def run(n, student):
+        try:
+            barrier.wait()
+            started = time.perf_counter()
+            registration, _ = enrollment.enroll(student, course)
+            if args.drop_every and n % args.drop_every == 0:
+                registration.delete()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception as exc:
+            errors.append(f"{type(exc).__name__}: {exc}")
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(n, student)) for n, student in enumerate(students)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    course.refresh_from_db()
+    statuses = Registration.objects.filter(course=course)
+    enrolled = statuses.filter(status='enrolled').count()
+    waitlisted = statuses.filter(status='waitlisted').count()
+    latencies.sort()
+
+    print(f"{connection.vendor}: {len(students)} students, capacity {args.capacity}, "
+          f"{elapsed:.2f}s ({len(latencies) / elapsed:.0f} enrollments/s)")
+    if latencies:
+        print(f"p50 {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms")
+    print(f"enrolled {enrolled}, waitlisted {waitlisted}, enrolled_count {course.enrolled_count}, "
+          f"errors {len(errors)}")
+    for error in sorted(set(errors))[:5]:
+        print(f"  {error}")
+
+    oversold = enrolled > args.capacity or course.enrolled_count != enrolled
+    idle_seats = waitlisted and enrolled < args.capacity
+    if oversold or idle_seats:
+        raise SystemExit("FAIL: seat accounting is inconsistent")
+    print("OK: no oversell")
+
+
+if __name__ == '__main__':
+    main()
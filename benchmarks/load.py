@@ -0,0 +1,299 @@
+"""
+Concurrent load driver for the public pages.
+
+Starts the site under gunicorn (sync or uvicorn workers, or uvicorn / runserver) against the benchmark
+database, runs `--concurrency` virtual users for `--duration` seconds, and
+reports throughput and p50/p95/p99 latency per route. Results are saved as
+JSON under benchmarks/results/ (named by time and git commit) so runs can be
+compared with ``python -m benchmarks.compare``.
+
+    python -m benchmarks.seed --flush
+    python -m benchmarks.load --server gunicorn --workers 4 --concurrency 32
+
+Each virtual user logs in as one of the seeded bench<N> users, then loops
+over ROUTES in a shuffled order.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import tailwind_cdn
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# name -> (method, path template). Every virtual user is logged in.
+ROUTES = {
+    'home': ('GET', '/'),
+    'courses': ('GET', '/courses/'),
+    'course_detail': ('GET', '/course/{course_id}/'),
+    'register': ('GET', '/register/'),
+    'login': ('POST', '/login/'),
+    'profile': ('GET', '/profile/'),
+    'select_course': ('GET', '/select-course/{course_id}/'),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server, port, workers):
+    bind = f"127.0.0.1:{port}"
+    if server == 'gunicorn':
+        return ['gunicorn', 'german_school.wsgi:application', '-b', bind, '-w', str(workers),
+                '--log-level', 'warning']
+    if server == 'gunicorn-uvicorn':
+        return ['gunicorn', 'german_school.asgi:application', '-b', bind, '-w', str(workers),
+                '-k', 'uvicorn.workers.UvicornWorker', '--log-level', 'warning']
+    if server == 'uvicorn':
+        return ['uvicorn', 'german_school.asgi:application', '--host', '127.0.0.1',
+                '--port', str(port), '--workers', str(workers), '--log-level', 'warning']
+    return [sys.executable, 'manage.py', 'runserver', bind, '--noreload']
+
+
+def server_env(**overrides):
+    # Every virtual user logs in from 127.0.0.1, so the auth rate limits are off by default.
+    env = dict(os.environ, DEBUG='False', SLOW_REQUEST_MS='100000')
+    env.setdefault('STATIC_MANIFEST_STRICT', 'False')
+    env.setdefault('TAILWIND_CDN', tailwind_cdn())
+    env.setdefault('AUTH_RATE_LIMIT_IP', '')
+    env.setdefault('AUTH_RATE_LIMIT_USERNAME', '')
+    env.update(overrides)
+    return env
+
+
+def start_server(server, port, workers, env):
+    proc = subprocess.Popen(server_command(server, port, workers), cwd=ROOT_DIR, env=env,
+                            start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit(f"{server} exited with code {proc.returncode}")
+            time.sleep(0.2)
+    stop_server(proc)
+    raise SystemExit(f"{server} did not start listening on port {port}")
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+class VirtualUser:
+    def __init__(self, session, base_url, username, password, course_ids, results):
+        self.session = session
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.course_ids = course_ids
+        self.results = results
+
+    @property
+    def csrf_token(self):
+        # Django rotates the token on login, so always send the current cookie.
+        return next((c.value for c in self.session.cookie_jar if c.key == 'csrftoken'), '')
+
+    async def login(self):
+        async with self.session.get(f"{self.base_url}/login/") as resp:
+            await resp.read()
+        data = {'csrfmiddlewaretoken': self.csrf_token,
+                'username': self.username, 'password': self.password}
+        async with self.session.post(f"{self.base_url}/login/", data=data,
+                                     allow_redirects=False) as resp:
+            await resp.read()
+            if resp.status != 302:
+                raise RuntimeError(f"login failed for {self.username}: HTTP {resp.status}")
+
+    async def hit(self, name):
+        method, path = ROUTES[name]
+        url = self.base_url + path.format(course_id=random.choice(self.course_ids))
+        kwargs = {'allow_redirects': False}
+        if method == 'POST':
+            kwargs['data'] = {'csrfmiddlewaretoken': self.csrf_token,
+                              'username': self.username, 'password': self.password}
+
+        started = time.perf_counter()
+        try:
+            async with self.session.request(method, url, **kwargs) as resp:
+                await resp.read()
+                ok = resp.status < 400
+        except Exception:
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        bucket = self.results[name]
+        bucket['latencies'].append(elapsed_ms)
+        if not ok:
+            bucket['errors'] += 1
+
+    async def run(self, routes, deadline):
+        while time.monotonic() < deadline:
+            order = list(routes)
+            random.shuffle(order)
+            for name in order:
+                if time.monotonic() >= deadline:
+                    return
+                await self.hit(name)
+
+
+async def drive(base_url, routes, concurrency, duration, users, course_ids, password):
+    import aiohttp
+
+    results = {name: {'latencies': [], 'errors': 0} for name in routes}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+    sessions = [aiohttp.ClientSession(connector=connector, connector_owner=False, timeout=timeout,
+                                      cookie_jar=aiohttp.CookieJar(unsafe=True))
+                for _ in range(concurrency)]
+    virtual_users = [VirtualUser(session, base_url, users[n % len(users)], password,
+                                 course_ids, results)
+                     for n, session in enumerate(sessions)]
+    try:
+        # Log everyone in before the clock starts; password hashing is
+        # deliberately slow and would otherwise dominate short runs.
+        await asyncio.gather(*(user.login() for user in virtual_users))
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(user.run(routes, deadline) for user in virtual_users))
+        elapsed = time.perf_counter() - started
+    finally:
+        for session in sessions:
+            await session.close()
+        await connector.close()
+    return results, elapsed
+
+
+def summarize(results, elapsed):
+    routes = {}
+    total = 0
+    for name, bucket in results.items():
+        latencies = sorted(bucket['latencies'])
+        total += len(latencies)
+        routes[name] = {
+            'requests': len(latencies),
+            'errors': bucket['errors'],
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) or 0, 2),
+            'p95_ms': round(percentile(latencies, 95) or 0, 2),
+            'p99_ms': round(percentile(latencies, 99) or 0, 2),
+        }
+    return {'total_requests': total, 'total_rps': round(total / elapsed, 1), 'routes': routes}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the site's public routes.")
+    parser.add_argument('--server', choices=['gunicorn', 'gunicorn-uvicorn', 'uvicorn',
+                                             'runserver', 'external'],
+                        default='gunicorn')
+    parser.add_argument('--url', help="Base URL when --server=external.")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20, help="Seconds.")
+    parser.add_argument('--routes', default=','.join(ROUTES),
+                        help="Comma-separated subset of: " + ', '.join(ROUTES))
+    parser.add_argument('--label', default='', help="Free text stored with the results.")
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URL or a temp SQLite file.")
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    routes = [name.strip() for name in args.routes.split(',') if name.strip()]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    from benchmarks import setup_django
+    from benchmarks.seed import BENCH_PASSWORD
+    setup_django(args.database_url)
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from courses.models import Course
+
+    course_ids = list(Course.objects.values_list('id', flat=True)[:500])
+    users = list(User.objects.filter(username__startswith='bench', student__isnull=False)
+                 .values_list('username', flat=True)[:args.concurrency])
+    if not course_ids or not users:
+        raise SystemExit("Benchmark database is empty; run `python -m benchmarks.seed` first.")
+
+    proc = None
+    if args.server == 'external':
+        if not args.url:
+            parser.error("--url is required with --server=external")
+        base_url = args.url.rstrip('/')
+    else:
+        port = free_port()
+        env = server_env()
+        if 'uvicorn' in args.server:
+            env.setdefault('DB_CONN_MAX_AGE', '0')  # see german_school/asgi.py
+        proc = start_server(args.server, port, args.workers, env)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        results, elapsed = asyncio.run(drive(base_url, routes, args.concurrency, args.duration,
+                                             users, course_ids, BENCH_PASSWORD))
+    finally:
+        if proc:
+            stop_server(proc)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'label': args.label,
+        'config': {'server': args.server, 'workers': args.workers,
+                   'concurrency': args.concurrency, 'duration': args.duration,
+                   'courses': Course.objects.count(),
+                   'db_vendor': connection.vendor,
+                   'db_pool_mode': os.environ.get('DB_POOL_MODE', 'persistent')},
+        **summarize(results, elapsed),
+    }
+
+    print(f"{'route':15} {'reqs':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, row in report['routes'].items():
+        print(f"{name:15} {row['requests']:7} {row['errors']:5} {row['rps']:8} "
+              f"{row['p50_ms']:8} {row['p95_ms']:8} {row['p99_ms']:8}")
+    print(f"\ntotal: {report['total_requests']} requests, {report['total_rps']} req/s")
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = RESULTS_DIR / f"{stamp}-{report['commit']}.json"
+        path.write_text(json.dumps(report, indent=2))
+        print(f"saved {path.relative_to(ROOT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
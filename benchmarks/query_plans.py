@@ -0,0 +1,66 @@
+"""
+Show the query plan and timing of the hot Registration / Feedback / User
+lookups on a large dataset, to confirm they use the indexes from migration
+courses/0005.
+
+    python -m benchmarks.query_plans --registrations 1000000
+
+Seeds only when the database has fewer registrations than requested.
+"""
+import argparse
+import time
+
+from benchmarks import setup_django
+
+
+def timed(qs_call, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        qs_call()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--registrations', type=int, default=1_000_000)
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URL or a temp SQLite file.")
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+
+    from django.contrib.auth.models import User
+    from django.db.models import Value
+    from django.db.models.functions import Upper
+
+    from benchmarks.seed import seed
+    from courses.models import Feedback, Registration
+
+    missing = args.registrations - Registration.objects.count()
+    if missing > 0:
+        students = max(missing // 4, 1)
+        seed(courses=200, students=students, registrations=missing, feedback=students,
+             users=min(students, 10_000))
+
+    reg = Registration.objects.order_by('-id').first()
+    queries = {
+        'course_detail: enrolled?': lambda: Registration.objects.filter(
+            student_id=reg.student_id, course_id=reg.course_id),
+        'enrolled course ids': lambda: Registration.objects.filter(
+            student_id=reg.student_id).values_list('course_id', flat=True),
+        'homepage testimonials': lambda: Feedback.objects.filter(
+            is_approved=True).order_by('-created_at')[:6],
+        'register: email taken?': lambda: User.objects.alias(
+            email_upper=Upper('email')).filter(email_upper=Upper(Value('bench42@bench.example'))),
+    }
+
+    print(f"{Registration.objects.count()} registrations, {Feedback.objects.count()} feedback rows\n")
+    for name, build in queries.items():
+        print(f"== {name}")
+        print(build().explain())
+        print(f"best of 20: {timed(lambda: list(build())):.3f} ms\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Time catalog full-text search on a large course table.
+
+    python -m benchmarks.search --courses 100000
+
+Seeds only when the database has fewer courses than requested. Target: every
+query under 10 ms.
+"""
+import argparse
+
+from benchmarks import setup_django
+from benchmarks.query_plans import timed
+
+QUERIES = ('grammar', 'gram', 'speaking a2', 'goethe', 'cohort 4242', 'exam prep telc', 'BC99')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--courses', type=int, default=100_000)
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URL or a temp SQLite file.")
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+
+    from benchmarks.seed import seed
+    from courses.models import Course
+    from courses.search import search_courses
+
+    missing = args.courses - Course.objects.count()
+    if missing > 0:
+        seed(courses=missing, students=0, registrations=0, feedback=0)
+
+    print(f"{Course.objects.count()} courses\n")
+    worst = 0
+    for query in QUERIES:
+        results = search_courses(query)
+        ms = timed(lambda: search_courses(query))
+        worst = max(worst, ms)
+        print(f"{query!r:20} {len(results):3} results  best of 20: {ms:.2f} ms")
+    print(f"\nslowest query: {worst:.2f} ms ({'OK' if worst < 10 else 'over the 10 ms target'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Bulk data seeder for benchmarks.
+
+Rows are generated lazily and written with bulk_create in batches, so memory
+stays flat however many rows are requested.
+
+    python -m benchmarks.seed --courses 500 --students 20000 --users 200
+
+Seeded users are named bench0, bench1, ... and share BENCH_PASSWORD.
+"""
+import argparse
+import itertools
+import math
+import time
+
+
+LEVEL_CODES = ('A1', 'A2', 'B1', 'B2')
+BENCH_PASSWORD = 'bench-password'
+TOPICS = ('Grammar', 'Speaking', 'Listening', 'Writing', 'Vocabulary', 'Pronunciation',
+          'Business', 'Travel', 'Exam Prep', 'Conversation', 'Reading', 'Culture')
+WORDS = ('cases', 'articles', 'verbs', 'dialogues', 'letters', 'interviews', 'news',
+         'podcasts', 'idioms', 'prepositions', 'numbers', 'shopping', 'office', 'Goethe', 'TELC')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _bulk(model, rows, batch_size):
+    total = 0
+    for batch in batched(rows, batch_size):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        total += len(batch)
+    return total
+
+
+def seed(courses=100, students=10_000, registrations=40_000, feedback=10_000, users=0,
+         batch_size=5_000, log=print):
+    """
+    Insert the given number of rows on top of whatever is already there.
+
+    The first `users` new students get a login (bench<N> / BENCH_PASSWORD).
+    Each student is enrolled in up to ceil(registrations / students) distinct
+    courses, so the unique (student, course) constraint holds.
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    from courses import enrollment, rollups
+    from courses.models import Course, Feedback, Registration, Student
+
+    started = time.perf_counter()
+    course_offset = Course.objects.count()
+    student_offset = Student.objects.count()
+    user_offset = User.objects.filter(username__startswith='bench').count()
+
+    _bulk(Course, (
+        Course(title=f"{TOPICS[i % len(TOPICS)]} {LEVEL_CODES[i % 4]} cohort {i}", code=f"BC{i}",
+               level=LEVEL_CODES[i % 4], duration_weeks=4 + i % 12,
+               description=(f"Benchmark course {i}: {WORDS[i % len(WORDS)]}, "
+                            f"{WORDS[(i * 7) % len(WORDS)]} and {WORDS[(i * 11) % len(WORDS)]}."),
+               price=1000 + (i % 50) * 100)
+        for i in range(course_offset, course_offset + courses)
+    ), batch_size)
+    log(f"courses: {courses}")
+
+    users = min(users, students)
+    password = make_password(BENCH_PASSWORD)   # hashed once, shared by every bench user
+    _bulk(User, (
+        User(username=f"bench{i}", email=f"Bench{i}@Bench.Example", password=password)
+        for i in range(user_offset, user_offset + users)
+    ), batch_size)
+    user_ids = list(User.objects.filter(username__startswith='bench')
+                    .order_by('id').values_list('id', flat=True)[user_offset:])
+    log(f"users: {users}")
+
+    _bulk(Student, (
+        Student(full_name=f"Bench Student {i}", email=f"student{i}@bench.example",
+                phone=f"+49170{i:07d}",
+                user_id=user_ids[n] if n < len(user_ids) else None)
+        for n, i in enumerate(range(student_offset, student_offset + students))
+    ), batch_size)
+    log(f"students: {students}")
+
+    course_ids = list(Course.objects.order_by('id').values_list('id', flat=True)[course_offset:])
+    student_ids = list(Student.objects.order_by('id').values_list('id', flat=True)[student_offset:])
+
+    if registrations and student_ids and course_ids:
+        per_student = min(math.ceil(registrations / len(student_ids)), len(course_ids))
+        pairs = (
+            (sid, course_ids[(n + k * 7) % len(course_ids)])
+            for n, sid in enumerate(student_ids)
+            for k in range(per_student)
+        )
+        created = _bulk(Registration, (
+            Registration(student_id=sid, course_id=cid)
+            for sid, cid in itertools.islice(pairs, registrations)
+        ), batch_size)
+        enrollment.recount(Course.objects.filter(id__in=course_ids))   # bulk_create skips seat accounting
+        for _ in rollups.backfill(start=timezone.localdate(), end=timezone.localdate()):   # and the rollups
+            pass
+        log(f"registrations: {created}")
+
+    if feedback and student_ids:
+        created = _bulk(Feedback, (
+            Feedback(student_id=student_ids[n % len(student_ids)], rating=1 + n % 5,
+                     message=f"Benchmark feedback {n}", is_approved=n % 10 == 0)
+            for n in range(feedback)
+        ), batch_size)
+        log(f"feedback: {created}")
+
+    log(f"seeded in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    from benchmarks import setup_django
+
+    parser = argparse.ArgumentParser(description="Seed the benchmark database.")
+    parser.add_argument('--courses', type=int, default=500)
+    parser.add_argument('--students', type=int, default=20_000)
+    parser.add_argument('--registrations', type=int, default=80_000)
+    parser.add_argument('--feedback', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=200, help="Students that get a login.")
+    parser.add_argument('--batch-size', type=int, default=5_000)
+    parser.add_argument('--flush', action='store_true', help="Empty the database first.")
+    parser.add_argument('--database-url', help="Defaults to DATABASE_URL or a temp SQLite file.")
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+    if args.flush:
+        from django.core.management import call_command
+        call_command('flush', interactive=False, verbosity=0)
+
+    seed(courses=args.courses, students=args.students, registrations=args.registrations,
+         feedback=args.feedback, users=args.users, batch_size=args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Database queries per request for each session mode.
+
+Logs a seeded bench user in under every SESSION_ENGINE and counts the queries
+each page runs, with a warm catalog cache, so only the per-user work is left.
+
+    python -m benchmarks.seed --flush
+    python -m benchmarks.sessions
+"""
+import argparse
+
+MODES = ['db', 'cached_db', 'cache', 'signed_cookies']
+PAGES = [
+    ('home', '/'),
+    ('courses', '/courses/'),
+    ('course_detail', '/course/{course_id}/'),
+    ('profile', '/profile/'),
+    ('about', '/about/'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count queries per page for each session mode.")
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    from benchmarks import setup_django
+    setup_django(args.database_url)
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+
+    from courses.models import Course
+
+    user = User.objects.filter(username__startswith='bench', student__isnull=False).first()
+    if user is None:
+        raise SystemExit("No bench users; run `python -m benchmarks.seed` first.")
+    course_id = Course.objects.values_list('id', flat=True).first()
+
+    print(f"{'page':15}" + ''.join(f"{mode:>16}" for mode in MODES))
+    counts = {}
+    for mode in MODES:
+        with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{mode}'):
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            for name, path in PAGES:
+                url = path.format(course_id=course_id)
+                client.get(url)   # warm the catalog cache
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(url)
+                counts[name, mode] = len(ctx.captured_queries)
+    for name, _ in PAGES:
+        print(f"{name:15}" + ''.join(f"{counts[name, mode]:>16}" for mode in MODES))
+
+
+if __name__ == '__main__':
+    main()
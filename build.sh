@@ -0,0 +1,19 @@
+#!/usr/bin/env bash
+# Render build command: ./build.sh
+set -o errexit
+
+# Tailwind v3 standalone CLI for `manage.py build_css` (courses/tailwind.py)
+TAILWIND_VERSION=${TAILWIND_VERSION:-v3.4.17}
+export TAILWIND_CLI=${TAILWIND_CLI:-./bin/tailwindcss}
+
+pip install -r requirements.txt
+
+if [ ! -x "$TAILWIND_CLI" ]; then
+  mkdir -p "$(dirname "$TAILWIND_CLI")"
+  curl -sSfL -o "$TAILWIND_CLI" \
+    "https://github.com/tailwindlabs/tailwindcss/releases/download/${TAILWIND_VERSION}/tailwindcss-linux-x64"
+  chmod +x "$TAILWIND_CLI"
+fi
+
+python manage.py build_css
+python manage.py collectstatic --no-input
@@ -1,25 +1,217 @@
-from django.contrib import admin
-from .models import Course, Student, Registration, Feedback
+from datetime import date, timedelta
+
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from . import announcements, enrollment, moderation, rollups
+from .exports import CSVExportMixin
+from .models import Announcement, Course, Student, Registration, Feedback, Notification
+from .notifications import configured_provider
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('title', 'code', 'level', 'duration_weeks', 'price')
+    list_display = ('title', 'code', 'level', 'duration_weeks', 'price', 'capacity', 'enrolled_count')
     search_fields = ('title', 'code')
+    readonly_fields = ('enrolled_count',)
+    actions = ['send_announcement']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'capacity' in form.changed_data:
+            enrollment.fill_seats(obj.pk)
+
+    @admin.action(description="Send an announcement to registered students", permissions=['change'])
+    def send_announcement(self, request, queryset):
+        """Ask for the message, then queue it; `manage.py send_announcements` delivers it."""
+        message = request.POST.get('message', '').strip()
+        if not (request.POST.get('confirm') and message):
+            return TemplateResponse(request, 'admin/courses/course/announce.html', {
+                **self.admin_site.each_context(request),
+                'opts': self.model._meta,
+                'title': "Send an announcement",
+                'queryset': queryset,
+                'message': message,
+            })
+        provider = configured_provider()
+        if provider is None:
+            self.message_user(request, "No WhatsApp provider is configured.", messages.ERROR)
+            return None
+        for course in queryset:
+            announcements.announce(course, message, provider)
+        self.message_user(request, f"Queued an announcement for {len(queryset)} course(s).",
+                          messages.SUCCESS)
+        return None
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'email', 'phone')
 
 @admin.register(Registration)
-class RegistrationAdmin(admin.ModelAdmin):
-    list_display = ('student', 'course', 'registered_at')
-    list_filter = ('registered_at',)
-    
-    
+class RegistrationAdmin(CSVExportMixin, admin.ModelAdmin):
+    list_display = ('student', 'course', 'status', 'registered_at')
+    list_filter = ('status', 'registered_at')
+    list_select_related = ('student', 'course')
+    change_list_template = 'admin/courses/registration/change_list.html'
+    export_date_field = 'registered_at'
+    export_columns = (
+        ('id', 'id'),
+        ('student', 'student__full_name'),
+        ('email', 'student__email'),
+        ('phone', 'student__phone'),
+        ('course_code', 'course__code'),
+        ('course', 'course__title'),
+        ('status', 'status'),
+        ('registered_at', 'registered_at'),
+        ('notes', 'notes'),
+    )
+
+    # Seats are counted per course, so a registration can't be moved or re-statused by hand.
+    def get_readonly_fields(self, request, obj=None):
+        return ('student', 'course', 'status') if obj else ('status',)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            super().save_model(request, obj, form, change)
+        else:
+            enrollment.add_registration(obj)
+
+    def get_urls(self):
+        return [
+            path('stats/', self.admin_site.admin_view(self.stats_view),
+                 name='courses_registration_stats'),
+        ] + super().get_urls()
+
+    def stats_view(self, request):
+        """Registrations and revenue per day, level and course, from the daily rollups."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        end = _parse_date(request.GET.get('to')) or timezone.localdate()
+        start = _parse_date(request.GET.get('from')) or end - timedelta(days=29)
+        if start > end or (end - start).days > 366 * 5:
+            start = end - timedelta(days=29)
+        level = request.GET.get('level') if request.GET.get('level') in dict(Course.LEVELS) else None
+        course_id = request.GET.get('course', '')
+        course_id = int(course_id) if course_id.isdigit() else None
+        return TemplateResponse(request, 'admin/courses/registration/stats.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Enrollment stats",
+            'start': start,
+            'end': end,
+            'level': level,
+            'levels': Course.LEVELS,
+            'course': Course.objects.filter(pk=course_id).first() if course_id else None,
+            **rollups.dashboard(start, end, level=level, course_id=course_id),
+        })
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+class FeedbackChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        # Only the changelist shows a preview; the change form still loads the full message.
+        return moderation.with_preview(super().get_queryset(request, exclude_parameters))
+
 
 @admin.register(Feedback)
-class FeedbackAdmin(admin.ModelAdmin):
-    list_display = ('student', 'rating', 'message', 'is_approved', 'created_at')
-    list_filter = ('rating', 'is_approved')
-    search_fields = ('student__full_name', 'message')
+class FeedbackAdmin(CSVExportMixin, admin.ModelAdmin):
+    list_display = ('student', 'rating', 'message_preview', 'is_approved', 'reviewed_at', 'created_at')
+    list_filter = ('is_approved', 'rating')
+    search_fields = ('message', 'student__full_name')   # see get_search_results
+    list_select_related = ('student',)
+    show_full_result_count = False   # no second COUNT(*) over the whole table when filtering
+    change_list_template = 'admin/courses/feedback/change_list.html'
+    actions = CSVExportMixin.actions + ['approve_selected', 'reject_selected']
+    export_date_field = 'created_at'
+    export_columns = (
+        ('id', 'id'),
+        ('student', 'student__full_name'),
+        ('email', 'student__email'),
+        ('rating', 'rating'),
+        ('message', 'message'),
+        ('is_approved', 'is_approved'),
+        ('created_at', 'created_at'),
+    )
+
+    def get_urls(self):
+        return [
+            path('moderation/', self.admin_site.admin_view(self.moderation_view),
+                 name='courses_feedback_moderation'),
+        ] + super().get_urls()
+
+    def get_changelist(self, request, **kwargs):
+        return FeedbackChangeList
+
+    @admin.display(description='message')
+    def message_preview(self, obj):
+        preview = obj.message_preview
+        return preview + '…' if len(preview) == moderation.PREVIEW_LENGTH else preview
+
+    def get_search_results(self, request, queryset, search_term):
+        return moderation.search(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        if 'is_approved' in form.changed_data:
+            obj.reviewed_at = timezone.now()
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description="Approve selected feedback", permissions=['change'])
+    def approve_selected(self, request, queryset):
+        count = moderation.review(queryset, approve=True)
+        self.message_user(request, f"Approved {count} feedback.", messages.SUCCESS)
+
+    @admin.action(description="Reject selected feedback", permissions=['change'])
+    def reject_selected(self, request, queryset):
+        count = moderation.review(queryset, approve=False)
+        self.message_user(request, f"Rejected {count} feedback.", messages.SUCCESS)
+
+    def moderation_view(self, request):
+        """Unreviewed feedback, newest first; approve or reject the ticked rows."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        if request.method == 'POST':
+            decision = request.POST.get('decision')
+            if decision not in ('approve', 'reject'):
+                return HttpResponseBadRequest("Unknown decision.")
+            ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+            approve = decision == 'approve'
+            count = moderation.review(Feedback.objects.filter(pk__in=ids), approve)
+            self.message_user(request, f"{'Approved' if approve else 'Rejected'} {count} feedback.",
+                              messages.SUCCESS)
+            return redirect(request.get_full_path())
+
+        before = moderation.decode_cursor(request.GET.get('before'))
+        rows, next_cursor = moderation.queue_page(before)
+        return TemplateResponse(request, 'admin/courses/feedback/moderation.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Feedback awaiting review",
+            'rows': rows,
+            'next_cursor': next_cursor,
+            'is_first_page': before is None,
+        })
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('to_number', 'provider', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'provider')
+    raw_id_fields = ('announcement',)
+
 
+@admin.register(Announcement)
+class AnnouncementAdmin(admin.ModelAdmin):
+    list_display = ('course', 'message', 'provider', 'status', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    list_select_related = ('course',)
+    readonly_fields = ('status', 'finished_at')
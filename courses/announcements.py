@@ -0,0 +1,200 @@
+"""
+Course announcements: one WhatsApp message to everyone registered for a course.
+
+The "Send an announcement" action on the course admin only inserts an
+`Announcement`. `manage.py send_announcements` then does the work in two
+steps, both safe to interrupt and rerun:
+
+  1. fan_out() streams the course's registrations in id order, in chunks of
+     ANNOUNCEMENT_CHUNK_SIZE, and inserts one pending `Notification` per
+     phone number. The last registration id handled is saved with each
+     chunk, and the unique (announcement, to_number) constraint drops
+     duplicates, so a rerun continues where the last one stopped.
+  2. send() claims those notifications in batches (the outbox lease from
+     courses/notifications.py) and posts them concurrently over one aiohttp
+     session, at most ANNOUNCEMENT_CONCURRENCY at a time and no faster than
+     the provider's ANNOUNCEMENT_RATE_LIMITS allow. A batch is leased for
+     as long as sending all of it can take (send_lease_seconds), and its
+     results are written before the next is claimed, so a crash resends at
+     most the batch in flight once its lease expires.
+
+Only one send_announcements runs at a time (exclusive()): the rate limit
+is kept per process, and two runs would share the providers' limits. On
+PostgreSQL that is a session advisory lock, which PgBouncer's transaction
+pooling can't hold (the lock and the unlock may reach different server
+connections), so with DB_POOL_MODE=pgbouncer the command refuses to run;
+run it with DB_POOL_MODE=persistent and a DATABASE_URL that bypasses
+PgBouncer.
+Failed sends are retried with the outbox's backoff by later runs; the
+announcement is done when none of its notifications is pending.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+import aiohttp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Announcement, Notification, Registration
+from .notifications import RESULT_FIELDS, adeliver, claim_batch, record_result
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# pg_try_advisory_lock key of send_announcements ("anno")
+LOCK_ID = 0x616e6e6f
+
+
+@contextmanager
+def exclusive():
+    """
+    Yields True if no other send_announcements holds the lock, else False.
+    PostgreSQL uses a session advisory lock; other backends (a SQLite file
+    lives on one host) a lock file in the temp directory. Raises
+    ImproperlyConfigured behind PgBouncer, where the session lock isn't held.
+    """
+    if settings.DB_POOL_MODE == 'pgbouncer':
+        raise ImproperlyConfigured(
+            "send_announcements needs a session advisory lock, which PgBouncer's transaction "
+            "pooling can't hold. Run it with DB_POOL_MODE=persistent and a direct DATABASE_URL.")
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [LOCK_ID])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [LOCK_ID])
+        return
+
+    import fcntl
+
+    database = hashlib.sha1(str(connection.settings_dict['NAME']).encode()).hexdigest()[:12]
+    path = os.path.join(tempfile.gettempdir(), f"send_announcements-{database}.lock")
+    with open(path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def send_lease_seconds(batch_size, rate, concurrency):
+    """
+    How long one claimed batch may take: the rate limit's pace or, if
+    slower, every round of `concurrency` sends taking the full timeout,
+    plus one timeout of margin.
+    """
+    timeout = settings.NOTIFICATION_TIMEOUT
+    return max(math.ceil(batch_size / rate), math.ceil(batch_size / concurrency) * timeout) + timeout
+
+
+def announce(course, message, provider):
+    """Queue an announcement; nothing is sent until send_announcements runs."""
+    return Announcement.objects.create(course=course, message=message, provider=provider)
+
+
+def fan_out(announcement, chunk_size=None):
+    """Create the missing recipient notifications; returns how many were added."""
+    chunk_size = chunk_size or settings.ANNOUNCEMENT_CHUNK_SIZE
+    added = 0
+    while True:
+        chunk = list(Registration.objects
+                     .filter(course_id=announcement.course_id, pk__gt=announcement.fanned_out_to)
+                     .exclude(student__phone='')
+                     .order_by('pk').values_list('pk', 'student__phone')[:chunk_size])
+        if not chunk:
+            return added
+        with transaction.atomic():
+            created = Notification.objects.bulk_create([
+                Notification(announcement=announcement, provider=announcement.provider,
+                             to_number=phone, message=announcement.message)
+                for _, phone in chunk
+            ], ignore_conflicts=True)
+            announcement.fanned_out_to = chunk[-1][0]
+            announcement.status = 'sending'
+            announcement.save(update_fields=['fanned_out_to', 'status'])
+        added += len(created)
+
+
+async def send(announcement, batch_size=None, concurrency=None):
+    """
+    Deliver the announcement's due notifications. Returns a dict of counts:
+    sent, retried, failed.
+    """
+    batch_size = batch_size or settings.ANNOUNCEMENT_CHUNK_SIZE
+    concurrency = concurrency or settings.ANNOUNCEMENT_CONCURRENCY
+    rate = settings.ANNOUNCEMENT_RATE_LIMITS[announcement.provider]
+    lease = send_lease_seconds(batch_size, rate, concurrency)
+    bucket = TokenBucket(rate)
+    slots = asyncio.Semaphore(concurrency)
+
+    async def deliver(notification, session):
+        async with slots:
+            await bucket.acquire()
+            return await adeliver(notification, session)
+
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    timeout = aiohttp.ClientTimeout(total=settings.NOTIFICATION_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        while batch := await sync_to_async(claim_batch)(batch_size, announcement, lease):
+            results = await asyncio.gather(*(deliver(n, session) for n in batch))
+            now = timezone.now()
+            for notification, (ok, error) in zip(batch, results):
+                counts[record_result(notification, ok, error, now)] += 1
+            await Notification.objects.abulk_update(batch, RESULT_FIELDS)
+    return counts
+
+
+def finish(announcement):
+    """Mark the announcement done once every recipient is sent or has failed for good."""
+    if announcement.notifications.filter(status='pending').exists():
+        return False
+    announcement.status = 'done'
+    announcement.finished_at = timezone.now()
+    announcement.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+async def process(announcement, batch_size=None, concurrency=None):
+    """fan_out(), send() and finish() one announcement; returns send()'s counts."""
+    await sync_to_async(fan_out)(announcement, batch_size)
+    counts = await send(announcement, batch_size, concurrency)
+    await sync_to_async(finish)(announcement)
+    return counts
@@ -0,0 +1,130 @@
+"""
+Read-only JSON catalog API for the mobile app.
+
+    GET /api/courses/?level=A1&after=<cursor>   one page, in (level, id) order
+    GET /api/courses/<id>/
+
+Rows are serialized straight from `.values()`, without building model
+instances or rendering templates. Every response has an ETag, worked out
+before the view runs, so a client or CDN revalidating an unchanged resource
+gets a 304 and the page query never runs:
+
+  - a list's ETag is the number of courses it filters and their latest
+    updated_at, in one query on the (level, updated_at) index. Every save
+    and seat change sets updated_at (courses/enrollment.py), a delete
+    changes the count, and a seat taken in B1 leaves the A1 lists valid.
+    It is read from the database rather than a cache version, so every
+    worker agrees on it whatever the cache backend.
+  - a course's ETag and Last-Modified come from its updated_at, read by
+    primary key.
+
+Cache-Control lets clients reuse a response for API_MAX_AGE seconds and
+shared caches for API_CDN_MAX_AGE.
+"""
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
+
+from . import catalog
+from .models import Course
+
+LIST_FIELDS = ('id', 'code', 'title', 'level', 'duration_weeks', 'price',
+               'capacity', 'enrolled_count', 'updated_at')
+DETAIL_FIELDS = LIST_FIELDS + ('description',)
+
+
+def _level(request):
+    """The `level` filter: a level code, None for all, or False if unknown."""
+    level = request.GET.get('level') or None
+    if level and level not in dict(Course.LEVELS):
+        return False
+    return level
+
+
+def _filtered(level):
+    return Course.objects.filter(level=level) if level else Course.objects.all()
+
+
+def _stamp(updated_at):
+    return int(updated_at.timestamp() * 1_000_000) if updated_at else 0
+
+
+def _list_etag(request):
+    level = _level(request)
+    if level is False:
+        return None
+    state = _filtered(level).aggregate(count=Count('pk'), last=Max('updated_at'))
+    return f"{state['count']}-{_stamp(state['last'])}"
+
+
+# condition() calls the ETag and Last-Modified functions separately; both
+# read the state memoized on the request, so it is one query.
+def _detail_state(request, course_id):
+    if not hasattr(request, '_api_state'):
+        request._api_state = (Course.objects.filter(pk=course_id)
+                              .values_list('updated_at', flat=True).first())
+    return request._api_state
+
+
+def _detail_etag(request, course_id):
+    updated_at = _detail_state(request, course_id)
+    return updated_at and f"{course_id}-{_stamp(updated_at)}"
+
+
+def _detail_last_modified(request, course_id):
+    return _detail_state(request, course_id)
+
+
+def cacheable(view):
+    """Cache-Control for successful and Not Modified responses; errors stay uncached."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=settings.API_MAX_AGE,
+                                s_maxage=settings.API_CDN_MAX_AGE)
+        return response
+    return wrapped
+
+
+@require_safe
+@gzip_page
+@cacheable
+@condition(etag_func=_list_etag)
+def course_list(request):
+    level = _level(request)
+    after = request.GET.get('after')
+    cursor = catalog.decode_cursor(after)
+    if level is False or (after and cursor is None):
+        return HttpResponseBadRequest("Invalid level or cursor.")
+
+    size = settings.COURSES_PAGE_SIZE
+    courses = _filtered(level).order_by('level', 'id')
+    if cursor:
+        courses = courses.filter(Q(level__gt=cursor[0]) | Q(level=cursor[0], id__gt=cursor[1]))
+    rows = list(courses.values(*LIST_FIELDS)[:size + 1])
+
+    next_url = None
+    if len(rows) > size:
+        rows = rows[:size]
+        params = {'level': level} if level else {}
+        params['after'] = f"{rows[-1]['level']}.{rows[-1]['id']}"
+        next_url = f"{request.path}?{urlencode(params)}"
+    return JsonResponse({'results': rows, 'next': next_url})
+
+
+@require_safe
+@gzip_page
+@cacheable
+@condition(etag_func=_detail_etag, last_modified_func=_detail_last_modified)
+def course_detail(request, course_id):
+    row = Course.objects.filter(pk=course_id).values(*DETAIL_FIELDS).first()
+    if row is None:
+        raise Http404("No such course.")
+    return JsonResponse(row)
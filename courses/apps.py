@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        # instrumentation hooks connection_created, so load it before any connection opens
+        from . import checks, instrumentation, search, signals  # noqa: F401
+        post_migrate.connect(search.ensure_installed, sender=self)
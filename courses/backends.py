@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+UserModel = get_user_model()
+
+
+class StudentBackend(ModelBackend):
+    """
+    ModelBackend that loads the Student profile in the same query as the
+    session user, so `request.user.student` doesn't cost a second round-trip.
+
+    Sessions store the path of the backend that logged the user in, so
+    AUTHENTICATION_BACKENDS also keeps ModelBackend for sessions from before
+    this backend existed. It never needs to check a password itself.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # Stop here: ModelBackend would only hash the same wrong password again.
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('student').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await UserModel._default_manager.select_related('student').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,174 @@
+"""
+Cached, shared parts of the course catalog.
+
+Course lists, the rendered course cards and the homepage testimonials are the
+same for every visitor, so they live in the default cache under a version
+number per namespace. courses/signals.py bumps the version whenever a Course
+(or a Feedback / Student, for testimonials) is saved or deleted, so admin
+edits show up on the next request and old entries simply expire. Entries
+are always built from the primary database, never a lagging read replica.
+
+Per-user bits such as the "Enrolled" badge are NOT cached here; templates
+render them around the cached card HTML from `request.enrolled_course_ids`.
+
+Each getter has an `a`-prefixed async twin for the async views, using the
+async cache API and async ORM iteration.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+
+from .models import Course, Feedback
+from .routers import use_primary
+
+CATALOG = 'catalog'
+TESTIMONIALS = 'testimonials'
+
+
+def get_version(namespace):
+    key = f"{namespace}:version"
+    version = cache.get(key)
+    if version is None:
+        # A timestamp rather than 1, so an evicted counter never revives old keys.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(namespace):
+    key = f"{namespace}:version"
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(namespace):
+    cache.set(f"{namespace}:version", time.time_ns(), None)
+
+
+def cached(namespace, name, build):
+    """Return `build()`, cached under the current version of `namespace`."""
+    key = f"{namespace}:{get_version(namespace)}:{name}"
+    value = cache.get(key)
+    if value is None:
+        with use_primary():
+            value = build()
+        cache.set(key, value, settings.CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+async def acached(namespace, name, abuild):
+    """Async `cached()`; `abuild` is a coroutine function."""
+    key = f"{namespace}:{await aget_version(namespace)}:{name}"
+    value = await cache.aget(key)
+    if value is None:
+        with use_primary():
+            value = await abuild()
+        await cache.aset(key, value, settings.CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+def _cards(courses, template):
+    return [
+        {'course': course, 'html': render_to_string(template, {'course': course})}
+        for course in courses
+    ]
+
+
+def render_course_cards(courses):
+    """Uncached cards for an arbitrary list of courses (e.g. search results)."""
+    return _cards(courses, 'courses/partials/course_card_body.html')
+
+
+def encode_cursor(course):
+    return f"{course.level}.{course.id}"
+
+
+def decode_cursor(value):
+    """Turn an `after` query parameter into a (level, id) tuple, or None if invalid."""
+    level, _, course_id = (value or '').partition('.')
+    if level not in dict(Course.LEVELS) or not course_id.isdigit():
+        return None
+    return level, int(course_id)
+
+
+def _course_page_query(level, after, size):
+    courses = Course.objects.order_by('level', 'id')
+    if level:
+        courses = courses.filter(level=level)
+    if after:
+        after_level, after_id = after
+        courses = courses.filter(Q(level__gt=after_level) | Q(level=after_level, id__gt=after_id))
+    return courses[:size + 1]
+
+
+def _course_page(courses, size):
+    next_cursor = encode_cursor(courses[size - 1]) if len(courses) > size else None
+    return _cards(courses[:size], 'courses/partials/course_card_body.html'), next_cursor
+
+
+def _course_page_name(level, after, size):
+    start = f"{after[0]}.{after[1]}" if after else 'start'
+    return f"course_page:{level or 'all'}:{start}:{size}"
+
+
+def get_course_page(level=None, after=None):
+    """
+    One page of cards for the courses page, in stable (level, id) order.
+
+    `level` must already be a valid level code (or None); `after` is a decoded
+    cursor. Returns (cards, next_cursor), next_cursor being None on the last page.
+    """
+    size = settings.COURSES_PAGE_SIZE
+
+    def build():
+        return _course_page(list(_course_page_query(level, after, size)), size)
+
+    return cached(CATALOG, _course_page_name(level, after, size), build)
+
+
+async def aget_course_page(level=None, after=None):
+    size = settings.COURSES_PAGE_SIZE
+
+    async def build():
+        return _course_page([course async for course in _course_page_query(level, after, size)], size)
+
+    return await acached(CATALOG, _course_page_name(level, after, size), build)
+
+
+LATEST_CARD_TEMPLATE = 'courses/partials/home_course_card_body.html'
+
+
+def get_latest_course_cards():
+    """Cards for the "Popular Courses" strip on the homepage."""
+    def build():
+        return _cards(Course.objects.all()[:6], LATEST_CARD_TEMPLATE)
+    return cached(CATALOG, 'latest_course_cards', build)
+
+
+async def aget_latest_course_cards():
+    async def build():
+        return _cards([course async for course in Course.objects.all()[:6]], LATEST_CARD_TEMPLATE)
+    return await acached(CATALOG, 'latest_course_cards', build)
+
+
+def _testimonials_query():
+    return (Feedback.objects.filter(is_approved=True)
+            .select_related('student').order_by('-created_at')[:6])
+
+
+def get_testimonials():
+    def build():
+        return list(_testimonials_query())
+    return cached(TESTIMONIALS, 'approved', build)
+
+
+async def aget_testimonials():
+    async def build():
+        return [feedback async for feedback in _testimonials_query()]
+    return await acached(TESTIMONIALS, 'approved', build)
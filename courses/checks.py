@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from . import tailwind
+
+
+@register(Tags.staticfiles)
+def tailwind_built(app_configs, **kwargs):
+    """site.css must exist before collectstatic when the CDN is off (see courses/tailwind.py)."""
+    if settings.TAILWIND_CDN or tailwind.is_built():
+        return []
+    return [Error(
+        f"{tailwind.OUTPUT_CSS} has not been built and TAILWIND_CDN is off.",
+        hint="Run `manage.py build_css` (build.sh does, before collectstatic), "
+             "or set TAILWIND_CDN=True.",
+        id='courses.E001',
+    )]
@@ -0,0 +1,6 @@
+def student(request):
+    """Expose the per-request student and enrolled course ids to templates."""
+    return {
+        'student': getattr(request, 'student', None),
+        'enrolled_course_ids': getattr(request, 'enrolled_course_ids', frozenset()),
+    }
@@ -0,0 +1,110 @@
+"""
+Reading, validating and writing course rows for `manage.py import_courses`
+and `manage.py export_courses`.
+
+Files are CSV (header row) or JSON Lines (one object per line), picked by
+extension. Both are read and written one row at a time, so memory use does
+not depend on file size.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from .models import Course
+
+FIELDS = ('code', 'title', 'level', 'duration_weeks', 'description', 'price')
+
+LEVEL_CODES = dict(Course.LEVELS)
+MAX_PRICE = Decimal('999999.99')   # max_digits=8, decimal_places=2
+MAX_WEEKS = 2147483647   # PositiveIntegerField: a 32-bit integer on PostgreSQL
+
+
+def file_format(path, explicit=None):
+    if explicit:
+        return explicit
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(fileobj, fmt):
+    """Yield (line_number, dict) pairs from an open text file."""
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(fileobj, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, {'__error__': f"invalid JSON ({exc.msg})"}
+                continue
+            yield line_number, row if isinstance(row, dict) else {'__error__': "not a JSON object"}
+    else:
+        reader = csv.DictReader(fileobj)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def clean_row(row):
+    """
+    Validate one input row against the Course model's constraints.
+    Returns (values, errors); values is only usable when errors is empty.
+    """
+    if '__error__' in row:
+        return None, [row['__error__']]
+
+    errors = []
+    values = {}
+
+    def text(name, max_length=None, required=True):
+        value = str(row.get(name) or '').strip()
+        if required and not value:
+            errors.append(f"{name} is required")
+        elif max_length and len(value) > max_length:
+            errors.append(f"{name} is longer than {max_length} characters")
+        values[name] = value
+
+    text('code', max_length=10)
+    text('title', max_length=200)
+    text('description')
+
+    level = str(row.get('level') or '').strip().upper()
+    if level not in LEVEL_CODES:
+        errors.append(f"level {level!r} is not one of {', '.join(LEVEL_CODES)}")
+    values['level'] = level
+
+    try:
+        weeks = int(str(row.get('duration_weeks') or '').strip())
+        if not 1 <= weeks <= MAX_WEEKS:
+            raise ValueError
+        values['duration_weeks'] = weeks
+    except ValueError:
+        errors.append(f"duration_weeks {row.get('duration_weeks')!r} must be a whole number "
+                      f"between 1 and {MAX_WEEKS}")
+
+    try:
+        price = Decimal(str(row.get('price') or '0').strip())
+        if not price.is_finite() or price < 0 or price > MAX_PRICE:
+            raise InvalidOperation
+        values['price'] = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        errors.append(f"price {row.get('price')!r} must be between 0 and {MAX_PRICE}")
+
+    return values, errors
+
+
+class RowWriter:
+    """Write course dicts as CSV or JSON Lines."""
+
+    def __init__(self, fileobj, fmt):
+        self.fileobj = fileobj
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(fileobj, fieldnames=FIELDS)
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            self.csv.writerow(row)
+        else:
+            self.fileobj.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
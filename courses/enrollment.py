@@ -0,0 +1,177 @@
+"""
+Seat accounting for course enrollments.
+
+`Course.enrolled_count` holds the number of enrolled registrations, so pages
+show free seats without a COUNT(*). It is only changed here, with
+F-expressions, together with `updated_at` (the API's ETags depend on the
+seats left):
+
+  - enroll() claims a seat with a single conditional UPDATE (`enrolled_count
+    < capacity`). The row lock that UPDATE takes serialises concurrent
+    enrollments for a course, and the WHERE clause means the count can never
+    pass capacity; the `course_not_oversold` check constraint backs it up.
+    Without a free seat the registration goes on the waitlist.
+  - Deleting an enrolled registration (the post_delete signal, so cascades
+    and the admin are covered too) frees its seat and fill_seats() hands it
+    to the longest-waiting student, under select_for_update on the course.
+    The promotion also counts the enrollment in the daily rollups.
+
+bulk_create and raw SQL bypass all of this; call recount() afterwards.
+
+Each student's {course_id: status} map is also cached, so the "Enrolled"
+badges and course_detail cost no query on a hit. enroll() and delete_course
+store the fresh map after their write (write-through); any other save or
+delete (admin, cascades, courses/signals.py) and waitlist promotions drop
+the key instead, promotions once their transaction commits. A read miss
+fills the key with cache.add, so it never overwrites a newer write-through.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from . import rollups
+from .models import Course, Registration
+
+HAS_FREE_SEAT = Q(capacity__isnull=True) | Q(enrolled_count__lt=F('capacity'))
+
+
+def enroll(student, course):
+    """
+    Register `student` for `course`: enrolled if a seat is free, otherwise
+    waitlisted. Returns (registration, created); a repeated or concurrent
+    request for the same pair gets the existing registration.
+    """
+    registration = Registration.objects.filter(student=student, course=course).first()
+    if registration:
+        return registration, False
+    try:
+        return add_registration(Registration(student=student, course=course)), True
+    except IntegrityError:
+        # Lost a race with another request for the same student; the seat
+        # claim was rolled back with the insert.
+        return Registration.objects.get(student=student, course=course), False
+
+
+def add_registration(registration):
+    """Insert an unsaved Registration, claiming a seat for it if one is free."""
+    with transaction.atomic():
+        claimed = (Course.objects.filter(HAS_FREE_SEAT, pk=registration.course_id)
+                   .update(enrolled_count=F('enrolled_count') + 1, updated_at=Now()))
+        registration.status = 'enrolled' if claimed else 'waitlisted'
+        registration.save(force_insert=True)
+    store_statuses(registration.student_id)
+    return registration
+
+
+def release_seat(course_id):
+    """Give back the seat of a deleted enrolled registration; returns the promoted registrations."""
+    # Runs inside the delete's transaction, so no savepoint of its own.
+    with transaction.atomic(savepoint=False):
+        # Registrations created outside enroll() (fixtures, bulk loads) were never counted.
+        Course.objects.filter(pk=course_id, enrolled_count__gt=0).update(
+            enrolled_count=F('enrolled_count') - 1, updated_at=Now())
+        return fill_seats(course_id)
+
+
+def fill_seats(course_id):
+    """
+    Move waitlisted registrations into the course's free seats, oldest first.
+    Call after a seat is freed or the capacity is raised. Returns the
+    promoted registrations.
+    """
+    with transaction.atomic(savepoint=False):
+        # The lock keeps two releases from promoting the same student and a
+        # concurrent enroll() from taking the seat in between. It is a read, so
+        # it is pinned to the primary explicitly: a replica can't lock the row.
+        course = (Course.objects.using(router.db_for_write(Course)).select_for_update().filter(pk=course_id)
+                  .only('capacity', 'enrolled_count').first())
+        if course is None:
+            return []
+        waitlist = Registration.objects.filter(
+            course_id=course_id, status='waitlisted').order_by('registered_at', 'pk')
+        if course.capacity is not None:
+            if not course.seats_left:
+                return []
+            waitlist = waitlist[:course.seats_left]
+        promoted = list(waitlist)
+        if promoted:
+            Registration.objects.filter(pk__in=[r.pk for r in promoted]).update(status='enrolled')
+            Course.objects.filter(pk=course_id).update(
+                enrolled_count=F('enrolled_count') + len(promoted), updated_at=Now())
+            for registration in promoted:
+                registration.status = 'enrolled'
+                # update() sends no post_save: count the enrollment here.
+                rollups.record(course_id, registration.registered_at, 1)
+            # After the commit, or a read in between could cache the old map again.
+            student_ids = [r.student_id for r in promoted]
+            transaction.on_commit(lambda: forget_statuses(*student_ids))
+    return promoted
+
+
+def waitlist_position(registration):
+    """1-based place of a waitlisted registration in its course's queue."""
+    return Registration.objects.filter(
+        Q(registered_at__lt=registration.registered_at)
+        | Q(registered_at=registration.registered_at, pk__lt=registration.pk),
+        course_id=registration.course_id, status='waitlisted',
+    ).count() + 1
+
+
+def recount(courses=None):
+    """Recompute enrolled_count from the registrations, in one UPDATE."""
+    per_course = (Registration.objects.filter(course=OuterRef('pk'), status='enrolled')
+                  .order_by().values('course').annotate(total=Count('pk')).values('total'))
+    courses = Course.objects.all() if courses is None else courses
+    return courses.update(enrolled_count=Coalesce(Subquery(per_course), 0), updated_at=Now())
+
+
+# --- per-student cache ---
+# Bump when the cached value's shape changes, so old entries are ignored.
+STATUS_CACHE_VERSION = 1
+
+
+def _status_key(student_id):
+    return f"enrollments:v{STATUS_CACHE_VERSION}:{student_id}"
+
+
+def _status_query(student_id):
+    return Registration.objects.filter(student_id=student_id).values_list('course_id', 'status')
+
+
+def registration_statuses(student):
+    """{course_id: status} of the student's registrations; {} for None."""
+    if student is None:
+        return {}
+    statuses = cache.get(_status_key(student.pk))
+    if statuses is None:
+        statuses = dict(_status_query(student.pk))
+        # add, not set: a write-through that lands first has the newer map.
+        cache.add(_status_key(student.pk), statuses, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return statuses
+
+
+async def aregistration_statuses(student):
+    if student is None:
+        return {}
+    statuses = await cache.aget(_status_key(student.pk))
+    if statuses is None:
+        statuses = {course_id: status async for course_id, status in _status_query(student.pk)}
+        await cache.aadd(_status_key(student.pk), statuses, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return statuses
+
+
+def store_statuses(student_id):
+    """Reload the student's map from the database and cache it; call after a change."""
+    statuses = dict(_status_query(student_id))
+    cache.set(_status_key(student_id), statuses, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return statuses
+
+
+def forget_statuses(*student_ids):
+    cache.delete_many([_status_key(student_id) for student_id in student_ids])
+
+
+def enrolled_course_ids(statuses):
+    return frozenset(course_id for course_id, status in statuses.items() if status == 'enrolled')
@@ -0,0 +1,35 @@
+"""
+Password hashers whose cost comes from settings.
+
+Django rehashes a stored password on the next successful login whenever the
+preferred hasher (first in PASSWORD_HASHERS) or its cost differs from the
+stored hash, so changing PASSWORD_HASHER or the cost settings upgrades
+existing users transparently. The algorithm names are Django's own, so
+hashes stay readable by the stock hashers too.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Needs the argon2-cffi package."""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
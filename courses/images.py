@@ -0,0 +1,98 @@
+"""
+Responsive variants of the site's static images.
+
+`manage.py build_images` resizes every image under
+courses/static/courses/images to RESPONSIVE_IMAGE_WIDTHS (never upscaling)
+and writes AVIF, WebP and a JPEG fallback (PNG for images with
+transparency) of each into images/responsive/, plus a manifest.json that
+lists them. The variants are ordinary static files, so collectstatic hashes
+and pre-compresses them with everything else. `{% responsive_image %}`
+(courses/templatetags/images.py) reads the manifest and emits a <picture>
+with srcset, sizes, width and height.
+
+The variants and manifest are committed, so Pillow is only needed to
+rebuild them after adding or changing an image.
+"""
+import json
+from functools import cache
+from pathlib import Path
+
+from django.conf import settings
+
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+SOURCE_PREFIX = 'courses/images'
+OUTPUT_PREFIX = 'courses/images/responsive'
+MANIFEST_PATH = STATIC_DIR / OUTPUT_PREFIX / 'manifest.json'
+SOURCE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+
+# format -> (Pillow format, file suffix, MIME type, save options)
+FORMATS = {
+    'avif': ('AVIF', '.avif', 'image/avif', {'quality': 55, 'speed': 4}),
+    'webp': ('WEBP', '.webp', 'image/webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', '.png', 'image/png', {'optimize': True}),
+}
+MODERN_FORMATS = ('avif', 'webp')
+
+
+def source_images():
+    """Static paths (courses/images/...) of the images to build variants for."""
+    source_dir = STATIC_DIR / SOURCE_PREFIX
+    return sorted(
+        f"{SOURCE_PREFIX}/{path.relative_to(source_dir).as_posix()}"
+        for path in source_dir.rglob('*')
+        if path.suffix.lower() in SOURCE_SUFFIXES and (STATIC_DIR / OUTPUT_PREFIX) not in path.parents
+    )
+
+
+def target_widths(width, widths=None):
+    """The configured widths that fit the original; the original width stands in for larger ones."""
+    return sorted({min(w, width) for w in widths or settings.RESPONSIVE_IMAGE_WIDTHS})
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def build(static_path, widths=None, force=False):
+    """
+    Write the variants of one image and return its manifest entry.
+    Variants newer than the source are kept unless `force`.
+    """
+    from PIL import Image
+
+    source = STATIC_DIR / static_path
+    stem = Path(static_path).relative_to(SOURCE_PREFIX).with_suffix('')
+    with Image.open(source) as original:
+        original.load()
+    fallback = 'png' if has_alpha(original) else 'jpeg'
+    image = original.convert('RGBA' if fallback == 'png' else 'RGB')
+
+    entry = {'width': image.width, 'height': image.height, 'fallback': fallback, 'srcset': {}}
+    for fmt in (*MODERN_FORMATS, fallback):
+        pil_format, suffix, _, options = FORMATS[fmt]
+        variants = entry['srcset'][fmt] = []
+        for width in target_widths(image.width, widths):
+            name = f"{OUTPUT_PREFIX}/{stem.as_posix()}-{width}{suffix}"
+            target = STATIC_DIR / name
+            if force or not target.exists() or target.stat().st_mtime < source.stat().st_mtime:
+                height = round(image.height * width / image.width)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                image.resize((width, height), Image.LANCZOS).save(target, pil_format, **options)
+            variants.append([width, name])
+    return entry
+
+
+def write_manifest(entries):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    MANIFEST_PATH.write_text(json.dumps(entries, indent=2, sort_keys=True) + '\n')
+    manifest.cache_clear()
+
+
+@cache
+def manifest():
+    """{static path: entry} from the last build; empty if it never ran."""
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except FileNotFoundError:
+        return {}
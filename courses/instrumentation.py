@@ -0,0 +1,232 @@
+"""
+Per-request performance instrumentation.
+
+RequestTimingMiddleware records, for every request:
+  - number of SQL queries and total DB time (via a connection execute wrapper),
+  - template render time (the TimedDjangoTemplates backend in TEMPLATES),
+  - view time (everything else spent handling the request),
+and, with SERVER_TIMING_HEADER (the default only with DEBUG: the header is
+sent to every client), returns them in a `Server-Timing` header for the
+browser dev tools. Requests slower than SLOW_REQUEST_MS are logged to the
+"courses.performance" logger with their slowest SQL statement.
+
+Durations are also kept per URL name in bounded in-memory samples, served as
+p50/p95/p99 by the staff-only `perf_stats` view, together with connection
+pool counters when DB_POOL_MODE=pool. The samples are per process: with
+several gunicorn workers each one reports its own traffic.
+
+The middleware works under both WSGI and ASGI. SQL is counted by a wrapper
+installed on every connection as it is created, because under ASGI the async
+ORM runs queries on worker threads whose connections a per-request
+`execute_wrapper` on the event-loop thread would never see.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import JsonResponse
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('courses.performance')
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.slowest_sql = ('', 0.0)
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            if elapsed > self.slowest_sql[1]:
+                self.slowest_sql = (sql, elapsed)
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.sql_wrapper(execute, sql, params, many, context)
+
+
+def _install_sql_wrapper(sender, connection, **kwargs):
+    # The wrapper object outlives reconnects, so only add it once.
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+connection_created.connect(_install_sql_wrapper)
+
+
+# --- template timing ---
+class TimedTemplate(Template):
+    """Counts its render time; nested renders (render_to_string inside a template) only once."""
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if stats.template_depth == 0:
+                stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, returning TimedTemplates; set as BACKEND in TEMPLATES."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+# --- aggregated samples ---
+class Samples:
+    """Last N (duration_ms, queries) samples per URL name, thread-safe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = defaultdict(lambda: deque(maxlen=settings.INSTRUMENTATION_SAMPLES))
+
+    def add(self, name, duration_ms, queries):
+        with self.lock:
+            self.data[name].append((duration_ms, queries))
+
+    def summary(self):
+        with self.lock:
+            snapshot = {name: list(values) for name, values in self.data.items()}
+        result = {}
+        for name, values in sorted(snapshot.items()):
+            durations = sorted(d for d, _ in values)
+            result[name] = {
+                'count': len(durations),
+                'p50_ms': round(percentile(durations, 50), 2),
+                'p95_ms': round(percentile(durations, 95), 2),
+                'p99_ms': round(percentile(durations, 99), 2),
+                'max_ms': round(durations[-1], 2),
+                'avg_queries': round(sum(q for _, q in values) / len(values), 1),
+            }
+        return result
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+samples = Samples()
+
+
+class RequestTimingMiddleware:
+    """Place it early in MIDDLEWARE (after WhiteNoise, so static files are skipped)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    def record(self, request, response, stats, total):
+
+        db_ms = stats.db_time * 1000
+        tpl_ms = stats.template_time * 1000
+        total_ms = total * 1000
+        view_ms = max(total_ms - db_ms - tpl_ms, 0)
+
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={db_ms:.1f};desc="{stats.queries} queries"',
+                f'tpl;dur={tpl_ms:.1f}',
+                f'view;dur={view_ms:.1f}',
+                f'total;dur={total_ms:.1f}',
+            ])
+
+        match = getattr(request, 'resolver_match', None)
+        name = match.view_name if match else 'unresolved'
+        samples.add(name, total_ms, stats.queries)
+
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            sql, sql_time = stats.slowest_sql
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms total, %d queries in %.0f ms, "
+                "templates %.0f ms; slowest SQL %.0f ms: %s",
+                request.method, request.path, name, total_ms, stats.queries, db_ms,
+                tpl_ms, sql_time * 1000, sql[:500],
+            )
+        return response
+
+
+def pool_stats():
+    """psycopg pool counters per database alias; empty unless DB_POOL_MODE=pool."""
+    result = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)   # only PostgreSQL has one
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        size, idle = stats.get('pool_size', 0), stats.get('pool_available', 0)
+        requests = stats.get('requests_num', 0)
+        result[alias] = {
+            'in_use': size - idle,
+            'idle': idle,
+            'max_size': stats.get('pool_max'),
+            'waiting': stats.get('requests_waiting', 0),
+            'requests': requests,
+            'avg_acquire_ms': round(stats.get('requests_wait_ms', 0) / requests, 2) if requests else 0.0,
+            'timeouts': stats.get('requests_errors', 0),
+        }
+    return result
+
+
+@staff_member_required
+def perf_stats(request):
+    """Per-URL-name latency percentiles and pool counters for this process, as JSON."""
+    return JsonResponse({'pid': os.getpid(), 'routes': samples.summary(), 'pools': pool_stats()})
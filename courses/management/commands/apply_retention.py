@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from courses import retention
+
+
+class Command(BaseCommand):
+    help = ("Archive rows past RETENTION_DAYS to gzipped JSONL under RETENTION_ARCHIVE_DIR and "
+            "delete them in small primary-key batches. Safe to interrupt and rerun.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='*', metavar='target',
+                            help=f"Any of {', '.join(retention.TARGETS)}; default all.")
+        parser.add_argument('--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help="Seconds to pause between batches.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report the rows due and the space they take.")
+
+    def handle(self, *args, **options):
+        targets = options['targets'] or list(retention.TARGETS)
+        unknown = set(targets) - set(retention.TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown target(s): {', '.join(sorted(unknown))}.")
+
+        now = timezone.now()
+        for name in targets:
+            if options['dry_run']:
+                rows, size = retention.estimate(name, now)
+                space = "unknown space" if size is None else f"about {filesizeformat(size)}"
+                self.stdout.write(f"{name}: {rows} rows due, {space} to reclaim.")
+                continue
+            deleted, path = retention.apply(name, now, options['batch_size'], options['sleep'])
+            archived = f", archived to {path}" if path else ""
+            self.stdout.write(self.style.SUCCESS(f"{name}: deleted {deleted} rows{archived}."))
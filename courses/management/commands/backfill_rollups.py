@@ -0,0 +1,29 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import rollups
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the daily enrollment rollups from Registration, a chunk of days per "
+            "transaction. Run after bulk loads and raw SQL that skip the signals. Days up to the "
+            "registrations retention cutoff are skipped: their rollups outlive the deleted rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First day (YYYY-MM-DD); default: the oldest registration. "
+                            "Never before the registrations retention cutoff.")
+        parser.add_argument('--to', dest='end', help="Last day (YYYY-MM-DD); default: the newest registration.")
+        parser.add_argument('--chunk-days', type=int, default=31)
+
+    def handle(self, *args, **options):
+        try:
+            start, end = (date.fromisoformat(options[key]) if options[key] else None
+                          for key in ('start', 'end'))
+        except ValueError as exc:
+            raise CommandError(exc)
+        total = 0
+        for first, last, rows in rollups.backfill(start, end, options['chunk_days']):
+            total += rows
+            self.stdout.write(f"{first} .. {last}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} rollup rows."))
@@ -0,0 +1,32 @@
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import tailwind
+
+
+class Command(BaseCommand):
+    help = ("Compile the Tailwind classes used in courses/templates, plus courses/css/style.css, "
+            "into one minified courses/css/site.css. Needs the Tailwind v3 standalone CLI "
+            "(TAILWIND_CLI), works offline. Run before collectstatic.")
+    # courses.E001 fails until site.css exists, which is what this command writes.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cli', default=settings.TAILWIND_CLI,
+                            help="Path to the tailwindcss standalone executable.")
+
+    def handle(self, *args, **options):
+        try:
+            output = tailwind.build(options['cli'])
+        except FileNotFoundError:
+            raise CommandError(
+                f"Tailwind CLI not found at {options['cli']!r}. Download the v3 standalone binary "
+                "from https://github.com/tailwindlabs/tailwindcss/releases and set TAILWIND_CLI."
+            )
+        except subprocess.CalledProcessError as exc:
+            raise CommandError(f"Tailwind CLI failed:\n{exc.stderr}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output.relative_to(tailwind.STATIC_DIR)} ({output.stat().st_size / 1024:.1f} KB)."
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import images
+
+
+class Command(BaseCommand):
+    help = ("Write resized AVIF/WebP/JPEG variants of the images under courses/static/courses/images "
+            "and the manifest the {% responsive_image %} tag reads. Run before collectstatic.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--widths', help="Comma-separated widths; defaults to RESPONSIVE_IMAGE_WIDTHS.")
+        parser.add_argument('--force', action='store_true', help="Rebuild variants that are up to date.")
+
+    def handle(self, *args, **options):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError("Pillow is required: pip install Pillow")
+        widths = [int(w) for w in options['widths'].split(',')] if options['widths'] else None
+
+        entries = {}
+        for path in images.source_images():
+            entry = entries[path] = images.build(path, widths, options['force'])
+            original = (images.STATIC_DIR / path).stat().st_size
+            smallest = min((images.STATIC_DIR / name).stat().st_size
+                           for variants in entry['srcset'].values() for _, name in variants)
+            self.stdout.write(f"{path}: {entry['width']}x{entry['height']}, {original // 1024} KB, "
+                              f"smallest variant {smallest / 1024:.1f} KB")
+        images.write_manifest(entries)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote variants of {len(entries)} images and {images.MANIFEST_PATH.relative_to(images.STATIC_DIR)}."
+        ))
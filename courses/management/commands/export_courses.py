@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.course_io import FIELDS, RowWriter, file_format
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Write all courses to a CSV or JSON Lines file ('-' for stdout)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Defaults to the file extension (.jsonl/.ndjson, otherwise csv).")
+        parser.add_argument('--level', choices=[code for code, _ in Course.LEVELS])
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        started = time.perf_counter()
+
+        courses = Course.objects.order_by('id')
+        if options['level']:
+            courses = courses.filter(level=options['level'])
+
+        fileobj = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        count = 0
+        with fileobj:
+            writer = RowWriter(fileobj, file_format(path, options['format']))
+            for row in courses.values(*FIELDS).iterator(chunk_size=options['chunk_size']):
+                writer.write(row)
+                count += 1
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {count} courses in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
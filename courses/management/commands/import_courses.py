@@ -0,0 +1,72 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from courses import catalog
+from courses.course_io import FIELDS, clean_row, file_format, read_rows
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = ("Create or update courses from a CSV or JSON Lines file, matching on code. "
+            "Use '-' to read from stdin.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Defaults to the file extension (.jsonl/.ndjson, otherwise csv).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = file_format(path, options['format'])
+        started = time.perf_counter()
+        self.written = self.invalid = 0
+
+        try:
+            fileobj = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+        with fileobj:
+            # Keyed on code so a code repeated within one batch is upserted once (last row wins).
+            batch = {}
+            for line_number, row in read_rows(fileobj, fmt):
+                values, errors = clean_row(row)
+                if errors:
+                    self.invalid += 1
+                    self.stderr.write(f"line {line_number}: {'; '.join(errors)}")
+                    continue
+                batch[values['code']] = values
+                if len(batch) >= options['batch_size']:
+                    self.flush(batch, options['dry_run'])
+                    batch = {}
+            self.flush(batch, options['dry_run'])
+
+        if self.written and not options['dry_run']:
+            # bulk_create skips post_save, so invalidate the catalog cache by hand.
+            catalog.bump_version(catalog.CATALOG)
+
+        elapsed = time.perf_counter() - started
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {self.written} courses, {self.invalid} invalid rows, "
+            f"in {elapsed:.1f}s ({self.written / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+
+    def flush(self, batch, dry_run):
+        if not batch:
+            return
+        if not dry_run:
+            with transaction.atomic():
+                Course.objects.bulk_create(
+                    [Course(**values) for values in batch.values()],
+                    update_conflicts=True,
+                    unique_fields=['code'],
+                    # updated_at too: it is set on insert only, and the API's ETag depends on it
+                    update_fields=[f for f in FIELDS if f != 'code'] + ['updated_at'],
+                )
+        self.written += len(batch)
@@ -0,0 +1,29 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses import announcements
+from courses.models import Announcement
+
+
+class Command(BaseCommand):
+    help = ("Send queued course announcements to every registered student, rate limited per "
+            "provider. Safe to rerun: already sent recipients are skipped; run it regularly "
+            "(like send_notifications) so failed sends are retried. Overlapping runs exit at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ANNOUNCEMENT_CHUNK_SIZE)
+        parser.add_argument('--concurrency', type=int, default=settings.ANNOUNCEMENT_CONCURRENCY)
+
+    def handle(self, *args, **options):
+        with announcements.exclusive() as acquired:
+            if not acquired:
+                self.stdout.write("Another send_announcements is running; nothing to do.")
+                return
+            for announcement in Announcement.objects.exclude(status='done').select_related('course'):
+                counts = async_to_sync(announcements.process)(
+                    announcement, options['batch_size'], options['concurrency'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"{announcement}: sent {counts['sent']}, retrying {counts['retried']}, "
+                    f"failed {counts['failed']} ({announcement.get_status_display().lower()})."
+                ))
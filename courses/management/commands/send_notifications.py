@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from courses.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued WhatsApp notifications from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.NOTIFICATION_WORKERS)
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling the outbox instead of exiting when it is empty.")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Seconds to sleep between polls when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        while True:
+            counts = drain_outbox(options['batch_size'], options['workers'])
+            for key, value in counts.items():
+                totals[key] += value
+
+            if not any(counts.values()):
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals['sent']}, retrying {totals['retried']}, failed {totals['failed']}."
+        ))
@@ -0,0 +1,107 @@
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.functional import SimpleLazyObject
+
+from .enrollment import aregistration_statuses, enrolled_course_ids, registration_statuses
+from .models import Student
+
+
+def get_student(user):
+    """The Student linked to `user`, or None (anonymous or no profile yet)."""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.student
+    except ObjectDoesNotExist:
+        return None
+
+
+async def aget_student(user):
+    """Async get_student(): queries, awaited, unless the user was loaded with its student."""
+    if not user.is_authenticated or type(user).student.is_cached(user):
+        return get_student(user)
+    return await Student.objects.filter(user=user).afirst()
+
+
+def get_enrolled_course_ids(student):
+    # Cached per student, see courses/enrollment.py
+    return enrolled_course_ids(registration_statuses(student))
+
+
+async def aget_enrolled_course_ids(student):
+    return enrolled_course_ids(await aregistration_statuses(student))
+
+
+async def aenrolled_course_ids(request):
+    """
+    Async counterpart of `request.enrolled_course_ids`. Async views must await
+    this before rendering: the lazy attribute can't run its query on the
+    event loop. The result replaces the lazy attribute for templates.
+    """
+    request.enrolled_course_ids = await aget_enrolled_course_ids(request.student)
+    return request.enrolled_course_ids
+
+
+class StudentMiddleware:
+    """
+    Sets `request.student` and a lazy `request.enrolled_course_ids` so views
+    and templates share one lookup per request (`await
+    request.aenrolled_course_ids()` in async views). Must come after
+    AuthenticationMiddleware.
+
+    A request without a session cookie is anonymous, so it gets AnonymousUser
+    without reading the session: reading it, even empty, adds Vary: Cookie
+    and keeps caches from sharing the response. Only requests carrying the
+    cookie load the user and student. SESSIONLESS_PATHS (the public JSON API)
+    never read it: their responses must be the same for everyone.
+    """
+    sync_capable = True
+    async_capable = True
+    SESSIONLESS_PATHS = ('/api/',)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.has_session(request):
+            self.set_anonymous(request)
+        # No query with StudentBackend: it loads the student with the user.
+        self.setup(request, get_student(request.user))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.has_session(request):
+            # Resolve the user here; the lazy request.user would query from the event loop.
+            request.user = await request.auser()
+        else:
+            self.set_anonymous(request)
+        # A session from ModelBackend has no student loaded: fetch it without blocking the loop.
+        self.setup(request, await aget_student(request.user))
+        return await self.get_response(request)
+
+    def has_session(self, request):
+        return (settings.SESSION_COOKIE_NAME in request.COOKIES
+                and not request.path_info.startswith(self.SESSIONLESS_PATHS))
+
+    def set_anonymous(self, request):
+        user = AnonymousUser()
+
+        async def auser():
+            return user
+
+        request.user, request.auser = user, auser
+
+    def setup(self, request, student):
+        request.student = student
+        request.enrolled_course_ids = SimpleLazyObject(
+            lambda: get_enrolled_course_ids(request.student)
+        )
+        request.aenrolled_course_ids = partial(aenrolled_course_ids, request)
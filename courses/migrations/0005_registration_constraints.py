@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:07
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_registrations(apps, schema_editor):
+    """Keep the oldest row of each (student, course) pair so the constraint can be added."""
+    Registration = apps.get_model('courses', 'Registration')
+    duplicates = (Registration.objects.values('student_id', 'course_id')
+                  .annotate(keep_id=Min('id'), total=models.Count('id'))
+                  .filter(total__gt=1))
+    for dup in duplicates:
+        (Registration.objects
+         .filter(student_id=dup['student_id'], course_id=dup['course_id'])
+         .exclude(id=dup['keep_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('courses', '0004_notification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-created_at'], name='feedback_approved_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_registrations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='registration',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_registration'),
+        ),
+        # register_view checks UPPER(email) = UPPER(%s); auth.User is not ours, so raw SQL.
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_upper_idx ON auth_user (UPPER(email));',
+            'DROP INDEX auth_user_email_upper_idx;',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_registration_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['level', 'id'], name='course_level_id_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# The SQL as of this migration, kept here rather than imported from
+# courses/search.py, so later changes there can't change what it does.
+SQLITE_INSTALL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS courses_course_fts USING fts5(
+        title, code, description,
+        content='courses_course', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4 5 6'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS courses_course_fts_ai AFTER INSERT ON courses_course BEGIN
+        INSERT INTO courses_course_fts(rowid, title, code, description)
+        VALUES (new.id, new.title, new.code, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS courses_course_fts_ad AFTER DELETE ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, code, description)
+        VALUES ('delete', old.id, old.title, old.code, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS courses_course_fts_au AFTER UPDATE ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, code, description)
+        VALUES ('delete', old.id, old.title, old.code, old.description);
+        INSERT INTO courses_course_fts(rowid, title, code, description)
+        VALUES (new.id, new.title, new.code, new.description);
+    END""",
+]
+SQLITE_TRIGGERS = ('courses_course_fts_ai', 'courses_course_fts_ad', 'courses_course_fts_au')
+SQLITE_UNINSTALL = [
+    *(f"DROP TRIGGER IF EXISTS {name}" for name in SQLITE_TRIGGERS),
+    "DROP TABLE IF EXISTS courses_course_fts",
+]
+POSTGRES_INSTALL = [
+    """ALTER TABLE courses_course ADD COLUMN IF NOT EXISTS search_vector tsvector
+       GENERATED ALWAYS AS (
+           setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(code, '')), 'A') ||
+           setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+       ) STORED""",
+    """CREATE INDEX IF NOT EXISTS courses_course_search_idx ON courses_course USING GIN (search_vector)""",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS courses_course_search_idx",
+    "ALTER TABLE courses_course DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install(apps, schema_editor):
+    statements = {
+        'sqlite': SQLITE_INSTALL + ["INSERT INTO courses_course_fts(courses_course_fts) VALUES ('rebuild')"],
+        'postgresql': POSTGRES_INSTALL,
+    }
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    statements = {'sqlite': SQLITE_UNINSTALL, 'postgresql': POSTGRES_UNINSTALL}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_level_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
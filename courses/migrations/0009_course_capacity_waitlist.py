@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_enrollments(apps, schema_editor):
+    """Every existing registration is enrolled; store the count per course in one UPDATE."""
+    Course = apps.get_model('courses', 'Course')
+    Registration = apps.get_model('courses', 'Registration')
+    per_course = (Registration.objects.filter(course=OuterRef('pk')).order_by()
+                  .values('course').annotate(total=Count('pk')).values('total'))
+    Course.objects.update(enrolled_count=Coalesce(Subquery(per_course), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_export_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Number of seats; leave empty for no limit.', null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='registration',
+            name='status',
+            field=models.CharField(choices=[('enrolled', 'Enrolled'), ('waitlisted', 'Waitlisted')], default='enrolled', max_length=10),
+        ),
+        migrations.RunPython(count_enrollments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(condition=models.Q(('status', 'waitlisted')), fields=['course', 'registered_at'], name='registration_waitlist_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='course',
+            constraint=models.CheckConstraint(condition=models.Q(('capacity__isnull', True), ('enrolled_count__lte', models.F('capacity')), _connector='OR'), name='course_not_oversold'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+# The SQL as of this migration, kept here rather than imported from
+# courses/moderation.py, so later changes there can't change what it does.
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """CREATE INDEX IF NOT EXISTS feedback_message_trgm_idx
+       ON courses_feedback USING GIN (UPPER(message) gin_trgm_ops)""",
+    """CREATE INDEX IF NOT EXISTS student_full_name_trgm_idx
+       ON courses_student USING GIN (UPPER(full_name) gin_trgm_ops)""",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS feedback_message_trgm_idx",
+    "DROP INDEX IF EXISTS student_full_name_trgm_idx",
+]
+
+
+def install_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_INSTALL:
+            schema_editor.execute(sql)
+
+
+def uninstall_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_UNINSTALL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_course_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='reviewed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(condition=models.Q(('is_approved', False), ('reviewed_at__isnull', True)), fields=['-created_at', '-id'], name='feedback_queue_idx'),
+        ),
+        migrations.RunPython(install_trigram_indexes, uninstall_trigram_indexes),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:12
+
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_registrations(apps, schema_editor):
+    """Count the enrollments from before the rollups, per course and local day."""
+    EnrollmentRollup = apps.get_model('courses', 'EnrollmentRollup')
+    Registration = apps.get_model('courses', 'Registration')
+    counts = (Registration.objects.filter(status='enrolled').annotate(day=TruncDate('registered_at'))
+              .values('day', 'course').annotate(total=Count('pk')).order_by())
+    EnrollmentRollup.objects.all().delete()
+    EnrollmentRollup.objects.bulk_create(
+        (EnrollmentRollup(day=row['day'], course_id=row['course'], count=row['total'])
+         for row in counts.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_enrollment_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_registrations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_backfill_enrollment_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['level', 'updated_at'], name='course_level_updated_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, router
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 class Course(models.Model):
     LEVELS = (
@@ -14,10 +16,57 @@ class Course(models.Model):
     duration_weeks = models.PositiveIntegerField()
     description = models.TextField()
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    capacity = models.PositiveIntegerField(null=True, blank=True,
+                                           help_text="Number of seats; leave empty for no limit.")
+    # Maintained by courses/enrollment.py, never counted per page view
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False)
+    # Drives the API's ETag / Last-Modified; enrollment.py bumps it with the seat count
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on the courses page orders by (level, id)
+            models.Index(fields=['level', 'id'], name='course_level_id_idx'),
+            # The API's list ETags (courses/api.py)
+            models.Index(fields=['level', 'updated_at'], name='course_level_updated_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(capacity__isnull=True) | models.Q(enrolled_count__lte=models.F('capacity')),
+                name='course_not_oversold',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.level})"
 
+    def save(self, *args, **kwargs):
+        # enrolled_count only changes through courses/enrollment.py's F() updates; writing back
+        # the value read when this instance was loaded would undo seats taken since.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                       if not f.primary_key and f.name != 'enrolled_count']
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        enrolled = self.enrolled_count
+        if self.pk:   # the current count on the primary, not the one read when the form loaded
+            enrolled = (Course.objects.using(router.db_for_write(Course)).filter(pk=self.pk)
+                        .values_list('enrolled_count', flat=True).first() or 0)
+        if self.capacity is not None and self.capacity < enrolled:
+            raise ValidationError({'capacity': f"{enrolled} students are already enrolled."})
+
+    @property
+    def seats_left(self):
+        """Free seats, or None when the course has no capacity limit."""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.enrolled_count, 0)
+
+    @property
+    def is_full(self):
+        return self.seats_left == 0
+
 
 class Student(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -30,10 +79,29 @@ class Student(models.Model):
 
 
 class Registration(models.Model):
+    """Create and delete through courses/enrollment.py so seats stay counted."""
+    STATUSES = (
+        ('enrolled', 'Enrolled'),
+        ('waitlisted', 'Waitlisted'),
+    )
+
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     registered_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='enrolled')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_registration'),
+        ]
+        indexes = [
+            # Date-range exports and the registered_at list filter in the admin
+            models.Index(fields=['registered_at'], name='registration_date_idx'),
+            # Waitlist promotion: oldest waitlisted registration per course
+            models.Index(fields=['course', 'registered_at'], condition=models.Q(status='waitlisted'),
+                         name='registration_waitlist_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} -> {self.course.code}"
@@ -53,7 +121,99 @@ class Feedback(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     is_approved = models.BooleanField(default=False)  # Admin approves for homepage
+    reviewed_at = models.DateTimeField(null=True, blank=True)  # approved or rejected by staff
+
+    class Meta:
+        indexes = [
+            # Homepage testimonials: filter(is_approved=True).order_by('-created_at')
+            models.Index(fields=['-created_at'], condition=models.Q(is_approved=True),
+                         name='feedback_approved_idx'),
+            # Moderation queue (courses/moderation.py): unreviewed, newest first, keyset paged
+            models.Index(fields=['-created_at', '-id'],
+                         condition=models.Q(is_approved=False, reviewed_at__isnull=True),
+                         name='feedback_queue_idx'),
+            # Date-range CSV exports from the admin
+            models.Index(fields=['created_at'], name='feedback_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.full_name} — {self.rating}★"
 
+
+class Notification(models.Model):
+    """Outbox row for a WhatsApp message; drained by `manage.py send_notifications`."""
+    PROVIDERS = (
+        ('meta', 'Meta WhatsApp Cloud'),
+        ('twilio', 'Twilio'),
+    )
+    STATUSES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    provider = models.CharField(max_length=10, choices=PROVIDERS)
+    to_number = models.CharField(max_length=20)
+    message = models.TextField()
+
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set for an announcement's recipients, which send_announcements delivers instead of
+    # send_notifications; the unique constraint below indexes it.
+    announcement = models.ForeignKey('Announcement', on_delete=models.CASCADE, null=True, blank=True,
+                                     db_index=False, related_name='notifications')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_queue_idx'),
+        ]
+        constraints = [
+            # One message per phone number and announcement, however often fan-out reruns
+            models.UniqueConstraint(fields=['announcement', 'to_number'],
+                                    name='notification_announcement_recipient_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} -> {self.to_number} ({self.status})"
+
+
+class Announcement(models.Model):
+    """A message to everyone registered for a course; sent by `manage.py send_announcements`."""
+    STATUSES = (
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('done', 'Done'),
+    )
+
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    message = models.TextField()
+    provider = models.CharField(max_length=10, choices=Notification.PROVIDERS)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    # Registrations up to this id have their Notification rows (see courses/announcements.py)
+    fanned_out_to = models.PositiveBigIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.course.code}: {self.message[:40]}"
+
+
+class EnrollmentRollup(models.Model):
+    """Registrations per course and day, kept by courses/rollups.py for the stats dashboard."""
+    day = models.DateField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index for the dashboard's day range
+            models.UniqueConstraint(fields=['day', 'course'], name='rollup_day_course_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.course_id}: {self.count}"
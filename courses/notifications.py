@@ -0,0 +1,306 @@
+"""
+WhatsApp notifications.
+
+Views never talk to Meta/Twilio directly any more: they call
+`queue_owner_notification()`, which only inserts a `Notification` row.
+`manage.py send_notifications` drains that outbox in batches, sending over a
+shared keep-alive HTTP session with a bounded thread pool, and retries
+failures with exponential backoff.
+
+With NOTIFICATION_SEND_INLINE (useful only under ASGI) the async
+registration view also tries to send straight away over aiohttp, in a
+background task on the event loop. The row is leased first, so the outbox
+worker only picks it up if that attempt fails or never finishes.
+
+Credentials are read from the environment, as before:
+  Meta:   WHATSAPP_PHONE_NUMBER_ID, WHATSAPP_ACCESS_TOKEN
+  Twilio: TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_WHATSAPP_FROM
+  Owner:  OWNER_WHATSAPP_NUMBER
+"""
+import asyncio
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Notification
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """One pooled `requests.Session` per process, so connections are reused."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=max(settings.NOTIFICATION_WORKERS, 1),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+# --- WhatsApp helper functions ---
+# Each provider function returns (url, request kwargs), or None when its
+# credentials are missing, so the sync and async senders share them.
+def meta_request(phone_to_send, message_text):
+    """Request for the Meta WhatsApp Cloud API."""
+    phone_id = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')  # e.g. '1234567890'
+    token = os.environ.get('WHATSAPP_ACCESS_TOKEN')
+    if not phone_id or not token:
+        print("WhatsApp Meta credentials missing.")
+        return None
+    url = f"{settings.WHATSAPP_API_BASE}/{phone_id}/messages"
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": phone_to_send,
+        "type": "text",
+        "text": {"body": message_text}
+    }
+    return url, {'headers': headers, 'json': payload}
+
+
+def twilio_request(to_number, message_text):
+    """Request for Twilio's Messages REST endpoint."""
+    tw_sid = os.environ.get('TWILIO_ACCOUNT_SID')
+    tw_token = os.environ.get('TWILIO_AUTH_TOKEN')
+    tw_from = os.environ.get('TWILIO_WHATSAPP_FROM')  # e.g. 'whatsapp:+1415XXXXXXX'
+    if not (tw_sid and tw_token and tw_from):
+        print("Twilio config missing")
+        return None
+    url = f"{settings.TWILIO_API_BASE}/Accounts/{tw_sid}/Messages.json"
+    data = {"Body": message_text, "From": tw_from, "To": f"whatsapp:{to_number}"}
+    return url, {'auth': (tw_sid, tw_token), 'data': data}
+
+
+PROVIDER_REQUESTS = {
+    'meta': meta_request,
+    'twilio': twilio_request,
+}
+
+
+def _send(provider, to_number, message_text):
+    request = PROVIDER_REQUESTS[provider](to_number, message_text)
+    if request is None:
+        return False
+    url, kwargs = request
+    resp = get_session().post(url, timeout=settings.NOTIFICATION_TIMEOUT, **kwargs)
+    return resp.status_code in (200, 201)
+
+
+def send_whatsapp_via_meta(phone_to_send, message_text):
+    """Send a text message through the Meta WhatsApp Cloud API."""
+    return _send('meta', phone_to_send, message_text)
+
+
+def send_whatsapp_via_twilio(to_number, message_text):
+    """Send a WhatsApp message through Twilio's Messages REST endpoint."""
+    return _send('twilio', to_number, message_text)
+
+
+SENDERS = {
+    'meta': send_whatsapp_via_meta,
+    'twilio': send_whatsapp_via_twilio,
+}
+
+
+def configured_provider():
+    """Provider to use for new messages, or None if nothing is configured."""
+    if os.environ.get('WHATSAPP_ACCESS_TOKEN'):
+        return 'meta'
+    if os.environ.get('TWILIO_ACCOUNT_SID'):
+        return 'twilio'
+    return None
+
+
+def queue_owner_notification(message_text):
+    """Queue a message for the school owner. Returns the Notification or None."""
+    owner_whatsapp = os.environ.get('OWNER_WHATSAPP_NUMBER')
+    provider = configured_provider()
+    if not (owner_whatsapp and provider):
+        return None
+    return Notification.objects.create(
+        provider=provider,
+        to_number=owner_whatsapp,
+        message=message_text,
+    )
+
+
+# Strong references to in-flight inline sends; the loop only keeps weak ones.
+_inline_tasks = set()
+
+
+async def aqueue_owner_notification(message_text):
+    """
+    Async `queue_owner_notification()`. With NOTIFICATION_SEND_INLINE the
+    message is also sent right away in a background task.
+    """
+    owner_whatsapp = os.environ.get('OWNER_WHATSAPP_NUMBER')
+    provider = configured_provider()
+    if not (owner_whatsapp and provider):
+        return None
+    fields = {'provider': provider, 'to_number': owner_whatsapp, 'message': message_text}
+    if not settings.NOTIFICATION_SEND_INLINE:
+        return await Notification.objects.acreate(**fields)
+
+    notification = await Notification.objects.acreate(next_attempt_at=lease_until(), **fields)
+    task = asyncio.create_task(asend_now(notification))
+    _inline_tasks.add(task)
+    task.add_done_callback(_inline_tasks.discard)
+    return notification
+
+
+async def asend_now(notification):
+    """Deliver one already-leased notification and record the result."""
+    ok, error = await adeliver(notification)
+    record_result(notification, ok, error, timezone.now())
+    await notification.asave(update_fields=RESULT_FIELDS)
+
+
+# --- outbox worker ---
+RESULT_FIELDS = ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+
+
+def lease_until(now=None, seconds=None):
+    """
+    Until when a claimed notification is hidden from other workers; by
+    default long enough for one send.
+    """
+    seconds = seconds or settings.NOTIFICATION_TIMEOUT * 2
+    return (now or timezone.now()) + timedelta(seconds=seconds)
+
+
+def batch_lease_seconds(batch_size, workers):
+    """
+    A lease covering a whole batch: every round of `workers` sends may take
+    the full timeout, plus one timeout of margin for the bookkeeping. A
+    shorter lease would let a second worker re-claim rows still in flight.
+    """
+    return (math.ceil(batch_size / max(workers, 1)) + 1) * settings.NOTIFICATION_TIMEOUT
+
+
+def claim_batch(batch_size, announcement=None, lease_seconds=None):
+    """
+    Lock up to `batch_size` due notifications and lease them to this worker by
+    pushing `next_attempt_at` forward by `lease_seconds`, so a second worker
+    won't pick them up until this one had time to send them all.
+    Only the given announcement's recipients are claimed, or with None only
+    messages outside any announcement (see courses/announcements.py).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = (Notification.objects
+              .filter(status='pending', next_attempt_at__lte=now, announcement=announcement)
+              .order_by('next_attempt_at', 'id'))
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        batch = list(qs[:batch_size])
+        if batch:
+            Notification.objects.filter(pk__in=[n.pk for n in batch]).update(
+                next_attempt_at=lease_until(now, lease_seconds)
+            )
+    return batch
+
+
+def deliver(notification):
+    """Send one notification. Returns (ok, error_text); never raises."""
+    sender = SENDERS.get(notification.provider)
+    if sender is None:
+        return False, f"Unknown provider {notification.provider!r}"
+    try:
+        if sender(notification.to_number, notification.message):
+            return True, ''
+        return False, 'Provider rejected the message'
+    except Exception as exc:   # any error: one bad send must not lose the batch's results
+        return False, str(exc) or exc.__class__.__name__
+
+
+async def adeliver(notification, session=None):
+    """
+    `deliver()` over aiohttp, for use on an event loop. Pass a `session` to
+    share its connections between many sends.
+    """
+    if session is None:
+        timeout = aiohttp.ClientTimeout(total=settings.NOTIFICATION_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            return await adeliver(notification, session)
+
+    build = PROVIDER_REQUESTS.get(notification.provider)
+    if build is None:
+        return False, f"Unknown provider {notification.provider!r}"
+    request = build(notification.to_number, notification.message)
+    if request is None:
+        return False, 'Provider rejected the message'
+    url, kwargs = request
+    if 'auth' in kwargs:
+        kwargs['auth'] = aiohttp.BasicAuth(*kwargs['auth'])
+    try:
+        async with session.post(url, **kwargs) as resp:
+            if resp.status in (200, 201):
+                return True, ''
+            return False, 'Provider rejected the message'
+    except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+        return False, str(exc) or exc.__class__.__name__
+
+
+def record_result(notification, ok, error, now):
+    """Apply one delivery attempt to `notification`; returns 'sent', 'retried' or 'failed'."""
+    notification.attempts += 1
+    if ok:
+        notification.status = 'sent'
+        notification.sent_at = now
+        notification.last_error = ''
+        return 'sent'
+    notification.last_error = error
+    if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        notification.status = 'failed'
+        return 'failed'
+    notification.next_attempt_at = now + timedelta(seconds=backoff_delay(notification.attempts))
+    return 'retried'
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number `attempts` (1-based), capped."""
+    delay = settings.NOTIFICATION_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    return min(delay, settings.NOTIFICATION_RETRY_MAX_SECONDS)
+
+
+def drain_outbox(batch_size=None, workers=None):
+    """
+    Send one batch of due notifications concurrently and record the results.
+
+    Only the HTTP calls run on the thread pool; claiming and bookkeeping stay
+    on the calling thread. Returns a dict of counts: sent, retried, failed.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    workers = workers or settings.NOTIFICATION_WORKERS
+
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    batch = claim_batch(batch_size, lease_seconds=batch_lease_seconds(batch_size, workers))
+    if not batch:
+        return counts
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(batch))) as pool:
+        results = list(pool.map(deliver, batch))
+
+    now = timezone.now()
+    for notification, (ok, error) in zip(batch, results):
+        counts[record_result(notification, ok, error, now)] += 1
+
+    Notification.objects.bulk_update(batch, RESULT_FIELDS)
+    return counts
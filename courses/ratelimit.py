@@ -0,0 +1,129 @@
+"""
+Cache-backed token buckets for the login and registration forms.
+
+Every POST takes a token from a bucket for the client IP and, on login, one
+for the submitted username, *before* the view authenticates or hashes
+anything. An empty bucket gets a 429 with Retry-After, so a credential
+stuffing burst costs a cache round-trip per attempt instead of a full
+password hash, and cannot pin every worker's CPU.
+
+Rates come from AUTH_RATE_LIMIT_IP / AUTH_RATE_LIMIT_USERNAME ("N/s", "N/m"
+or "N/h"; empty disables). A bucket allows N attempts per period, counted
+as a sliding window: one counter per period, created with cache.add and
+bumped with cache.incr (atomic in Redis, Memcached and LocMemCache, so
+racing requests can't all take the last token), plus the previous
+period's counter weighted by how much of it still overlaps the window.
+Rejected attempts count too. Buckets live in the default cache, so share
+it between workers (see CACHES in settings).
+
+Behind a reverse proxy every request comes from the proxy's address, so
+set TRUSTED_PROXY_COUNT (the default on Render, see settings); otherwise
+all clients share one IP bucket.
+"""
+import hashlib
+import logging
+import math
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+logger = logging.getLogger('courses.ratelimit')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_rate(rate):
+    """'5/m' -> (5, 60); '' -> None."""
+    if not rate:
+        return None
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period]
+
+
+def take(key, limit, period):
+    """Count one attempt in bucket `key`. Returns 0 if allowed, else seconds to wait."""
+    now = time.time()
+    window, elapsed = divmod(now, period)
+    current = f"{key}:{int(window)}"
+    # Kept for two periods: the next one weighs it as its previous window.
+    cache.add(current, 0, 2 * period)
+    try:
+        count = cache.incr(current)
+    except ValueError:   # evicted since the add
+        cache.set(current, 1, 2 * period)
+        count = 1
+    previous = cache.get(f"{key}:{int(window) - 1}", 0)
+    excess = previous * (1 - elapsed / period) + count - limit
+    if excess <= 0:
+        return 0
+    if count <= limit:
+        # The previous window's share drains at previous / period per second.
+        return max(1, math.ceil(excess * period / previous))
+    return max(1, math.ceil(period - elapsed))
+
+
+def client_ip(request):
+    """REMOTE_ADDR, or the X-Forwarded-For entry added by the last trusted proxy."""
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return hops[-min(proxies, len(hops))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _bucket(scope, value):
+    digest = hashlib.sha256(value.encode()).hexdigest()[:32]
+    return f"ratelimit:{scope}:{digest}"
+
+
+def retry_after(request, scope, by_username):
+    """Seconds the client must wait before this POST is allowed, or 0."""
+    checks = [('ip', client_ip(request), settings.AUTH_RATE_LIMIT_IP)]
+    username = (request.POST.get('username') or '').strip().lower()
+    if by_username and username:
+        checks.append(('username', username, settings.AUTH_RATE_LIMIT_USERNAME))
+
+    for kind, value, rate in checks:
+        parsed = parse_rate(rate)
+        if parsed is None:
+            continue
+        wait = take(_bucket(f"{scope}:{kind}", value), *parsed)
+        if wait:
+            logger.warning("Rate limited %s by %s (%s)", scope, kind,
+                           value if kind == 'ip' else '<username>')
+            return wait
+    return 0
+
+
+def _rejected(request, wait):
+    response = render(request, 'courses/rate_limited.html', {'retry_after': wait}, status=429)
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def rate_limit_auth(scope, by_username=False):
+    """View decorator throttling POSTs; works on sync and async views."""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method == 'POST':
+                    wait = await sync_to_async(retry_after)(request, scope, by_username)
+                    if wait:
+                        return _rejected(request, wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method == 'POST':
+                    wait = retry_after(request, scope, by_username)
+                    if wait:
+                        return _rejected(request, wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
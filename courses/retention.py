@@ -0,0 +1,228 @@
+"""
+Data retention.
+
+`manage.py apply_retention` removes rows that are past RETENTION_DAYS from
+the hot tables:
+
+  sessions       expired sessions (deleted, not archived), when SESSION_MODE
+                 keeps them in the database; `manage.py purge_sessions`
+                 runs just this target
+  feedback       reviewed or approved feedback; the moderation queue is kept
+  registrations  registrations; the daily rollups (courses/rollups.py) keep
+                 their counts, and the enrolled ones give back their seats.
+                 backfill_rollups never rebuilds those days, or it would
+                 erase that history
+  signups        users who registered but never logged in, registered for
+                 nothing and left no feedback, with their Student profile
+
+Rows are first written to a gzipped JSONL file per target and run under
+RETENTION_ARCHIVE_DIR (flushed to disk before the delete), then deleted in
+primary-key ranges of RETENTION_BATCH_SIZE, each its own short transaction,
+so no long lock is held on the table. A run that is interrupted just
+leaves the remaining rows for the next one; at most the batch in flight
+also appears in that run's archive.
+
+Feedback and registrations are deleted with one plain DELETE by primary
+key per batch, without the ORM's per-row signals: the rollups must keep
+their history, and the testimonials cache and seat counts are updated once
+per batch instead. The seats given back go to the courses' waitlists
+(enrollment.fill_seats).
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connection, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest, Now
+from django.utils import timezone
+
+from . import catalog, enrollment
+from .models import Course, Feedback, Registration, Student
+
+
+def _cutoff(name, now):
+    return now - timedelta(days=settings.RETENTION_DAYS[name])
+
+
+def sessions_in_database():
+    return settings.SESSION_MODE in ('db', 'cached_db')
+
+
+def expired_sessions(now):
+    if not sessions_in_database():
+        return Session.objects.none()
+    return Session.objects.filter(expire_date__lt=now)
+
+
+def old_feedback(now):
+    return Feedback.objects.filter(Q(reviewed_at__isnull=False) | Q(is_approved=True),
+                                   created_at__lt=_cutoff('feedback', now))
+
+
+def old_registrations(now):
+    return Registration.objects.filter(registered_at__lt=_cutoff('registrations', now))
+
+
+def abandoned_signups(now):
+    return User.objects.filter(
+        ~Exists(Registration.objects.filter(student__user=OuterRef('pk'))),
+        ~Exists(Feedback.objects.filter(student__user=OuterRef('pk'))),
+        last_login__isnull=True, is_staff=False, is_superuser=False,
+        date_joined__lt=_cutoff('signups', now),
+    )
+
+
+def _delete_sessions(queryset, rows):
+    return queryset.delete()[0]
+
+
+def _delete_rows(model, keys):
+    """One DELETE by primary key; no collector, cascades or signals."""
+    if not keys:
+        return 0
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {qn(model._meta.db_table)} WHERE {qn(model._meta.pk.column)} "
+                       f"IN ({', '.join(['%s'] * len(keys))})", keys)
+        return cursor.rowcount
+
+
+def _delete_feedback(queryset, rows):
+    deleted = _delete_rows(Feedback, list(queryset.values_list('pk', flat=True)))
+    catalog.bump_version(catalog.TESTIMONIALS)
+    return deleted
+
+
+def _delete_registrations(queryset, rows):
+    # Read again in the delete's transaction: a waitlisted row may have been promoted since.
+    current = list(queryset.values_list('pk', 'course', 'status', 'student'))
+    deleted = _delete_rows(Registration, [pk for pk, _, _, _ in current])
+    seats = Counter(course for _, course, status, _ in current if status == 'enrolled')
+    if seats:
+        # Their seats, in one UPDATE; the Greatest matches release_seat() for uncounted rows.
+        Course.objects.filter(pk__in=seats).update(
+            enrolled_count=Greatest(F('enrolled_count') - Case(
+                *[When(pk=pk, then=Value(n)) for pk, n in seats.items()], default=Value(0)), Value(0)),
+            updated_at=Now())
+        for course_id in seats:
+            enrollment.fill_seats(course_id)
+    students = {student for _, _, _, student in current}
+    transaction.on_commit(lambda: enrollment.forget_statuses(*students))
+    return deleted
+
+
+def _delete_signups(queryset, rows):
+    # Few rows; the normal delete cascades to the Student and sends its signals.
+    return queryset.delete()[1].get(User._meta.label, 0)
+
+
+def _signup_rows(queryset):
+    students = {student['user']: student for student in
+                Student.objects.filter(user__in=[user['id'] for user in queryset])
+                .values('id', 'user', 'full_name', 'email', 'phone')}
+    return [{**user, 'student': students.get(user['id'])} for user in queryset]
+
+
+# name -> (rows due, archived fields or None to skip the archive, delete function)
+TARGETS = {
+    'sessions': (expired_sessions, None, _delete_sessions),
+    'feedback': (old_feedback, ('id', 'student', 'rating', 'message', 'is_approved',
+                                'reviewed_at', 'created_at'), _delete_feedback),
+    'registrations': (old_registrations, ('id', 'student', 'course', 'status', 'registered_at',
+                                          'notes'), _delete_registrations),
+    # Never the password hash
+    'signups': (abandoned_signups, ('id', 'username', 'email', 'first_name', 'last_name',
+                                    'date_joined'), _delete_signups),
+}
+
+
+def table_bytes(model):
+    """Size of the model's table and its indexes, or None if the database can't tell."""
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+            elif connection.vendor == 'sqlite':
+                # Needs SQLite built with the dbstat table (the default in CPython's builds)
+                cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                               "(SELECT name FROM sqlite_master WHERE tbl_name = %s)", [table])
+            else:
+                return None
+            return cursor.fetchone()[0]
+    except OperationalError:
+        return None
+
+
+def estimate(name, now=None):
+    """(rows due, estimated bytes reclaimed or None) for a dry run."""
+    queryset = TARGETS[name][0](now or timezone.now())
+    due = queryset.count()
+    size = table_bytes(queryset.model)
+    if size is None:
+        return due, None
+    return due, size * due // queryset.model._default_manager.count() if due else 0
+
+
+def archive_path(name, now):
+    return Path(settings.RETENTION_ARCHIVE_DIR) / f"{name}-{now:%Y%m%dT%H%M%S}.jsonl.gz"
+
+
+def apply(name, now=None, batch_size=None, sleep=0.0):
+    """
+    Archive and delete one target's due rows; returns (deleted, archive path
+    or None). The cutoff is fixed at `now`, so rows coming due meanwhile are
+    left for the next run.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    rows_due, fields, delete = TARGETS[name]
+    queryset = rows_due(now).order_by('pk')
+    path = raw = archive = None
+    deleted, last = 0, None
+    try:
+        while True:
+            batch = queryset if last is None else queryset.filter(pk__gt=last)
+            if fields:
+                rows = list(batch.values(*fields)[:batch_size])
+                if name == 'signups':
+                    rows = _signup_rows(rows)
+                keys = [row['id'] for row in rows]
+            else:
+                rows = keys = list(batch.values_list('pk', flat=True)[:batch_size])
+            if not keys:
+                break
+
+            if fields:
+                if archive is None:
+                    path = archive_path(name, now)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    raw = open(path, 'wb')
+                    archive = gzip.GzipFile(fileobj=raw, mode='wb')
+                archive.write(''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+                                      for row in rows).encode())
+                # On disk before the rows are gone
+                archive.flush()
+                os.fsync(raw.fileno())
+
+            # The range plus the retention filter again: only what was archived,
+            # and on the primary key index.
+            with transaction.atomic():
+                deleted += delete(rows_due(now).filter(pk__gte=keys[0], pk__lte=keys[-1]), rows)
+            last = keys[-1]
+            if sleep:
+                time.sleep(sleep)
+    finally:
+        if archive is not None:
+            archive.close()
+            raw.close()
+    return deleted, path
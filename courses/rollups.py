@@ -0,0 +1,170 @@
+"""
+Daily enrollment rollups.
+
+`EnrollmentRollup` holds the number of enrolled registrations per course
+and local day of registration (TIME_ZONE), so the staff stats dashboard
+reads at most days x courses small rows instead of aggregating the whole
+Registration table. Waitlisted registrations hold no seat and pay nothing,
+so they are left out until they are promoted. Revenue is enrollments x
+Course.price, joined in when the dashboard is read, so it always uses the
+current prices.
+
+The rows are maintained incrementally by record(): one upsert (INSERT ...
+ON CONFLICT DO UPDATE) or UPDATE per enrollment, called from the
+Registration post_save / post_delete signals (courses/signals.py) for
+enrolled rows and from enrollment.fill_seats() for promotions. Migration
+0014 counted the enrollments from before the rollups existed, so a delete
+always finds its registration counted. bulk_create and raw
+SQL bypass the signals; run `manage.py backfill_rollups` afterwards to
+rebuild the affected days from Registration.
+
+Retention (courses/retention.py) deletes registrations past
+RETENTION_DAYS['registrations'] but keeps their rollups, which are then
+the only record of those days. backfill() therefore never rebuilds the
+day of the retention cutoff or any day before it (first_rebuildable_day()).
+
+backfill() counts and rewrites each chunk of days in one transaction that
+first locks the rollup table against record() (PostgreSQL; SQLite's
+IMMEDIATE transactions already exclude other writers), so a registration
+saved meanwhile is either in its count or added after it, never lost.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import Course, EnrollmentRollup, Registration
+
+REVENUE = Sum(ExpressionWrapper(F('count') * F('course__price'),
+                                output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+
+# PostgreSQL and SQLite add to the row or create it in one statement.
+UPSERT_SQL = """
+    INSERT INTO {table} (day, course_id, {count}) VALUES (%s, %s, %s)
+    ON CONFLICT (day, course_id)
+    DO UPDATE SET {count} = {table}.{count} + excluded.{count}
+"""
+
+
+def record(course_id, registered_at, delta):
+    """Add `delta` enrollments to the course's rollup for the day of `registered_at`."""
+    day = timezone.localdate(registered_at)
+    if delta > 0 and connection.vendor in ('postgresql', 'sqlite'):
+        qn = connection.ops.quote_name
+        sql = UPSERT_SQL.format(table=qn(EnrollmentRollup._meta.db_table), count=qn('count'))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [connection.ops.adapt_datefield_value(day), course_id, delta])
+        return
+    rows = EnrollmentRollup.objects.filter(day=day, course_id=course_id)
+    if rows.update(count=Greatest(F('count') + delta, 0)) or delta < 0:
+        # A delete never creates a row: its course may be being deleted too, and a
+        # registration from before the backfill was never counted.
+        return
+    try:
+        with transaction.atomic():
+            EnrollmentRollup.objects.create(day=day, course_id=course_id, count=delta)
+    except IntegrityError:
+        # Another request created the row first.
+        rows.update(count=F('count') + delta)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def first_rebuildable_day(now=None):
+    """The oldest day whose registrations retention hasn't started deleting."""
+    cutoff = (now or timezone.now()) - timedelta(days=settings.RETENTION_DAYS['registrations'])
+    return timezone.localdate(cutoff) + timedelta(days=1)
+
+
+def lock_rollups():
+    """Hold off record() until the current transaction ends; waits for those in flight."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # Conflicts with the ROW EXCLUSIVE lock every INSERT/UPDATE/DELETE takes, and with itself.
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(EnrollmentRollup._meta.db_table)} "
+                           "IN SHARE ROW EXCLUSIVE MODE")
+
+
+def backfill(start=None, end=None, chunk_days=31):
+    """
+    Rebuild the rollups of local days start..end (default: all history) from
+    the enrolled registrations, `chunk_days` days per transaction so no
+    single statement scans the whole table. Yields (first_day, last_day,
+    rows) per chunk. Days retention may have purged are left alone: `start`
+    is moved up to first_rebuildable_day().
+    """
+    if start is None or end is None:
+        bounds = Registration.objects.aggregate(first=Min('registered_at'), last=Max('registered_at'))
+        if bounds['first'] is None:
+            return
+        start = start or timezone.localdate(bounds['first'])
+        end = end or timezone.localdate(bounds['last'])
+    start = max(start, first_rebuildable_day())
+
+    day = start
+    while day <= end:
+        last = min(day + timedelta(days=chunk_days - 1), end)
+        with transaction.atomic():
+            lock_rollups()
+            # Counted after the lock: every registration committed before it is
+            # included, and record() for any later one waits for this commit.
+            counts = list(Registration.objects
+                          .filter(status='enrolled', registered_at__gte=_day_start(day),
+                                  registered_at__lt=_day_start(last + timedelta(days=1)))
+                          .annotate(day=TruncDate('registered_at'))
+                          .values('day', 'course').annotate(total=Count('pk')).order_by())
+            EnrollmentRollup.objects.filter(day__range=(day, last)).delete()
+            rows = EnrollmentRollup.objects.bulk_create([
+                EnrollmentRollup(day=row['day'], course_id=row['course'], count=row['total'])
+                for row in counts
+            ])
+        yield day, last, len(rows)
+        day = last + timedelta(days=1)
+
+
+def _with_bars(rows, key):
+    """Add `bar`, the row's `key` as a percentage of the largest, for the CSS bar charts."""
+    peak = max((row[key] or 0 for row in rows), default=0)
+    for row in rows:
+        row['bar'] = round(100 * (row[key] or 0) / peak) if peak else 0
+    return rows
+
+
+def dashboard(start, end, level=None, course_id=None, top=20):
+    """
+    Registrations and revenue for local days start..end, read from the
+    rollups only: totals, a row per day (days without registrations
+    included), per level, and the `top` courses by revenue.
+    """
+    rows = EnrollmentRollup.objects.filter(day__range=(start, end))
+    if level:
+        rows = rows.filter(course__level=level)
+    if course_id:
+        rows = rows.filter(course_id=course_id)
+    totals = Sum('count')
+
+    by_day = {row['day']: row for row in
+              rows.values('day').annotate(registrations=totals, revenue=REVENUE).order_by()}
+    daily = [by_day.get(start + timedelta(days=n), {'day': start + timedelta(days=n),
+                                                    'registrations': 0, 'revenue': 0})
+             for n in range((end - start).days + 1)]
+    per_level = list(rows.values('course__level').annotate(registrations=totals, revenue=REVENUE)
+                     .order_by('course__level'))
+    per_course = list(rows.values('course_id', 'course__code', 'course__title')
+                      .annotate(registrations=totals, revenue=REVENUE).order_by('-revenue')[:top])
+    level_names = dict(Course.LEVELS)
+    for row in per_level:
+        row['level'] = level_names.get(row['course__level'], row['course__level'])
+
+    return {
+        'totals': rows.aggregate(registrations=totals, revenue=REVENUE),
+        'daily': _with_bars(daily, 'registrations'),
+        'per_level': _with_bars(per_level, 'revenue'),
+        'per_course': _with_bars(per_course, 'revenue'),
+    }
@@ -0,0 +1,112 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, reads of the catalog models (Course,
+Feedback) go to a random replica; everything else, and every write, uses
+the primary ("default").
+
+Replicas lag, so reads go to the primary instead when
+  - this request has already written something (any db_for_write call), or
+  - this client wrote within the last REPLICA_STICKY_SECONDS, remembered in
+    a small cookie set by ReplicaPinMiddleware, or
+  - the code runs inside `use_primary()` (the catalog cache builds do, so a
+    lagging replica never gets cached for CATALOG_CACHE_TIMEOUT).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = 'default'
+PIN_COOKIE = 'pin_primary'
+
+_request_state = ContextVar('replica_request_state', default=None)
+_pinned = ContextVar('replica_pinned', default=False)
+
+
+class RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    replica_models = {'courses.course', 'courses.feedback'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in self.replica_models or _pinned.get():
+            return PRIMARY
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return PRIMARY
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        pool = {PRIMARY, *settings.REPLICA_DATABASES}
+        return obj1._state.db in pool and obj2._state.db in pool
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaPinMiddleware:
+    """
+    Tracks writes per request and pins the client to the primary for
+    REPLICA_STICKY_SECONDS after one. Place it above SessionMiddleware so
+    session saves count as writes too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.pin(response, state)
+
+    def pin(self, response, state):
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
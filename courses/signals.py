@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, enrollment, rollups
+from .models import Course, Feedback, Registration, Student
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_catalog(sender, **kwargs):
+    catalog.bump_version(catalog.CATALOG)
+
+
+@receiver([post_save, post_delete], sender=Feedback)
+@receiver([post_save, post_delete], sender=Student)  # testimonials show the student's name
+def invalidate_testimonials(sender, **kwargs):
+    catalog.bump_version(catalog.TESTIMONIALS)
+
+
+@receiver([post_save, post_delete], sender=Registration)
+def forget_enrollments(sender, instance, **kwargs):
+    enrollment.forget_statuses(instance.student_id)
+
+
+@receiver(post_delete, sender=Registration)
+def release_seat(sender, instance, **kwargs):
+    if instance.status == 'enrolled':
+        enrollment.release_seat(instance.course_id)
+
+
+# Rollups count enrollments: a waitlisted registration is counted once fill_seats() promotes it.
+@receiver(post_save, sender=Registration)
+def count_registration(sender, instance, created, **kwargs):
+    if created and instance.status == 'enrolled':
+        rollups.record(instance.course_id, instance.registered_at, 1)
+
+
+@receiver(post_delete, sender=Registration)
+def uncount_registration(sender, instance, **kwargs):
+    if instance.status == 'enrolled':
+        rollups.record(instance.course_id, instance.registered_at, -1)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's hashed, pre-compressed storage. Unless STATIC_MANIFEST_STRICT
+    (the default without DEBUG, outside tests), a file that is not in the
+    manifest gets its plain URL, so tests, benchmarks and a DEBUG=False
+    runserver work before collectstatic has run.
+    """
+
+    @property
+    def manifest_strict(self):
+        return settings.STATIC_MANIFEST_STRICT
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.manifest_strict:
+                raise
+            return name
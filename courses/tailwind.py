@@ -0,0 +1,60 @@
+"""
+Prebuilt Tailwind stylesheet.
+
+`manage.py build_css` runs the Tailwind standalone CLI (one binary, no Node
+and no network; TAILWIND_CLI) over the templates and the app's Python
+(forms.py puts classes on widgets), so only the classes they use are
+generated, and writes them minified together with courses/css/style.css to
+courses/css/site.css. build.sh runs it on every deploy, before
+collectstatic hashes and pre-compresses it like any other static file.
+
+`{% tailwind_css %}` (courses/templatetags/tailwind.py) links site.css, or
+the Play CDN, which compiles in the browser, when TAILWIND_CDN is on (the
+default with DEBUG). With TAILWIND_CDN off and no site.css, the courses.E001
+system check fails collectstatic and `check`, and the tag raises rather
+than quietly serving the CDN in production.
+"""
+import subprocess
+import tempfile
+from functools import cache
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent
+STATIC_DIR = APP_DIR / 'static'
+TEMPLATES_DIR = APP_DIR / 'templates' / 'courses'
+SOURCE_CSS = 'courses/css/style.css'
+OUTPUT_CSS = 'courses/css/site.css'
+CDN_URL = 'https://cdn.tailwindcss.com'
+
+# Tailwind v3, the version the Play CDN serves.
+CONFIG = """module.exports = {
+  content: [%s],
+  theme: { extend: {} },
+  plugins: [],
+};
+"""
+
+
+def content_globs():
+    return [str(TEMPLATES_DIR / '**' / '*.html'), str(APP_DIR / '**' / '*.py')]
+
+
+def build(cli):
+    """Compile OUTPUT_CSS with the Tailwind CLI at `cli`; returns its path."""
+    output = STATIC_DIR / OUTPUT_CSS
+    with tempfile.TemporaryDirectory() as tmp:
+        config = Path(tmp) / 'tailwind.config.js'
+        config.write_text(CONFIG % ', '.join(f"'{glob}'" for glob in content_globs()))
+        source = Path(tmp) / 'input.css'
+        # style.css first: with the CDN, Tailwind's generated styles are injected after it.
+        source.write_text((STATIC_DIR / SOURCE_CSS).read_text()
+                          + '\n@tailwind base;\n@tailwind components;\n@tailwind utilities;\n')
+        subprocess.run([cli, '-c', str(config), '-i', str(source), '-o', str(output), '--minify'],
+                       check=True, capture_output=True, text=True)
+    is_built.cache_clear()
+    return output
+
+
+@cache
+def is_built():
+    return (STATIC_DIR / OUTPUT_CSS).exists()
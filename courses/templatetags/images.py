@@ -0,0 +1,39 @@
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from courses import images
+
+register = template.Library()
+
+
+def _srcset(variants):
+    return ', '.join(f"{static(name)} {width}w" for width, name in variants)
+
+
+@register.simple_tag
+def responsive_image(path, alt='', sizes='100vw', loading='lazy', **attrs):
+    """
+    <picture> with AVIF and WebP sources and a JPEG/PNG <img>, from the
+    build_images manifest. `path` is the original's static path; extra
+    keyword arguments (class=..., fetchpriority=...) go on the <img>.
+    Falls back to a plain <img> for images without variants.
+
+        {% responsive_image 'courses/images/german_logo_1.png' alt='Logo' sizes='44px' class='h-11 w-11' %}
+    """
+    entry = images.manifest().get(path)
+    if entry is None:
+        return format_html('<img src="{}" alt="{}" loading="{}"{}>', static(path), alt, loading, flatatt(attrs))
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((images.FORMATS[fmt][2], _srcset(entry['srcset'][fmt]), sizes) for fmt in images.MODERN_FORMATS),
+    )
+    fallback = entry['srcset'][entry['fallback']]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'loading="{}" decoding="async"{}></picture>',
+        sources, static(fallback[-1][1]), _srcset(fallback), sizes, entry['width'], entry['height'],
+        alt, loading, flatatt(attrs),
+    )
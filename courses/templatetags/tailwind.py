@@ -0,0 +1,21 @@
+from django import template
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from courses import tailwind
+
+register = template.Library()
+
+
+@register.simple_tag
+def tailwind_css():
+    """The prebuilt stylesheet, or the CDN compiler plus style.css (see courses/tailwind.py)."""
+    if settings.TAILWIND_CDN:
+        return format_html('<script src="{}"></script>\n  <link rel="stylesheet" href="{}">',
+                           tailwind.CDN_URL, static(tailwind.SOURCE_CSS))
+    if not tailwind.is_built():
+        raise ImproperlyConfigured(f"{tailwind.OUTPUT_CSS} has not been built; run `manage.py build_css` "
+                                   "or set TAILWIND_CDN=True.")
+    return format_html('<link rel="stylesheet" href="{}">', static(tailwind.OUTPUT_CSS))
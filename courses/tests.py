@@ -1,3 +1,1612 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, ValidationError
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.management.base import SystemCheckError
+from django.db import connection, connections
+from django.db.models.functions import Now
+from django.test import (RequestFactory, TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (announcements, catalog, checks, enrollment, images, notifications, ratelimit, retention,
+               rollups, tailwind)
+from .instrumentation import pool_stats
+from .models import Announcement, Course, EnrollmentRollup, Feedback, Notification, Registration, Student
+from .notifications import aqueue_owner_notification, drain_outbox
+from .routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, use_primary
+from .search import search_courses
+
+
+class StubProviderServer:
+    """Local HTTP server standing in for the Meta / Twilio APIs."""
+
+    def __init__(self, status=200):
+        self.status = status
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                stub.requests.append((self.path, self.rfile.read(length)))
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+META_ENV = {
+    'OWNER_WHATSAPP_NUMBER': '+491700000000',
+    'WHATSAPP_PHONE_NUMBER_ID': '12345',
+    'WHATSAPP_ACCESS_TOKEN': 'token',
+}
+TWILIO_ENV = {
+    'OWNER_WHATSAPP_NUMBER': '+491700000000',
+    'TWILIO_ACCOUNT_SID': 'AC123',
+    'TWILIO_AUTH_TOKEN': 'secret',
+    'TWILIO_WHATSAPP_FROM': 'whatsapp:+14150000000',
+}
+
+
+@override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+class NotificationOutboxTests(TestCase):
+
+    def register(self, **extra):
+        data = {
+            'username': 'anna', 'full_name': 'Anna Schmidt', 'email': 'anna@example.com',
+            'phone': '+491701111111', 'password': 'secret123', 'confirm_password': 'secret123',
+        }
+        data.update(extra)
+        return self.client.post(reverse('courses:register'), data)
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_register_queues_without_calling_provider(self):
+        course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                       duration_weeks=8, description='Basics')
+        with StubProviderServer() as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            response = self.register(course=course.id)
+
+        self.assertRedirects(response, reverse('courses:login'), fetch_redirect_response=False)
+        self.assertEqual(stub.requests, [])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.provider, 'meta')
+        self.assertEqual(notification.status, 'pending')
+        self.assertIn('A1-01', notification.message)
+
+    def test_register_without_owner_number_queues_nothing(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.register()
+        self.assertFalse(Notification.objects.exists())
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_drain_sends_via_meta(self):
+        for i in range(3):
+            Notification.objects.create(provider='meta', to_number='+4917', message=f"hi {i}")
+
+        with StubProviderServer() as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            counts = drain_outbox(batch_size=10, workers=2)
+
+        self.assertEqual(counts, {'sent': 3, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(stub.requests), 3)
+        path, body = stub.requests[0]
+        self.assertEqual(path, '/12345/messages')
+        self.assertEqual(json.loads(body)['messaging_product'], 'whatsapp')
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+    @mock.patch.dict(os.environ, TWILIO_ENV)
+    def test_drain_sends_via_twilio(self):
+        Notification.objects.create(provider='twilio', to_number='+4917', message='hi')
+
+        with StubProviderServer(status=201) as stub, override_settings(TWILIO_API_BASE=stub.url):
+            counts = drain_outbox()
+
+        self.assertEqual(counts['sent'], 1)
+        self.assertEqual(stub.requests[0][0], '/Accounts/AC123/Messages.json')
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_failures_back_off_then_give_up(self):
+        notification = Notification.objects.create(provider='meta', to_number='+4917', message='hi')
+
+        with StubProviderServer(status=500) as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            self.assertEqual(drain_outbox()['retried'], 1)
+            notification.refresh_from_db()
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+
+            # Not due yet, so nothing is claimed.
+            self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+            Notification.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.assertEqual(drain_outbox()['failed'], 1)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(len(stub.requests), 2)
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_unexpected_error_is_recorded(self):
+        Notification.objects.create(provider='meta', to_number='+4917', message='hi')
+        with mock.patch.dict(notifications.SENDERS, meta=mock.Mock(side_effect=ValueError('bad'))):
+            self.assertEqual(drain_outbox()['retried'], 1)
+        self.assertEqual(Notification.objects.get().last_error, 'bad')
+
+    @override_settings(NOTIFICATION_TIMEOUT=10)
+    def test_lease_covers_the_whole_batch(self):
+        for i in range(3):
+            Notification.objects.create(provider='meta', to_number='+4917', message=f"hi {i}")
+        before = timezone.now()
+        notifications.claim_batch(50, lease_seconds=notifications.batch_lease_seconds(50, 4))
+        # 13 rounds of 4 sends at up to 10s each, plus a margin
+        self.assertGreaterEqual(Notification.objects.earliest('next_attempt_at').next_attempt_at,
+                                before + timedelta(seconds=140))
+        self.assertEqual(notifications.claim_batch(50), [])
+
+    @mock.patch.dict(os.environ, TWILIO_ENV)
+    async def test_inline_send_is_leased_from_the_outbox(self):
+        with StubProviderServer(status=201) as stub, override_settings(
+                TWILIO_API_BASE=stub.url, NOTIFICATION_SEND_INLINE=True):
+            notification = await aqueue_owner_notification('hi')
+            # The row is leased to the inline send, so the outbox worker skips it.
+            self.assertEqual(await sync_to_async(drain_outbox)(), {'sent': 0, 'retried': 0, 'failed': 0})
+            await asyncio.gather(*notifications._inline_tasks)
+
+        await notification.arefresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual([path for path, _ in stub.requests], ['/Accounts/AC123/Messages.json'])
+
+
+@override_settings(NOTIFICATION_MAX_ATTEMPTS=2, ANNOUNCEMENT_CHUNK_SIZE=2,
+                   ANNOUNCEMENT_RATE_LIMITS={'meta': 1000, 'twilio': 1000})
+class AnnouncementTests(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                            duration_weeks=8, description='Basics', capacity=3)
+        for i in range(5):
+            student = Student.objects.create(full_name=f"Student {i}", email=f"s{i}@example.com",
+                                             phone=f"+49170000000{i}")
+            enrollment.enroll(student, self.course)
+        self.announcement = announcements.announce(self.course, 'Class moves to Room 4', 'meta')
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_sends_to_every_registration(self):
+        with StubProviderServer() as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            out = io.StringIO()
+            call_command('send_announcements', stdout=out)
+
+        self.assertEqual(len(stub.requests), 5)   # enrolled and waitlisted
+        self.assertEqual({json.loads(body)['text']['body'] for _, body in stub.requests},
+                         {'Class moves to Room 4'})
+        self.assertEqual(self.announcement.notifications.filter(status='sent').count(), 5)
+        self.announcement.refresh_from_db()
+        self.assertEqual(self.announcement.status, 'done')
+        self.assertIn('sent 5', out.getvalue())
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_rerun_after_crash_does_not_resend(self):
+        # A run that died after fanning out and sending two messages.
+        announcements.fan_out(self.announcement)
+        sent = self.announcement.notifications.order_by('pk')[:2]
+        Notification.objects.filter(pk__in=[n.pk for n in sent]).update(status='sent')
+        self.assertEqual(announcements.fan_out(self.announcement), 0)
+
+        with StubProviderServer() as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            counts = async_to_sync(announcements.process)(self.announcement)
+
+        self.assertEqual(counts, {'sent': 3, 'retried': 0, 'failed': 0})
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(self.announcement.notifications.count(), 5)
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_failures_keep_the_announcement_open(self):
+        with StubProviderServer(status=500) as stub, override_settings(WHATSAPP_API_BASE=stub.url):
+            counts = async_to_sync(announcements.process)(self.announcement)
+        self.assertEqual(counts['retried'], 5)
+        self.assertEqual(self.announcement.status, 'sending')
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_owner_outbox_leaves_announcements_alone(self):
+        announcements.fan_out(self.announcement)
+        self.assertEqual(drain_outbox(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    @override_settings(NOTIFICATION_TIMEOUT=10)
+    def test_batch_lease_outlasts_the_rate_limit(self):
+        # 500 sends at 20/s take 25s; 20 at a time may each wait the full 10s timeout.
+        self.assertEqual(announcements.send_lease_seconds(500, 20, 20), 260)
+        self.assertEqual(announcements.send_lease_seconds(500, 5, 500), 110)
+
+    def test_overlapping_runs_exit(self):
+        with announcements.exclusive() as first, announcements.exclusive() as second:
+            self.assertTrue(first)
+            self.assertFalse(second)
+            out = io.StringIO()
+            call_command('send_announcements', stdout=out)
+        self.assertIn('Another send_announcements is running', out.getvalue())
+        self.assertFalse(Notification.objects.exists())
+        with announcements.exclusive() as again:
+            self.assertTrue(again)
+
+    @override_settings(DB_POOL_MODE='pgbouncer')
+    def test_refuses_to_run_behind_pgbouncer(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DB_POOL_MODE=persistent'):
+            call_command('send_announcements', stdout=io.StringIO())
+
+    def test_token_bucket_limits_rate(self):
+        async def take(count):
+            bucket = announcements.TokenBucket(rate=100, burst=1)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await asyncio.gather(*(bucket.acquire() for _ in range(count)))
+            return loop.time() - start
+
+        self.assertGreaterEqual(asyncio.run(take(11)), 0.095)
+
+    @mock.patch.dict(os.environ, META_ENV)
+    def test_admin_action_queues(self):
+        Announcement.objects.all().delete()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret123'))
+        url = reverse('admin:courses_course_changelist')
+        data = {'action': 'send_announcement', '_selected_action': [self.course.pk]}
+
+        response = self.client.post(url, data)
+        self.assertContains(response, '5 registrations')
+        self.assertFalse(Announcement.objects.exists())
+
+        response = self.client.post(url, {**data, 'message': 'No class on Friday', 'confirm': 'yes'})
+        self.assertRedirects(response, url)
+        announcement = Announcement.objects.get()
+        self.assertEqual((announcement.message, announcement.provider), ('No class on Friday', 'meta'))
+        self.assertFalse(Notification.objects.exists())
+
+
+class StudentMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ben', password='secret123')
+        self.student = Student.objects.create(user=self.user, full_name='Ben Braun',
+                                              email='ben@example.com', phone='+4917')
+        self.course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                            duration_weeks=8, description='Basics')
+        Registration.objects.create(student=self.student, course=self.course)
+        self.client.force_login(self.user)
+
+    def test_student_and_enrollments_resolved_once(self):
+        # session, user joined with student, enrolled ids, course
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('courses:course_detail', args=[self.course.id]))
+        self.assertEqual(response.wsgi_request.student, self.student)
+        self.assertTrue(response.context['is_enrolled'])
+
+    def test_courses_page_marks_enrolled(self):
+        response = self.client.get(reverse('courses:courses'))
+        self.assertEqual(response.context['enrolled_course_ids'], {self.course.id})
+        self.assertContains(response, 'Enrolled')
+
+    def test_user_without_profile(self):
+        self.client.force_login(User.objects.create_user(username='nobody', password='x'))
+        response = self.client.get(reverse('courses:courses'))
+        self.assertIsNone(response.wsgi_request.student)
+        self.assertNotContains(response, 'Enrolled')
+
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('courses:courses'))
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertEqual(response.wsgi_request.student, self.student)
+
+    def test_wrong_password_is_checked_once(self):
+        with mock.patch('django.contrib.auth.models.User.check_password', return_value=False) as check:
+            self.assertIsNone(authenticate(username='ben', password='wrong'))
+        check.assert_called_once()
+
+    def test_anonymous_requests_leave_the_session_alone(self):
+        self.client.logout()
+        for name in ('courses:home', 'courses:courses', 'courses:api_courses'):
+            response = self.client.get(reverse(name))
+            self.assertNotIn('Cookie', response.get('Vary', ''), name)
+            self.assertIsNone(response.wsgi_request.student)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    async def test_async_views_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('courses:course_detail', args=[self.course.id]))
+        self.assertTrue(response.context['is_enrolled'])
+        self.assertContains(response, 'ben')  # request.user resolved for the template
+        # Queries from the async ORM's threads are counted too: session, user+student, course, exists.
+        self.assertIn('desc="4 queries"', response['Server-Timing'])
+
+        for name in ('courses:home', 'courses:courses'):
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.context['enrolled_course_ids'], {self.course.id})
+            self.assertContains(response, 'Enrolled')
+
+        response = await self.async_client.get(reverse('courses:course_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_model_backend_sessions_under_asgi(self):
+        await self.async_client.aforce_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        for url in (reverse('courses:home'), reverse('courses:courses'),
+                    reverse('courses:course_detail', args=[self.course.id])):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.asgi_request.student, self.student)
+        self.assertTrue(response.context['is_enrolled'])
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every page must run a fixed number of queries however many rows exist.
+
+    Each check requests the URL with a small dataset, seeds more rows, and
+    requests it again: the two counts must match and stay within budget.
+    Add new URLs to `test_public_and_student_pages`, `test_admin_changelists`
+    or `test_admin_pages`.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser(username='staff', password='secret123')
+        self.student = Student.objects.create(user=self.user, full_name='Staff Student',
+                                              email='staff@example.com', phone='+4917')
+        self.client.force_login(self.user)
+        self.seeded = 0
+        self.seed(2)
+
+    def seed(self, n):
+        """Add `n` courses, each with another student's registration and feedback."""
+        for i in range(self.seeded, self.seeded + n):
+            course = Course.objects.create(title=f"Course {i}", code=f"C{i}", level='A1',
+                                           duration_weeks=4, description='Lorem ipsum')
+            other = Student.objects.create(full_name=f"Student {i}",
+                                           email=f"s{i}@example.com", phone='+4917')
+            Registration.objects.create(student=other, course=course)
+            Registration.objects.create(student=self.student, course=course)
+            Feedback.objects.create(student=other, message='Gut', is_approved=True)
+            Feedback.objects.create(student=self.student, message='Sehr gut')
+        self.seeded += n
+
+    def count_queries(self, method, url):
+        self.client.force_login(self.user)
+        cache.clear()   # budgets are for a cold cache: catalog and per-student enrollments
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400, url)
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, budget, method, url_factory):
+        """`url_factory` builds a fresh URL per call, for views that change data."""
+        small = self.count_queries(method, url_factory())
+        self.seed(20)
+        large = self.count_queries(method, url_factory())
+        self.assertEqual(small, large, f"{url_factory()} query count grows with data")
+        self.assertLessEqual(large, budget, f"{url_factory()} is over its query budget")
+
+    def unregistered_course(self):
+        return Course.objects.create(title='Fresh', code=f"F{Course.objects.count()}",
+                                     level='B1', duration_weeks=4, description='x')
+
+    def registered_course_id(self):
+        return Registration.objects.filter(student=self.student).latest('id').course_id
+
+    def test_public_and_student_pages(self):
+        pages = [
+            ('get', lambda: reverse('courses:home'), 5),
+            ('get', lambda: reverse('courses:courses'), 4),
+            ('get', lambda: reverse('courses:courses') + '?level=A1', 4),
+            ('get', lambda: reverse('courses:courses_more') + '?after=A1.1', 4),
+            ('get', lambda: reverse('courses:course_search') + '?q=course', 4),
+            ('get', lambda: reverse('courses:course_detail', args=[self.registered_course_id()]), 4),
+            ('get', lambda: reverse('courses:api_courses'), 4),
+            ('get', lambda: reverse('courses:api_course_detail', args=[self.registered_course_id()]), 4),
+            ('get', lambda: reverse('courses:register'), 3),
+            ('get', lambda: reverse('courses:login'), 2),
+            ('get', lambda: reverse('courses:about'), 2),
+            ('get', lambda: reverse('courses:contact'), 2),
+            ('get', lambda: reverse('courses:profile'), 3),
+            ('get', lambda: reverse('courses:give_feedback'), 3),
+            ('get', lambda: reverse('courses:select_course', args=[self.unregistered_course().id]), 10),
+            ('post', lambda: reverse('courses:delete_course', args=[self.registered_course_id()]), 9),
+        ]
+        for method, url_factory, budget in pages:
+            with self.subTest(url=url_factory()):
+                self.assertQueryBudget(budget, method, url_factory)
+
+    def test_admin_changelists(self):
+        for model in ('course', 'student', 'registration', 'feedback', 'notification'):
+            with self.subTest(model=model):
+                url = reverse(f'admin:courses_{model}_changelist')
+                self.assertQueryBudget(5, 'get', lambda: url)
+
+    def test_admin_pages(self):
+        pages = [
+            (lambda: reverse('admin:courses_registration_stats'), 6),
+            (lambda: reverse('admin:courses_feedback_moderation'), 3),
+        ]
+        for url_factory, budget in pages:
+            with self.subTest(url=url_factory()):
+                self.assertQueryBudget(budget, 'get', url_factory)
+
+    def test_logout(self):
+        self.assertQueryBudget(4, 'get', lambda: reverse('courses:logout'))
+
+
+class SessionModeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='fritz', password='secret123')
+
+    def profile_queries(self):
+        client = self.client_class()   # SessionMiddleware picks its engine when loaded
+        client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get(reverse('courses:profile')).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_cached_and_cookie_sessions_skip_the_session_query(self):
+        db_queries = self.profile_queries()
+        for engine in ('cached_db', 'signed_cookies'):
+            with self.subTest(engine=engine), override_settings(
+                    SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                self.assertEqual(self.profile_queries(), db_queries - 1)
+
+    def test_purge_sessions_in_batches(self):
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.contrib.sessions.models import Session
+
+        for i in range(5):
+            session = SessionStore()
+            session.set_expiry(-60 if i < 3 else 3600)
+            session.save()
+
+        out = io.StringIO()
+        call_command('purge_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 3 expired sessions', out.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_catalog_reads_go_to_replicas(self):
+        self.assertEqual(self.router.db_for_read(Course), 'replica1')
+        self.assertEqual(self.router.db_for_read(Feedback), 'replica1')
+        self.assertEqual(self.router.db_for_read(Student), 'default')
+        self.assertEqual(self.router.db_for_write(Course), 'default')
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Course), 'default')
+
+    def test_reads_after_a_write_in_the_request_use_the_primary(self):
+        def view(request):
+            before = self.router.db_for_read(Course)
+            self.router.db_for_write(Registration)
+            return HttpResponse(f"{before} {self.router.db_for_read(Course)}")
+
+        middleware = ReplicaPinMiddleware(view)
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'replica1 default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        # The cookie pins the next request from this client to the primary.
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.assertEqual(middleware(request).content, b'default default')
+
+    @override_settings(DATABASE_ROUTERS=['courses.routers.ReplicaRouter'], REPLICA_DATABASES=['replica1'])
+    def test_locking_reads_use_the_primary(self):
+        # No replica1 connection exists here: reading from it would raise.
+        course = Course.objects.using('default').create(title='German A1', code='A1-01', level='A1',
+                                                        duration_weeks=8, description='x', capacity=1)
+        student = Student.objects.create(full_name='Anna', email='anna@example.com')
+        Registration.objects.create(student=student, course=course, status='waitlisted')
+
+        self.assertEqual([r.student_id for r in enrollment.fill_seats(course.pk)], [student.pk])
+        course.capacity = 0
+        with self.assertRaisesMessage(ValidationError, '1 students are already enrolled.'):
+            course.clean()
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_middleware_unused_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaPinMiddleware(lambda request: HttpResponse())
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                            duration_weeks=8, description='Basics')
+        self.other = Course.objects.create(title='German B1', code='B1-01', level='B1',
+                                           duration_weeks=8, description='More')
+
+    def test_warm_cache_skips_catalog_queries(self):
+        self.client.get(reverse('courses:home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('courses:home'))
+        self.assertContains(response, 'German A1')
+
+        self.client.get(reverse('courses:courses') + '?level=B1')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('courses:courses') + '?level=B1')
+        self.assertContains(response, 'German B1')
+        self.assertNotContains(response, 'German A1')
+
+    def test_course_edit_invalidates(self):
+        self.client.get(reverse('courses:courses'))
+        self.course.title = 'Deutsch A1'
+        self.course.save()
+        self.assertContains(self.client.get(reverse('courses:courses')), 'Deutsch A1')
+
+        self.other.delete()
+        self.assertNotContains(self.client.get(reverse('courses:courses')), 'German B1')
+
+    def test_feedback_approval_invalidates(self):
+        student = Student.objects.create(full_name='Clara', email='c@example.com', phone='1')
+        fb = Feedback.objects.create(student=student, message='Wunderbar')
+        self.assertNotContains(self.client.get(reverse('courses:home')), 'Wunderbar')
+        fb.is_approved = True
+        fb.save()
+        self.assertContains(self.client.get(reverse('courses:home')), 'Wunderbar')
+
+    def test_enrolled_badge_is_per_user(self):
+        user = User.objects.create_user(username='ben', password='secret123')
+        student = Student.objects.create(user=user, full_name='Ben', email='b@example.com', phone='1')
+        Registration.objects.create(student=student, course=self.course)
+
+        self.assertNotContains(self.client.get(reverse('courses:courses')), 'Enrolled')
+        self.client.force_login(user)
+        response = self.client.get(reverse('courses:courses'))
+        self.assertContains(response, 'Enrolled', count=1)
+
+
+class RegistrationConstraintTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='dora', password='secret123', email='Dora@Example.com')
+        self.student = Student.objects.create(user=self.user, full_name='Dora', email='dora@example.com', phone='1')
+        self.course = Course.objects.create(title='German A2', code='A2-01', level='A2',
+                                            duration_weeks=8, description='Next steps')
+
+    def test_select_course_is_idempotent(self):
+        self.client.force_login(self.user)
+        url = reverse('courses:select_course', args=[self.course.id])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Registration.objects.filter(student=self.student).count(), 1)
+
+    def test_register_rejects_email_in_any_case(self):
+        response = self.client.post(reverse('courses:register'), {
+            'username': 'dora2', 'full_name': 'Dora', 'email': 'DORA@example.COM',
+            'phone': '1', 'password': 'secret123', 'confirm_password': 'secret123',
+        })
+        self.assertRedirects(response, reverse('courses:register'), fetch_redirect_response=False)
+        self.assertFalse(User.objects.filter(username='dora2').exists())
+
+
+class EnrollmentTests(TestCase):
+
+    def setUp(self):
+        cache.clear()   # per-student enrollment maps outlive the rolled-back rows they describe
+        self.course = Course.objects.create(title='German B1', code='B1-01', level='B1',
+                                            duration_weeks=8, description='x', capacity=2)
+        self.students = [Student.objects.create(full_name=f"S{i}", email=f"s{i}@example.com", phone='1')
+                         for i in range(4)]
+
+    def statuses(self):
+        return dict(Registration.objects.filter(course=self.course).values_list('student_id', 'status'))
+
+    def test_full_course_waitlists(self):
+        results = [enrollment.enroll(student, self.course) for student in self.students]
+        self.assertEqual([r.status for r, _ in results], ['enrolled', 'enrolled', 'waitlisted', 'waitlisted'])
+        self.assertEqual(enrollment.waitlist_position(results[3][0]), 2)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+        self.assertTrue(self.course.is_full)
+        # Enrolling again returns the existing registration without touching the count
+        self.assertEqual(enrollment.enroll(self.students[0], self.course), (results[0][0], False))
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+
+    def test_delete_course_promotes_the_oldest_waitlisted(self):
+        for student in self.students:
+            enrollment.enroll(student, self.course)
+        user = User.objects.create_user(username='s0', password='secret123')
+        self.students[0].user = user
+        self.students[0].save()
+        self.client.force_login(user)
+
+        self.client.post(reverse('courses:delete_course', args=[self.course.id]))
+
+        statuses = self.statuses()
+        self.assertNotIn(self.students[0].id, statuses)
+        self.assertEqual(statuses[self.students[2].id], 'enrolled')
+        self.assertEqual(statuses[self.students[3].id], 'waitlisted')
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+
+        # Deleting a waitlisted registration frees nothing
+        Registration.objects.get(student=self.students[3]).delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+
+    def test_raising_capacity_in_the_admin_fills_seats(self):
+        for student in self.students:
+            enrollment.enroll(student, self.course)
+        admin_user = User.objects.create_superuser(username='admin', password='secret123')
+        self.client.force_login(admin_user)
+        data = {'title': self.course.title, 'code': self.course.code, 'level': 'B1',
+                'duration_weeks': 8, 'description': 'x', 'price': '0', 'capacity': 3}
+        self.client.post(reverse('admin:courses_course_change', args=[self.course.id]), data)
+
+        self.assertEqual(list(self.statuses().values()).count('enrolled'), 3)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 3)
+
+        data['capacity'] = 1
+        response = self.client.post(reverse('admin:courses_course_change', args=[self.course.id]), data)
+        self.assertContains(response, '3 students are already enrolled.')
+
+    def test_editing_a_course_keeps_seats_taken_meanwhile(self):
+        # The admin form loads the course, a student enrolls, then the form is saved.
+        edited = Course.objects.get(pk=self.course.pk)
+        enrollment.enroll(self.students[0], self.course)
+        edited.title = 'German B1 (evening)'
+        edited.full_clean()
+        edited.save()
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.title, 'German B1 (evening)')
+        self.assertEqual(self.course.enrolled_count, 1)
+
+        # Validated against the current count, not the one loaded
+        enrollment.enroll(self.students[1], self.course)
+        edited.capacity = 1
+        with self.assertRaisesMessage(ValidationError, '2 students are already enrolled.'):
+            edited.full_clean()
+
+    def test_course_detail_shows_seats_and_waitlist(self):
+        for student in self.students[:2]:
+            enrollment.enroll(student, self.course)
+        user = User.objects.create_user(username='s2', password='secret123')
+        self.students[2].user = user
+        self.students[2].save()
+        self.client.force_login(user)
+        url = reverse('courses:course_detail', args=[self.course.id])
+
+        self.assertContains(self.client.get(url), 'Join the Waitlist')
+        self.client.get(reverse('courses:select_course', args=[self.course.id]))
+        response = self.client.get(url)
+        self.assertContains(response, 'On the Waitlist')
+        self.assertContains(response, '0 of 2')
+
+
+class EnrollmentCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                            duration_weeks=8, description='x', capacity=1)
+        self.user = User.objects.create_user(username='emil', password='secret123')
+        self.student = Student.objects.create(user=self.user, full_name='Emil', email='e@example.com', phone='1')
+        self.client.force_login(self.user)
+        self.detail_url = reverse('courses:course_detail', args=[self.course.id])
+
+    def test_hits_cost_no_query(self):
+        self.client.get(reverse('courses:courses'))
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(2):   # session, user
+            self.client.get(reverse('courses:courses'))
+        with self.assertNumQueries(3):   # session, user, course
+            self.client.get(self.detail_url)
+
+    def test_enroll_and_unenroll_write_through(self):
+        self.client.get(reverse('courses:courses'))   # cache the empty set
+        self.client.get(reverse('courses:select_course', args=[self.course.id]))
+        with self.assertNumQueries(2):
+            self.assertContains(self.client.get(reverse('courses:courses')), 'Enrolled', count=1)
+        self.assertContains(self.client.get(self.detail_url), 'Already Enrolled')
+
+        self.client.post(reverse('courses:delete_course', args=[self.course.id]))
+        with self.assertNumQueries(2):
+            self.assertNotContains(self.client.get(reverse('courses:courses')), 'Enrolled')
+        self.assertContains(self.client.get(self.detail_url), 'Enroll Now')
+
+    def test_promotion_and_admin_changes_invalidate(self):
+        other = Student.objects.create(full_name='Olga', email='o@example.com', phone='1')
+        enrollment.enroll(other, self.course)
+        self.client.get(reverse('courses:select_course', args=[self.course.id]))
+        self.assertContains(self.client.get(self.detail_url), 'On the Waitlist')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.get(student=other).delete()   # e.g. from the admin
+        self.assertContains(self.client.get(self.detail_url), 'Already Enrolled')
+
+        Registration.objects.filter(student=self.student).delete()
+        course = Course.objects.create(title='German A2', code='A2-01', level='A2',
+                                       duration_weeks=8, description='x')
+        Registration.objects.create(student=self.student, course=course)
+        response = self.client.get(reverse('courses:courses'))
+        self.assertEqual(response.context['enrolled_course_ids'], {course.id})
+
+    def test_promotion_forgets_after_commit(self):
+        other = Student.objects.create(full_name='Olga', email='o@example.com', phone='1')
+        enrollment.enroll(other, self.course)
+        enrollment.enroll(self.student, self.course)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Registration.objects.get(student=other).delete()
+            # Still cached until the promotion commits
+            self.assertEqual(cache.get(enrollment._status_key(self.student.pk)),
+                             {self.course.id: 'waitlisted'})
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(enrollment._status_key(self.student.pk)))
+
+    def test_read_miss_does_not_overwrite_a_write_through(self):
+        key = enrollment._status_key(self.student.pk)
+        with mock.patch.object(cache, 'get', return_value=None):
+            # A write-through lands between this request's miss and its fill
+            cache.set(key, {self.course.id: 'enrolled'})
+            self.assertEqual(enrollment.registration_statuses(self.student), {})
+        self.assertEqual(cache.get(key), {self.course.id: 'enrolled'})
+
+
+class EnrollmentRollupTests(TestCase):
+
+    def setUp(self):
+        self.a1 = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                        duration_weeks=8, description='x', price=100)
+        self.b1 = Course.objects.create(title='German B1', code='B1-01', level='B1',
+                                        duration_weeks=8, description='x', price=300)
+        self.students = [Student.objects.create(full_name=f"S{i}", email=f"s{i}@example.com", phone='1')
+                         for i in range(4)]
+        self.today = timezone.localdate()
+
+    def rollups(self):
+        return set(EnrollmentRollup.objects.values_list('day', 'course__code', 'count'))
+
+    def test_maintained_on_create_and_delete(self):
+        for student in self.students[:3]:
+            enrollment.enroll(student, self.a1)
+        enrollment.enroll(self.students[0], self.b1)
+        Registration.objects.filter(student=self.students[1], course=self.a1).delete()
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 2), (self.today, 'B1-01', 1)})
+
+        stats = rollups.dashboard(self.today - timedelta(days=6), self.today)
+        self.assertEqual(stats['totals'], {'registrations': 3, 'revenue': 500})
+        self.assertEqual(len(stats['daily']), 7)
+        self.assertEqual(stats['daily'][-1]['registrations'], 3)
+        self.assertEqual([(row['level'], row['revenue']) for row in stats['per_level']],
+                         [('A1 - Beginner', 200), ('B1 - Intermediate', 300)])
+        self.assertEqual([row['course__code'] for row in stats['per_course']], ['B1-01', 'A1-01'])
+
+        self.b1.delete()   # cascades to its registrations and rollups
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 2)})
+
+    def test_backfill(self):
+        Registration.objects.bulk_create([Registration(student=s, course=self.a1) for s in self.students])
+        Registration.objects.filter(student__in=self.students[:2]).update(
+            registered_at=timezone.now() - timedelta(days=40))
+        expected = {(self.today - timedelta(days=40), 'A1-01', 2), (self.today, 'A1-01', 2)}
+
+        out = io.StringIO()
+        call_command('backfill_rollups', chunk_days=7, stdout=out)
+        self.assertEqual(self.rollups(), expected)
+        self.assertIn('Rebuilt 2 rollup rows', out.getvalue())
+        call_command('backfill_rollups', stdout=io.StringIO())   # idempotent
+        self.assertEqual(self.rollups(), expected)
+
+    def test_waitlisted_count_once_promoted(self):
+        self.a1.capacity = 1
+        self.a1.save()
+        first, _ = enrollment.enroll(self.students[0], self.a1)
+        enrollment.enroll(self.students[1], self.a1)
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 1)})
+        stats = rollups.dashboard(self.today, self.today)
+        self.assertEqual(stats['totals'], {'registrations': 1, 'revenue': 100})
+
+        third, _ = enrollment.enroll(self.students[2], self.a1)   # waitlisted behind students[1]
+        third.delete()
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 1)})
+        first.delete()   # students[1] takes the seat
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 1)})
+        call_command('backfill_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 1)})
+
+    def test_delete_of_an_uncounted_registration_stops_at_zero(self):
+        Registration.objects.bulk_create([Registration(student=self.students[0], course=self.a1)])
+        enrollment.enroll(self.students[1], self.a1)
+        Registration.objects.filter(course=self.a1).delete()
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 0)})
+
+    def test_backfill_counts_after_locking(self):
+        def register_meanwhile():
+            # Committed just before the lock is granted
+            Registration.objects.bulk_create([Registration(student=self.students[1], course=self.a1)])
+
+        Registration.objects.bulk_create([Registration(student=self.students[0], course=self.a1)])
+        with mock.patch('courses.rollups.lock_rollups', side_effect=register_meanwhile):
+            call_command('backfill_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), {(self.today, 'A1-01', 2)})
+
+    def test_migration_counts_existing_registrations(self):
+        migration = importlib.import_module('courses.migrations.0014_backfill_enrollment_rollups')
+        Registration.objects.bulk_create([Registration(student=s, course=self.b1) for s in self.students])
+        migration.count_registrations(django_apps, None)
+        self.assertEqual(self.rollups(), {(self.today, 'B1-01', 4)})
+
+    @override_settings(RETENTION_DAYS={**settings.RETENTION_DAYS, 'registrations': 30})
+    def test_backfill_keeps_the_history_retention_purged(self):
+        purged_day = self.today - timedelta(days=30)   # the cutoff's day: partly purged
+        EnrollmentRollup.objects.create(day=purged_day, course=self.a1, count=3)
+        enrollment.enroll(self.students[0], self.a1)
+        call_command('backfill_rollups', **{'from': str(purged_day - timedelta(days=10))},
+                     stdout=io.StringIO())
+        self.assertEqual(self.rollups(), {(purged_day, 'A1-01', 3), (self.today, 'A1-01', 1)})
+
+    def test_stats_page_reads_only_rollups(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret123'))
+        url = reverse('admin:courses_registration_stats')
+        for student in self.students:
+            enrollment.enroll(student, self.a1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'level': 'A1'})
+        self.assertContains(response, '<strong>4</strong> enrolled registrations')
+        self.assertContains(response, 'A1-01')
+        self.assertFalse([q for q in queries if 'courses_registration' in q['sql']])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    """Real row locks need a database with SELECT ... FOR UPDATE (PostgreSQL)."""
+
+    def test_no_oversell(self):
+        course = Course.objects.create(title='Rush', code='RUSH', level='A1', duration_weeks=4,
+                                       description='x', capacity=5)
+        students = [Student.objects.create(full_name=f"S{i}", email=f"s{i}@example.com", phone='1')
+                    for i in range(40)]
+        barrier = threading.Barrier(len(students))
+
+        def run(student):
+            try:
+                barrier.wait()
+                enrollment.enroll(student, course)
+                if student.pk % 3 == 0:
+                    Registration.objects.filter(student=student).first().delete()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=[student]) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        course.refresh_from_db()
+        enrolled = Registration.objects.filter(course=course, status='enrolled').count()
+        waitlisted = Registration.objects.filter(course=course, status='waitlisted').count()
+        self.assertEqual(course.enrolled_count, enrolled)
+        self.assertEqual(enrolled, min(5, enrolled + waitlisted))
+
+
+@override_settings(AUTH_RATE_LIMIT_IP='3/m', AUTH_RATE_LIMIT_USERNAME='2/m',
+                   PASSWORD_PBKDF2_ITERATIONS=1000)
+class AuthRateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username='emil', password='secret123')
+
+    def login(self, username, password='wrong'):
+        return self.client.post(reverse('courses:login'), {'username': username, 'password': password})
+
+    def test_username_bucket_rejects_before_authenticating(self):
+        self.assertEqual(self.login('emil').status_code, 200)
+        self.assertEqual(self.login('EMIL').status_code, 200)
+        # No user lookup, so no password hash either.
+        with self.assertNumQueries(0), self.assertLogs('courses.ratelimit', 'WARNING'):
+            response = self.login('emil', 'secret123')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_ip_bucket_covers_login_and_register(self):
+        for username in ('a', 'b', 'c'):
+            self.assertEqual(self.login(username).status_code, 200)
+        with self.assertLogs('courses.ratelimit', 'WARNING'):
+            self.assertEqual(self.login('d').status_code, 429)
+        response = self.client.post(reverse('courses:register'), {'username': 'e'},
+                                    REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 302)   # another IP still gets through
+
+    def test_racing_attempts_take_one_token_each(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(ratelimit.take('race', 3, 60)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(0), 3)
+
+    def test_previous_window_still_counts(self):
+        with mock.patch('courses.ratelimit.time.time', return_value=600.0):
+            self.assertEqual([ratelimit.take('slide', 3, 60) for _ in range(4)], [0, 0, 0, 60])
+        # Half a period later the previous window's 4 attempts weigh 2
+        with mock.patch('courses.ratelimit.time.time', return_value=690.0):
+            self.assertEqual([ratelimit.take('slide', 3, 60) for _ in range(2)], [0, 15])
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_forwarded_for_with_trusted_proxy(self):
+        for n in range(4):
+            response = self.client.post(reverse('courses:login'), {'username': f'u{n}'},
+                                        HTTP_X_FORWARDED_FOR=f'6.6.6.6, 10.0.0.{n}')
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(PASSWORD_HASHERS=['courses.hashers.ScryptPasswordHasher',
+                                         'courses.hashers.PBKDF2PasswordHasher'],
+                       PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10)
+    def test_login_rehashes_to_preferred_hasher(self):
+        self.assertTrue(User.objects.get().password.startswith('pbkdf2_sha256$1000$'))
+        self.assertRedirects(self.login('emil', 'secret123'), reverse('courses:home'),
+                             fetch_redirect_response=False)
+        self.assertTrue(User.objects.get().password.startswith('scrypt$1024$'))
+
+
+@override_settings(COURSES_PAGE_SIZE=2)
+class CoursePaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for i, level in enumerate(['B1', 'A1', 'A2', 'A1', 'B2']):
+            Course.objects.create(title=f"Course {i}", code=f"P{i}", level=level,
+                                  duration_weeks=4, description='x')
+
+    def titles(self, cards):
+        return [card['course'].title for card in cards]
+
+    def test_pages_follow_level_then_id(self):
+        response = self.client.get(reverse('courses:courses'))
+        self.assertEqual(self.titles(response.context['course_cards']), ['Course 1', 'Course 3'])
+        cursor = response.context['next_cursor']
+
+        seen = []
+        while cursor:
+            response = self.client.get(reverse('courses:courses_more'), {'after': cursor})
+            seen += self.titles(response.context['course_cards'])
+            cursor = response['X-Next-Cursor']
+        self.assertEqual(seen, ['Course 2', 'Course 0', 'Course 4'])
+
+    def test_level_filter_pages(self):
+        response = self.client.get(reverse('courses:courses'), {'level': 'A1'})
+        self.assertEqual(self.titles(response.context['course_cards']), ['Course 1', 'Course 3'])
+        self.assertIsNone(response.context['next_cursor'])
+
+    def test_invalid_level_runs_no_catalog_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('courses:courses'), {'level': 'Z9'})
+        self.assertEqual(response.context['course_cards'], [])
+
+    def test_fragment_rejects_bad_input(self):
+        url = reverse('courses:courses_more')
+        self.assertEqual(self.client.get(url, {'after': 'nonsense'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'after': 'A1.1', 'level': 'Z9'}).status_code, 400)
+
+
+@override_settings(COURSES_PAGE_SIZE=2, API_MAX_AGE=60, API_CDN_MAX_AGE=300)
+class CatalogAPITests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.courses = [Course.objects.create(title=f"Kurs {i}", code=f"K{i}", level=level,
+                                              duration_weeks=4, description='x', price=100)
+                        for i, level in enumerate(['A1', 'A1', 'A1', 'B1'])]
+
+    def test_list_pages_and_filters(self):
+        response = self.client.get(reverse('courses:api_courses'))
+        data = response.json()
+        self.assertEqual([row['code'] for row in data['results']], ['K0', 'K1'])
+        self.assertEqual(data['results'][0]['price'], '100.00')
+        self.assertNotIn('description', data['results'][0])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['code'] for row in data['results']], ['K2', 'K3'])
+        self.assertIsNone(data['next'])
+
+        data = self.client.get(reverse('courses:api_courses'), {'level': 'B1'}).json()
+        self.assertEqual([row['code'] for row in data['results']], ['K3'])
+        self.assertEqual(self.client.get(reverse('courses:api_courses'), {'level': 'C9'}).status_code, 400)
+
+    def test_detail(self):
+        url = reverse('courses:api_course_detail', args=[self.courses[0].id])
+        self.assertEqual(self.client.get(url).json()['description'], 'x')
+        missing = self.client.get(reverse('courses:api_course_detail', args=[0]))
+        self.assertEqual(missing.status_code, 404)
+        self.assertNotIn('Cache-Control', missing)
+
+    def test_conditional_get(self):
+        # One query each: the list's count and latest updated_at, the course's by primary key
+        for url, queries in ((reverse('courses:api_courses'), 1),
+                             (reverse('courses:api_course_detail', args=[self.courses[0].id]), 1)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response['Cache-Control'], 'public, max-age=60, s-maxage=300')
+                etag = response['ETag']
+
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['Cache-Control'], 'public, max-age=60, s-maxage=300')
+
+                # A seat taken changes seats left, so the representation changes
+                student = Student.objects.create(full_name='S', email=f"{etag}@example.com", phone='1')
+                with self.captureOnCommitCallbacks(execute=True):
+                    enrollment.enroll(student, self.courses[0])
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_seats_in_one_level_leave_other_lists_valid(self):
+        url = reverse('courses:api_courses')
+        a1, b1 = (self.client.get(url, {'level': level})['ETag'] for level in ('A1', 'B1'))
+        student = Student.objects.create(full_name='S', email='s@example.com', phone='1')
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.enroll(student, self.courses[3])
+        self.assertEqual(self.client.get(url, {'level': 'A1'}, headers={'If-None-Match': a1}).status_code, 304)
+        self.assertEqual(self.client.get(url, {'level': 'B1'}, headers={'If-None-Match': b1}).status_code, 200)
+
+        # Freeing the seat changes it again, waitlist or not
+        b1 = self.client.get(url, {'level': 'B1'})['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.get(student=student).delete()
+        self.assertEqual(self.client.get(url, {'level': 'B1'}, headers={'If-None-Match': b1}).status_code, 200)
+
+    def test_list_etag_is_the_same_for_every_worker(self):
+        url = reverse('courses:api_courses')
+        etag = self.client.get(url, {'level': 'A1'})['ETag']
+        cache.clear()   # another worker, with its own cache
+        self.assertEqual(self.client.get(url, {'level': 'A1'}, headers={'If-None-Match': etag}).status_code, 304)
+        # A seat taken through another worker: nothing in this one's cache changes
+        Course.objects.filter(pk=self.courses[1].pk).update(enrolled_count=1, updated_at=Now())
+        self.assertEqual(self.client.get(url, {'level': 'A1'}, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_api_does_not_vary_on_the_session(self):
+        self.client.force_login(User.objects.create_user(username='anna', password='secret123'))
+        response = self.client.get(reverse('courses:api_courses'))
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_deleting_a_course_changes_the_list_etag(self):
+        url = reverse('courses:api_courses')
+        etag = self.client.get(url)['ETag']
+        self.courses[3].delete()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+class CourseSearchTests(TestCase):
+
+    def setUp(self):
+        self.grammar = Course.objects.create(title='German Grammar Intensive', code='GR-A2', level='A2',
+                                             duration_weeks=6, description='Cases and word order.')
+        self.speaking = Course.objects.create(title='Speaking Club', code='SP-B1', level='B1',
+                                              duration_weeks=4, description='Conversation with some grammar drills.')
+
+    def test_prefix_match_ranks_title_first(self):
+        self.assertEqual(search_courses('gram'), [self.grammar, self.speaking])
+        self.assertEqual(search_courses('gram speak'), [self.speaking])
+        self.assertEqual(search_courses('sp-b1'), [self.speaking])
+
+    def test_best_matches_win_however_many_match(self):
+        for i in range(5):
+            Course.objects.create(title=f"Course {i}", code=f"C{i}", level='A1', duration_weeks=4,
+                                  description='Some grammar practice.')
+        best = Course.objects.create(title='Grammar Bootcamp', code='GB-1', level='A1',
+                                     duration_weeks=4, description='Grammar, grammar, grammar.')
+        self.assertEqual(search_courses('grammar', limit=2), [best, self.grammar])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.speaking.title = 'Pronunciation Lab'
+        self.speaking.save()
+        self.assertEqual(search_courses('pronun'), [self.speaking])
+        self.assertEqual(search_courses('speaking'), [])
+
+        self.grammar.delete()
+        self.assertEqual(search_courses('cases'), [])
+
+    def test_enrollments_leave_the_sqlite_index_alone(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("SQLite's FTS5 triggers")
+
+        def index_data():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT id, block FROM courses_course_fts_data ORDER BY id")
+                return cursor.fetchall()
+
+        before = index_data()
+        student = Student.objects.create(full_name='S', email='s@example.com', phone='1')
+        enrollment.enroll(student, self.grammar)
+        self.assertEqual(index_data(), before)
+        self.assertEqual(search_courses('cases'), [self.grammar])
+
+    def test_blank_or_symbol_query(self):
+        self.assertEqual(search_courses(''), [])
+        self.assertEqual(search_courses('"*:&'), [])
+
+    def test_search_page(self):
+        response = self.client.get(reverse('courses:course_search'), {'q': 'club'})
+        self.assertContains(response, 'Speaking Club')
+        self.assertNotContains(response, 'German Grammar Intensive')
+
+
+class CourseImportExportTests(TestCase):
+
+    def write_file(self, suffix, text):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with handle:
+            handle.write(text)
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_csv_upsert_and_row_errors(self):
+        Course.objects.create(title='Old title', code='A1-01', level='A1', duration_weeks=8, description='x')
+        path = self.write_file('.csv', (
+            "code,title,level,duration_weeks,description,price\n"
+            "A1-01,German A1,a1,8,Basics,4999\n"
+            "B1-01,German B1,B1,10,Intermediate,5999.5\n"
+            "C1-01,German C1,C1,10,Advanced,-1\n"
+            "A2-01,German A2,A2,2147483648,Too long,100\n"
+        ))
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_courses', path, batch_size=1, stdout=out, stderr=err)
+
+        self.assertIn('Imported 2 courses, 2 invalid rows', out.getvalue())
+        self.assertIn("line 4: level 'C1' is not one of", err.getvalue())
+        self.assertIn("line 5: duration_weeks '2147483648' must be a whole number between 1 and", err.getvalue())
+        self.assertEqual(Course.objects.get(code='A1-01').title, 'German A1')
+        self.assertEqual(str(Course.objects.get(code='B1-01').price), '5999.50')
+        self.assertEqual(search_courses('intermediate'), [Course.objects.get(code='B1-01')])
+
+    def test_jsonl_round_trip(self):
+        Course.objects.create(title='German A2', code='A2-01', level='A2', duration_weeks=6,
+                              description='Next steps', price='3500.00')
+        path = self.write_file('.jsonl', '')
+        call_command('export_courses', path, stderr=io.StringIO())
+        Course.objects.all().delete()
+
+        call_command('import_courses', path, stdout=io.StringIO(), stderr=io.StringIO())
+        course = Course.objects.get()
+        self.assertEqual((course.code, course.level, str(course.price)), ('A2-01', 'A2', '3500.00'))
+
+
+class AdminCSVExportTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret123'))
+        course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                       duration_weeks=8, description='Basics')
+        for i, day in enumerate(['2025-01-10', '2025-02-10', '2025-03-10']):
+            student = Student.objects.create(full_name=f"Student {i}", email=f"s{i}@example.com", phone='1')
+            reg = Registration.objects.create(student=student, course=course)
+            Registration.objects.filter(pk=reg.pk).update(registered_at=f"{day}T12:00:00+05:30")
+
+    def export(self, **params):
+        response = self.client.get(reverse('admin:courses_registration_export_csv'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_export_all(self):
+        lines = self.export()
+        self.assertEqual(lines[0], 'id,student,email,phone,course_code,course,status,registered_at,notes')
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Student 0,s0@example.com,1,A1-01,German A1', lines[1])
+
+    def test_export_date_range_is_inclusive(self):
+        lines = self.export(**{'from': '2025-02-10', 'to': '2025-03-10'})
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Student 1', 'Student 2'])
+
+    def test_export_query_count_is_constant(self):
+        with self.assertNumQueries(3):  # session, user, one joined export query
+            self.export()
+
+    def test_formulas_are_exported_as_text(self):
+        Registration.objects.filter(student__full_name='Student 0').update(notes='=HYPERLINK("x")')
+        Student.objects.filter(full_name='Student 1').update(full_name='@SUM(A1)', phone='+4917')
+        lines = self.export()
+        self.assertTrue(lines[1].endswith(',"\'=HYPERLINK(""x"")"'))
+        self.assertIn(",'@SUM(A1),s1@example.com,'+4917,", lines[2])
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='admin'))
+        response = await self.async_client.get(reverse('admin:courses_registration_export_csv'))
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Student 2,s2@example.com', lines[3])
+
+    def test_feedback_export_requires_staff(self):
+        self.client.logout()
+        response = self.client.get(reverse('admin:courses_feedback_export_csv'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(MODERATION_PAGE_SIZE=2)
+class FeedbackModerationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret123'))
+        self.anna = Student.objects.create(full_name='Anna Schmidt', email='a@example.com', phone='1')
+        self.ben = Student.objects.create(full_name='Ben Wolf', email='b@example.com', phone='1')
+        self.feedback = [Feedback.objects.create(student=self.anna if i % 2 else self.ben,
+                                                 message=f"Feedback {i} " + 'sehr gut ' * 20)
+                         for i in range(5)]
+
+    def test_bulk_actions_are_single_updates(self):
+        url = reverse('admin:courses_feedback_changelist')
+        actions = self.client.get(url).context['action_form'].fields['action'].choices
+        self.assertEqual([name for name, _ in actions][1:],
+                         ['delete_selected', 'export_selected_csv', 'approve_selected', 'reject_selected'])
+
+        catalog.get_testimonials()
+        ids = [f.pk for f in self.feedback[:3]]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(url, {'action': 'approve_selected', '_selected_action': ids})
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "courses_feedback"') for q in ctx.captured_queries), 1)
+        self.assertEqual(Feedback.objects.filter(is_approved=True, reviewed_at__isnull=False).count(), 3)
+        self.assertEqual(len(catalog.get_testimonials()), 3)   # cache invalidated
+
+        self.client.post(url, {'action': 'reject_selected', '_selected_action': ids[:1]})
+        self.assertEqual(len(catalog.get_testimonials()), 2)
+
+    def test_changelist_shows_a_preview(self):
+        response = self.client.get(reverse('admin:courses_feedback_changelist'))
+        self.assertContains(response, 'Feedback 4 sehr gut')
+        self.assertNotContains(response, 'sehr gut ' * 20)
+
+    def test_search_matches_message_or_student(self):
+        url = reverse('admin:courses_feedback_changelist')
+        results = self.client.get(url, {'q': 'anna'}).context['cl'].result_list
+        self.assertEqual({f.student_id for f in results}, {self.anna.id})
+        results = self.client.get(url, {'q': 'feedback 3'}).context['cl'].result_list
+        self.assertEqual([f.pk for f in results], [self.feedback[3].pk])
+
+    def test_moderation_queue_keyset_pages(self):
+        url = reverse('admin:courses_feedback_moderation')
+        self.feedback[4].is_approved = True
+        self.feedback[4].save()
+        Feedback.objects.filter(pk=self.feedback[3].pk).update(reviewed_at=timezone.now())
+
+        seen = []
+        response = self.client.get(url)
+        while True:
+            seen += [f.pk for f in response.context['rows']]
+            if not response.context['next_cursor']:
+                break
+            response = self.client.get(url, {'before': response.context['next_cursor']})
+        self.assertEqual(seen, [f.pk for f in reversed(self.feedback[:3])])
+
+        response = self.client.post(url, {'ids': seen[:2], 'decision': 'approve'})
+        self.assertRedirects(response, url)
+        self.assertEqual([f.pk for f in self.client.get(url).context['rows']], seen[2:])
+
+        response = self.client.post(url, {'ids': seen[2:], 'decision': 'aprove'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Feedback.objects.filter(pk__in=seen[2:], reviewed_at__isnull=False).exists())
+
+
+class ResponsiveImageTests(TestCase):
+
+    def render(self, source):
+        return Template('{% load images %}' + source).render(Context())
+
+    def test_picture_from_manifest(self):
+        html = self.render("{% responsive_image 'courses/images/german_logo_1.png' alt='Logo' "
+                           "sizes='44px' class='h-11 w-11' %}")
+        self.assertTrue(html.startswith('<picture><source type="image/avif" srcset="'))
+        self.assertIn('/static/courses/images/responsive/german_logo_1-96.webp 96w', html)
+        self.assertIn('width="478" height="522" alt="Logo" loading="lazy"', html)
+        self.assertIn('class="h-11 w-11"', html)
+        # Every variant in the manifest exists on disk
+        for entry in images.manifest().values():
+            for variants in entry['srcset'].values():
+                for _, name in variants:
+                    self.assertTrue((images.STATIC_DIR / name).exists(), name)
+
+    def test_image_without_variants(self):
+        html = self.render("{% responsive_image 'courses/images/missing.png' alt='x' %}")
+        self.assertEqual(html, '<img src="/static/courses/images/missing.png" alt="x" loading="lazy">')
+
+    def test_navbar_logo_is_not_the_full_png(self):
+        response = self.client.get(reverse('courses:about'))
+        self.assertNotContains(response, 'src="/static/courses/images/german_logo_1.png"')
+        self.assertContains(response, 'german_logo_1-48.avif 48w')
+
+
+class StaticFilesStorageTests(TestCase):
+
+    @override_settings(STATIC_MANIFEST_STRICT=False)
+    def test_plain_url_without_the_manifest(self):
+        self.assertEqual(staticfiles_storage.url('courses/css/missing.css'), '/static/courses/css/missing.css')
+
+    @override_settings(STATIC_MANIFEST_STRICT=True)
+    def test_strict_manifest_raises(self):
+        with self.assertRaisesMessage(ValueError, 'courses/css/missing.css'):
+            staticfiles_storage.url('courses/css/missing.css')
+
+
+class TailwindCSSTests(TestCase):
+
+    def render(self):
+        return Template('{% load tailwind %}{% tailwind_css %}').render(Context())
+
+    @override_settings(TAILWIND_CDN=False)
+    def test_prebuilt_stylesheet(self):
+        with mock.patch.object(tailwind, 'is_built', return_value=True):
+            html = self.render()
+        self.assertEqual(html, '<link rel="stylesheet" href="/static/courses/css/site.css">')
+
+    @override_settings(TAILWIND_CDN=False)
+    def test_missing_build_fails_loudly(self):
+        with mock.patch.object(tailwind, 'is_built', return_value=False):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'run `manage.py build_css`'):
+                self.render()
+            [error] = checks.tailwind_built(None)
+        self.assertEqual(error.id, 'courses.E001')
+        with self.assertRaises(SystemCheckError):
+            call_command('collectstatic', interactive=False, dry_run=True, verbosity=0, skip_checks=False)
+
+    @override_settings(TAILWIND_CDN=True)
+    def test_cdn_switch(self):
+        with mock.patch.object(tailwind, 'is_built', return_value=False):
+            html = self.render()
+            self.assertEqual(checks.tailwind_built(None), [])
+        self.assertIn('<script src="https://cdn.tailwindcss.com"></script>', html)
+        self.assertIn('href="/static/courses/css/style.css"', html)
+
+    def test_build_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            static_dir = os.path.join(tmp, 'static')
+            os.makedirs(os.path.join(static_dir, 'courses', 'css'))
+            with open(os.path.join(static_dir, tailwind.SOURCE_CSS), 'w') as f:
+                f.write('.hero-title { color: red; }')
+            # Stands in for the tailwindcss binary: writes its input and config to the output.
+            cli = os.path.join(tmp, 'tailwindcss')
+            with open(cli, 'w') as f:
+                f.write(f"#!{sys.executable}\nimport sys\nargs = sys.argv[1:]\n"
+                        "parts = [open(args[args.index(flag) + 1]).read() for flag in ('-i', '-c')]\n"
+                        "open(args[args.index('-o') + 1], 'w').write(''.join(parts) + ' '.join(args))\n")
+            os.chmod(cli, 0o755)
+
+            with mock.patch.object(tailwind, 'STATIC_DIR', Path(static_dir)):
+                call_command('build_css', cli=cli, stdout=io.StringIO())
+                self.assertTrue(tailwind.is_built())
+            tailwind.is_built.cache_clear()
+            with open(os.path.join(static_dir, tailwind.OUTPUT_CSS)) as f:
+                css = f.read()
+        self.assertLess(css.index('.hero-title'), css.index('@tailwind utilities'))
+        self.assertIn('templates/courses/**/*.html', css)
+        self.assertIn('courses/**/*.py', css)   # forms.py widget classes
+        self.assertIn('--minify', css)
+
+    def test_missing_cli(self):
+        with self.assertRaisesMessage(CommandError, 'Tailwind CLI not found'):
+            call_command('build_css', cli='/nonexistent/tailwindcss')
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = tmp.name
+        settings_override = override_settings(RETENTION_ARCHIVE_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.course = Course.objects.create(title='German A1', code='A1-01', level='A1',
+                                            duration_weeks=8, description='x')
+        self.students = [Student.objects.create(full_name=f"S{i}", email=f"s{i}@example.com", phone='1')
+                         for i in range(5)]
+        self.long_ago = timezone.now() - timedelta(days=4 * 365)
+
+    def run_command(self, *args, **options):
+        out = io.StringIO()
+        call_command('apply_retention', *args, stdout=out, **options)
+        return out.getvalue()
+
+    def archived(self, name):
+        [path] = [os.path.join(self.archive_dir, f) for f in os.listdir(self.archive_dir)
+                  if f.startswith(name)]
+        with gzip.open(path, 'rt') as f:
+            return [json.loads(line) for line in f]
+
+    def test_registrations_archived_in_batches(self):
+        for student in self.students:
+            enrollment.enroll(student, self.course)
+        Registration.objects.filter(student__in=self.students[:3]).update(registered_at=self.long_ago)
+
+        self.assertIn('registrations: 3 rows due', self.run_command('registrations', dry_run=True))
+        self.assertEqual(Registration.objects.count(), 5)
+
+        output = self.run_command('registrations', batch_size=2)
+        self.assertIn('registrations: deleted 3 rows', output)
+        self.assertEqual(sorted(row['student'] for row in self.archived('registrations')),
+                         [s.pk for s in self.students[:3]])
+        self.assertEqual(Registration.objects.count(), 2)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+        # The daily stats keep the archived registrations
+        self.assertEqual(EnrollmentRollup.objects.get().count, 5)
+
+    def test_freed_seats_go_to_the_waitlist(self):
+        self.course.capacity = 2
+        self.course.save()
+        for student in self.students[:3]:
+            enrollment.enroll(student, self.course)
+        Registration.objects.filter(student=self.students[0]).update(registered_at=self.long_ago)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            retention.apply('registrations')
+        self.assertEqual(Registration.objects.get(student=self.students[2]).status, 'enrolled')
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.enrolled_count, 2)
+        self.assertEqual(enrollment.registration_statuses(self.students[2]), {self.course.id: 'enrolled'})
+
+    @override_settings(SESSION_MODE='signed_cookies')
+    def test_sessions_only_with_database_sessions(self):
+        from django.contrib.sessions.backends.db import SessionStore
+
+        session = SessionStore()
+        session.set_expiry(-60)
+        session.save()
+        self.assertIn('sessions: deleted 0 rows', self.run_command('sessions'))
+        out = io.StringIO()
+        call_command('purge_sessions', stdout=out)
+        self.assertIn('SESSION_MODE=signed_cookies keeps no sessions', out.getvalue())
+
+    def test_interrupted_run_resumes(self):
+        for student in self.students:
+            Registration.objects.create(student=student, course=self.course)
+        Registration.objects.update(registered_at=self.long_ago)
+
+        real_delete = retention.TARGETS['registrations'][2]
+        calls = []
+
+        def failing_delete(queryset, rows):
+            calls.append(len(rows))
+            if len(calls) == 2:
+                raise RuntimeError("killed")
+            return real_delete(queryset, rows)
+
+        target = retention.TARGETS['registrations'][:2] + (failing_delete,)
+        with mock.patch.dict(retention.TARGETS, registrations=target), self.assertRaises(RuntimeError):
+            retention.apply('registrations', batch_size=2)
+        self.assertEqual(Registration.objects.count(), 3)
+
+        deleted, _ = retention.apply('registrations', batch_size=2)
+        self.assertEqual(deleted, 3)
+        self.assertFalse(Registration.objects.exists())
+
+    def test_feedback_keeps_the_moderation_queue(self):
+        reviewed = Feedback.objects.create(student=self.students[0], rating=5, message='Great',
+                                           is_approved=True, reviewed_at=timezone.now())
+        pending = Feedback.objects.create(student=self.students[1], rating=4, message='Good')
+        Feedback.objects.update(created_at=self.long_ago)
+
+        self.run_command('feedback')
+        self.assertEqual(list(Feedback.objects.all()), [pending])
+        self.assertEqual([row['id'] for row in self.archived('feedback')], [reviewed.pk])
+
+    def test_abandoned_signups(self):
+        abandoned = User.objects.create_user(username='gone', password='x')
+        Student.objects.create(user=abandoned, full_name='Gone', email='g@example.com', phone='1')
+        returning = User.objects.create_user(username='back', password='x')
+        returning.last_login = timezone.now()
+        returning.save()
+        enrolled = User.objects.create_user(username='enrolled', password='x')
+        enrollment.enroll(Student.objects.create(user=enrolled, full_name='E', email='e@example.com',
+                                                 phone='1'), self.course)
+        User.objects.update(date_joined=self.long_ago)
+
+        self.run_command('signups')
+        self.assertEqual(set(User.objects.values_list('username', flat=True)), {'back', 'enrolled'})
+        self.assertFalse(Student.objects.filter(full_name='Gone').exists())
+        [row] = self.archived('signups')
+        self.assertEqual((row['username'], row['student']['full_name']), ('gone', 'Gone'))
+        self.assertNotIn('password', row)
+
+    def test_unknown_target(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown target(s): logs.'):
+            self.run_command('logs')
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Course.objects.create(title='German A1', code='A1-01', level='A1', duration_weeks=8, description='x')
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('courses:courses'))
+        timing = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timing), {'db', 'tpl', 'view', 'total'})
+        self.assertIn('desc="1 queries"', timing['db'])
+        self.assertGreater(float(timing['tpl'].removeprefix('dur=')), 0)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_server_timing_header_off(self):
+        self.assertFalse(self.client.get(reverse('courses:courses')).has_header('Server-Timing'))
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_sql(self):
+        with self.assertLogs('courses.performance', 'WARNING') as logs:
+            self.client.get(reverse('courses:courses'))
+        self.assertIn('courses:courses', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_perf_stats_is_staff_only(self):
+        url = reverse('courses:perf_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.get(reverse('courses:about'))
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret123'))
+        stats = self.client.get(url).json()
+        routes = stats['routes']
+        self.assertGreaterEqual(routes['courses:about']['count'], 1)
+        self.assertIn('p99_ms', routes['courses:about'])
+        self.assertEqual(stats['pools'], {})   # SQLite has no connection pool
+
+    def test_pool_stats(self):
+        pool = mock.Mock(**{'get_stats.return_value': {
+            'pool_size': 4, 'pool_available': 1, 'pool_max': 10, 'requests_waiting': 2,
+            'requests_num': 50, 'requests_wait_ms': 125, 'requests_errors': 1,
+        }})
+        with mock.patch.object(type(connections['default']), 'pool', pool, create=True):
+            stats = pool_stats()['default']
+        self.assertEqual(stats, {'in_use': 3, 'idle': 1, 'max_size': 10, 'waiting': 2,
+                                 'requests': 50, 'avg_acquire_ms': 2.5, 'timeouts': 1})
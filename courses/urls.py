@@ -1,11 +1,13 @@
 from django.urls import path
-from . import views
+from . import api, instrumentation, views
 
 app_name = 'courses'
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('courses/', views.courses_list, name='courses'),
+    path('courses/more/', views.courses_more, name='courses_more'),
+    path('courses/search/', views.course_search, name='course_search'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -16,6 +18,9 @@ urlpatterns = [
     path('profile/delete-course/<int:course_id>/', views.delete_course, name='delete_course'),
     path('feedback/', views.give_feedback, name='give_feedback'),
     path('course/<int:course_id>/', views.course_detail, name='course_detail'),
+    path('staff/perf/', instrumentation.perf_stats, name='perf_stats'),
+    path('api/courses/', api.course_list, name='api_courses'),
+    path('api/courses/<int:course_id>/', api.course_detail, name='api_course_detail'),
 
 
 ]
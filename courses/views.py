@@ -1,59 +1,32 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponseBadRequest
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import aauthenticate, alogin, logout
 from django.contrib.auth.models import User
 from .models import Course, Student, Registration, Feedback
 from .forms import UserRegistrationForm, StudentForm, RegistrationForm, FeedbackForm
 from django.conf import settings
-import os
-
-# --- WhatsApp helper functions ---
-def send_whatsapp_via_meta(phone_to_send, message_text):
-    """
-    Example using Meta WhatsApp Cloud API via requests.
-    You must set environment variables:
-      WHATSAPP_PHONE_NUMBER_ID, WHATSAPP_ACCESS_TOKEN, OWNER_WHATSAPP_NUMBER
-    """
-    import requests, json
-    phone_id = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')  # e.g. '1234567890'
-    token = os.environ.get('WHATSAPP_ACCESS_TOKEN')
-    if not phone_id or not token:
-        print("WhatsApp Meta credentials missing.")
-        return False
-    url = f"https://graph.facebook.com/v17.0/{phone_id}/messages"
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    payload = {
-        "messaging_product": "whatsapp",
-        "to": phone_to_send,
-        "type": "text",
-        "text": {"body": message_text}
-    }
-    resp = requests.post(url, headers=headers, json=payload)
-    return resp.status_code in (200, 201)
-
-
-def send_whatsapp_via_twilio(to_number, message_text):
-    # Using Twilio's Python helper
-    from twilio.rest import Client
-    tw_sid = os.environ.get('TWILIO_ACCOUNT_SID')
-    tw_token = os.environ.get('TWILIO_AUTH_TOKEN')
-    tw_from = os.environ.get('TWILIO_WHATSAPP_FROM')  # e.g. 'whatsapp:+1415XXXXXXX'
-    if not (tw_sid and tw_token and tw_from):
-        print("Twilio config missing")
-        return False
-    client = Client(tw_sid, tw_token)
-    msg = client.messages.create(body=message_text, from_=tw_from, to=f"whatsapp:{to_number}")
-    return msg.sid is not None
+from django.db.models import Value
+from django.db.models.functions import Upper
+from asgiref.sync import sync_to_async
+from .notifications import aqueue_owner_notification
+from . import catalog, enrollment, search
+from .ratelimit import rate_limit_auth
 
 # --- views ---
+# home, courses_list, course_detail, register_view and login_view are async: under ASGI
+# (german_school/asgi.py) a worker keeps serving other requests while they
+# wait on the database or the WhatsApp API. Under WSGI Django runs them
+# synchronously as before. They must not touch lazy per-request data
+# (request.user, request.enrolled_course_ids) without awaiting it first.
 from .models import Feedback
 
-def home(request):
-    latest_courses = Course.objects.all()[:6]   # your existing logic
-    enrolled_ids = []  # if you have this
+async def home(request):
+    # Shared catalog parts come from the cache (see courses/catalog.py)
+    latest_course_cards = await catalog.aget_latest_course_cards()
 
     # Load approved testimonials
-    testimonials = Feedback.objects.filter(is_approved=True).order_by('-created_at')[:6]
+    testimonials = await catalog.aget_testimonials()
 
     levels = [
         ('A1', 'Beginner A1'),
@@ -63,54 +36,80 @@ def home(request):
     ]
 
     context = {
-        'latest_courses': latest_courses,
-        'enrolled_ids': enrolled_ids,
+        'latest_course_cards': latest_course_cards,
         'levels': levels,
         'testimonials': testimonials,
+        'enrolled_course_ids': await request.aenrolled_course_ids(),
     }
     return render(request, 'courses/home.html', context)
 
 
-def courses_list(request):
-    selected_level = request.GET.get('level')
-    courses = Course.objects.all()
+# LEVEL TABS for the courses page UI
+COURSE_LEVEL_TABS = [
+    ('A1', 'A1 Beginner'),
+    ('A2', 'A2 Elementary'),
+    ('B1', 'B1 Intermediate'),
+    ('B2', 'B2 Upper Intermediate'),
+]
 
-    # Apply level filter
-    if selected_level:
-        courses = courses.filter(level=selected_level)
 
-    filter_applied = bool(selected_level)
+def _course_page_params(request):
+    """Validated (level, cursor) from the query string; level is False if unknown."""
+    level = request.GET.get('level') or None
+    if level and level not in dict(Course.LEVELS):
+        level = False
+    return level, catalog.decode_cursor(request.GET.get('after'))
 
-    # Fetch enrolled courses for logged-in student
-    enrolled_course_ids = []
-    if request.user.is_authenticated:
-        student = Student.objects.filter(user=request.user).first()
-        if student:
-            enrolled_course_ids = list(
-                Registration.objects.filter(student=student).values_list('course_id', flat=True)
-            )
 
-    # LEVEL TABS for the UI
-    levels = [
-        ('A1', 'A1 Beginner'),
-        ('A2', 'A2 Elementary'),
-        ('B1', 'B1 Intermediate'),
-        ('B2', 'B2 Upper Intermediate'),
-    ]
+async def courses_list(request):
+    selected_level = request.GET.get('level')
+    level, after = _course_page_params(request)
+
+    # Apply level filter; an unknown level matches nothing, so skip the query and cache key
+    if level is False:
+        course_cards, next_cursor = [], None
+    else:
+        course_cards, next_cursor = await catalog.aget_course_page(level, after)
+
+    filter_applied = bool(selected_level)
 
     return render(request, 'courses/courses.html', {
-        'courses': courses,
-        'levels': levels,                   # ⭐ Required for the tab buttons
+        'course_cards': course_cards,
+        'next_cursor': next_cursor,
+        'levels': COURSE_LEVEL_TABS,        # ⭐ Required for the tab buttons
         'selected_level': selected_level,
         'filter_applied': filter_applied,
-        'enrolled_course_ids': enrolled_course_ids,
+        'enrolled_course_ids': await request.aenrolled_course_ids(),
+    })
+
+
+def courses_more(request):
+    """Next batch of course cards for infinite scroll on the courses page."""
+    level, after = _course_page_params(request)
+    if level is False or after is None:
+        return HttpResponseBadRequest("Invalid level or cursor.")
+
+    course_cards, next_cursor = catalog.get_course_page(level, after)
+    response = render(request, 'courses/partials/course_cards.html', {
+        'course_cards': course_cards,
     })
+    response['X-Next-Cursor'] = next_cursor or ''
+    return response
 
 
+def course_search(request):
+    query = request.GET.get('q', '').strip()
+    courses = search.search_courses(query)
 
+    return render(request, 'courses/courses.html', {
+        'course_cards': catalog.render_course_cards(courses),
+        'search_query': query,
+        'levels': COURSE_LEVEL_TABS,
+    })
 
 
-def register_view(request):
+@rate_limit_auth('register')
+async def register_view(request):
     if request.method == 'POST':
         # Extract POST data manually (since we are not using Django forms on UI)
         username = request.POST.get('username')
@@ -131,22 +130,24 @@ def register_view(request):
             return redirect('courses:register')
 
         # Create Django user
-        if User.objects.filter(username=username).exists():
+        if await User.objects.filter(username=username).aexists():
             messages.error(request, "Username already taken.")
             return redirect('courses:register')
 
-        if User.objects.filter(email=email).exists():
+        # Case-insensitive, backed by the auth_user_email_upper_idx index
+        if await User.objects.alias(email_upper=Upper('email')).filter(
+                email_upper=Upper(Value(email))).aexists():
             messages.error(request, "Email already registered.")
             return redirect('courses:register')
 
-        user = User.objects.create_user(
+        user = await User.objects.acreate_user(
             username=username,
             password=password,
             email=email
         )
 
         # Create Student profile
-        student = Student.objects.create(
+        student = await Student.objects.acreate(
             user=user,
             full_name=full_name,
             email=email,
@@ -157,24 +158,22 @@ def register_view(request):
         registration = None
         if course_id:
             try:
-                course = Course.objects.get(id=course_id)
-                registration = Registration.objects.create(
-                    student=student,
-                    course=course
-                )
+                course = await Course.objects.aget(id=course_id)
+                # Seat accounting is transactional, so it runs on a thread
+                registration, _ = await sync_to_async(enrollment.enroll)(student, course)
             except Course.DoesNotExist:
                 pass  # Ignore if invalid course ID
 
-        # WhatsApp notification to owner
-        owner_whatsapp = os.environ.get('OWNER_WHATSAPP_NUMBER')
-
+        # WhatsApp notification to owner (queued; sent by `manage.py send_notifications`,
+        # or right away with NOTIFICATION_SEND_INLINE)
         if registration:
             message_text = (
                 f"New registration:\n"
                 f"Name: {student.full_name}\n"
                 f"Email: {student.email}\n"
                 f"Phone: {student.phone}\n"
-                f"Course: {registration.course.title} ({registration.course.code})\n"
+                f"Course: {registration.course.title} ({registration.course.code})"
+                f"{' - waitlisted' if registration.status == 'waitlisted' else ''}\n"
                 f"Registered at: {registration.registered_at}"
             )
         else:
@@ -185,18 +184,13 @@ def register_view(request):
                 f"Phone: {student.phone}"
             )
 
-        sent = False
-        if owner_whatsapp:
-            if os.environ.get('WHATSAPP_ACCESS_TOKEN'):
-                sent = send_whatsapp_via_meta(owner_whatsapp, message_text)
-            elif os.environ.get('TWILIO_ACCOUNT_SID'):
-                sent = send_whatsapp_via_twilio(owner_whatsapp, message_text)
+        await aqueue_owner_notification(message_text)
 
         messages.success(request, "Registration successful! You can now login.")
         return redirect('courses:login')
 
     # GET request
-    courses = Course.objects.all()  # For dropdown
+    courses = [c async for c in Course.objects.only('id', 'title', 'level')]  # For dropdown
     return render(request, 'courses/register.html', {
         "courses": courses
     })
@@ -204,13 +198,15 @@ def register_view(request):
 
 from django.contrib.auth.decorators import login_required
 
-def login_view(request):
+# Async so the password hash runs on a thread while the event loop keeps serving
+@rate_limit_auth('login', by_username=True)
+async def login_view(request):
     if request.method == 'POST':
         uname = request.POST.get('username')
         pw = request.POST.get('password')
-        user = authenticate(request, username=uname, password=pw)
+        user = await aauthenticate(request, username=uname, password=pw)
         if user:
-            login(request, user)
+            await alogin(request, user)
             messages.success(request, f"Welcome back, {user.username}!")
             return redirect('courses:home')
         else:
@@ -227,13 +223,23 @@ def logout_view(request):
 @login_required
 def select_course(request, course_id):
     course = get_object_or_404(Course, pk=course_id)
-    student = Student.objects.filter(user=request.user).first()
+    student = request.student
     if not student:
         messages.error(request, "You need to complete your student profile first.")
         return redirect('courses:register')
 
-    Registration.objects.create(student=student, course=course)
-    messages.success(request, f"You have successfully selected {course.title}.")
+    # enroll() + the unique (student, course) constraint makes double-clicks harmless
+    registration, created = enrollment.enroll(student, course)
+    if registration.status == 'waitlisted':
+        if created:
+            position = enrollment.waitlist_position(registration)
+            messages.info(request, f"{course.title} is full. You are number {position} on the waitlist.")
+        else:
+            messages.info(request, f"You are already on the waitlist for {course.title}.")
+    elif created:
+        messages.success(request, f"You have successfully selected {course.title}.")
+    else:
+        messages.info(request, f"You are already enrolled in {course.title}.")
     return redirect('courses:courses')
 
 
@@ -250,8 +256,8 @@ def contact(request):
 
 @login_required
 def profile_view(request):
-    student = Student.objects.filter(user=request.user).first()
-    registrations = Registration.objects.filter(student=student)
+    student = request.student
+    registrations = Registration.objects.filter(student=student).select_related('course')
 
     if request.method == 'POST':
         form = StudentForm(request.POST, instance=student)
@@ -273,10 +279,11 @@ def profile_view(request):
 
 @login_required
 def delete_course(request, course_id):
-    student = Student.objects.filter(user=request.user).first()
+    student = request.student
     registration = Registration.objects.filter(student=student, course_id=course_id).first()
     if registration:
-        registration.delete()
+        registration.delete()   # frees the seat for the waitlist (courses/signals.py)
+        enrollment.store_statuses(student.pk)
         messages.info(request, "Course removed successfully.")
     else:
         messages.error(request, "Course not found or already deleted.")
@@ -285,14 +292,14 @@ def delete_course(request, course_id):
 
 @login_required
 def give_feedback(request):
-    student = Student.objects.filter(user=request.user).first()
+    student = request.student
 
     if not student:
         messages.error(request, "You must complete your profile to give feedback.")
         return redirect('courses:profile')
 
     # Must be enrolled to give feedback
-    if not Registration.objects.filter(student=student).exists():
+    if not request.enrolled_course_ids:
         messages.error(request, "Enroll in a course before giving feedback.")
         return redirect('courses:profile')
 
@@ -310,16 +317,15 @@ def give_feedback(request):
     return render(request, 'courses/feedback_form.html', {'form': form})
 
 
-def course_detail(request, course_id):
-    course = get_object_or_404(Course, id=course_id)
+async def course_detail(request, course_id):
+    course = await aget_object_or_404(Course, id=course_id)
 
-    is_enrolled = False
-    if request.user.is_authenticated:
-        student = Student.objects.filter(user=request.user).first()
-        if student:
-            is_enrolled = Registration.objects.filter(student=student, course=course).exists()
+    # From the per-student cache: no query on a hit
+    statuses = await enrollment.aregistration_statuses(request.student)
+    status = statuses.get(course.id)
 
     return render(request, 'courses/course_detail.html', {
         'course': course,
-        'is_enrolled': is_enrolled
+        'is_enrolled': status == 'enrolled',
+        'is_waitlisted': status == 'waitlisted',
     })
@@ -5,6 +5,20 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serving with uvicorn workers under gunicorn (same process management as the
+WSGI deployment, but home, courses, course_detail and register are async and
+no longer hold a worker while they wait):
+
+    DB_CONN_MAX_AGE=0 gunicorn german_school.asgi:application \
+        -k uvicorn.workers.UvicornWorker -w 4
+
+DB_CONN_MAX_AGE=0 because ASGI runs each request's database work on its own
+thread, so persistent connections would pile up instead of being reused.
+NOTIFICATION_SEND_INLINE=True additionally sends the registration WhatsApp
+message from the event loop instead of waiting for `send_notifications`.
+Compare against WSGI with `python -m benchmarks.load --server gunicorn` and
+`--server gunicorn-uvicorn` at the same --workers.
 """
 
 import os
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 import dj_database_url
 
@@ -7,6 +8,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret")
 DEBUG = os.environ.get("DEBUG", "True") == "True"
+TESTING = sys.argv[1:2] == ['test']
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", "german-school-i0n7.onrender.com,localhost,127.0.0.1").split(",")
 
 # APPS
@@ -29,12 +31,23 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',   # added for Render
+    'courses.instrumentation.RequestTimingMiddleware',   # Server-Timing + slow-request log
+    'courses.routers.ReplicaPinMiddleware',          # read-your-writes with DATABASE_REPLICA_URLS
 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'courses.middleware.StudentMiddleware',          # request.student / request.enrolled_course_ids
+]
+
+# AUTH — loads the Student profile together with the session user. ModelBackend
+# stays listed: sessions created before StudentBackend name it, and a backend
+# missing from this list logs them out.
+AUTHENTICATION_BACKENDS = [
+    'courses.backends.StudentBackend',
+    'django.contrib.auth.backends.ModelBackend',
 ]
 
 # URL + WSGI
@@ -44,7 +57,7 @@ WSGI_APPLICATION = 'german_school.wsgi.application'
 # TEMPLATES
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'courses.instrumentation.TimedDjangoTemplates',   # DjangoTemplates + render timing
         'DIRS': [ BASE_DIR / 'courses' / 'templates' ],
         'APP_DIRS': True,
         'OPTIONS': { 'context_processors': [
@@ -52,21 +65,142 @@ TEMPLATES = [
             'django.template.context_processors.request',
             'django.contrib.auth.context_processors.auth',
             'django.contrib.messages.context_processors.messages',
+            'courses.context_processors.student',
         ], },
     },
 ]
 
-# DATABASE — Uses Railway DATABASE_URL automatically
+# DATABASE — Uses Railway DATABASE_URL automatically.
+# Under ASGI set DB_CONN_MAX_AGE=0: connections are per thread there and are not reused.
+# DB_POOL_MODE (PostgreSQL only):
+#   persistent (default)  one connection per worker thread, kept for DB_CONN_MAX_AGE
+#   pool                  Django's psycopg 3 pool per process (DB_POOL_MIN_SIZE,
+#                         DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT seconds to wait for a connection)
+#   pgbouncer             behind PgBouncer in transaction mode: no server-side cursors, so
+#                         .iterator() exports buffer each query's rows on the client;
+#                         send_announcements (session advisory lock) refuses to run, give it
+#                         DB_POOL_MODE=persistent and a DATABASE_URL that bypasses PgBouncer
+# DB_CONN_HEALTH_CHECKS pings reused connections before a request uses them, so a database
+# restart doesn't fail the first request on each worker.
+# SQLite transactions start IMMEDIATE, so concurrent writers (enrollments) wait for the
+# lock instead of failing with "database is locked" when a read is upgraded to a write.
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", "600"))
+DB_CONN_HEALTH_CHECKS = os.environ.get("DB_CONN_HEALTH_CHECKS", "True") == "True"
+DB_POOL_MODE = os.environ.get("DB_POOL_MODE", "persistent")
+
+
+def _database(url):
+    config = dj_database_url.parse(url, conn_max_age=DB_CONN_MAX_AGE,
+                                   conn_health_checks=DB_CONN_HEALTH_CHECKS)
+    if 'sqlite' in config['ENGINE']:
+        config.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+    if 'postgresql' not in config['ENGINE']:
+        return config
+    if DB_POOL_MODE == 'pool':
+        config['CONN_MAX_AGE'] = 0   # the pool owns connection lifetime
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            'max_size': int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            'timeout': float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        }
+    elif DB_POOL_MODE == 'pgbouncer':
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
+
+
 DATABASES = {
-    'default': dj_database_url.parse(
-        os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR/'db.sqlite3'}"),
-        conn_max_age=600
-    )
+    'default': _database(os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR/'db.sqlite3'}")),
 }
 
+# READ REPLICAS — optional comma-separated DATABASE_REPLICA_URLS, added as replica1, replica2...
+# Course/Feedback reads go to them, except right after a write (see courses/routers.py).
+# Replication itself is the database's job; to try it locally with SQLite, copy db.sqlite3
+# to replica.sqlite3 and set DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3.
+REPLICA_DATABASES = []
+for _n, _url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), 1):
+    DATABASES[f"replica{_n}"] = {**_database(_url.strip()), 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f"replica{_n}")
+DATABASE_ROUTERS = ['courses.routers.ReplicaRouter'] if REPLICA_DATABASES else []
+REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", "10"))
+
+# CACHE — locmem by default. With several gunicorn workers point this at a shared
+# backend (e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache,
+# CACHE_LOCATION=redis://...) so catalog and enrollment invalidation reaches every worker.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+
+# SESSIONS — SESSION_MODE picks where sessions live:
+#   db (default)    one session query per request, nothing else to run
+#   cached_db       reads from the default cache, writes through to the DB. Only with a
+#                   cache shared by all workers (Redis/Memcached), or a logout on one
+#                   worker stays invisible to the others
+#   cache           cache only; sessions are lost when the cache evicts or restarts
+#   signed_cookies  no server storage; the session can't be revoked server-side before
+#                   it expires, so keep SESSION_COOKIE_AGE short
+# db and cached_db need `manage.py purge_sessions` run periodically.
+SESSION_MODE = os.environ.get("SESSION_MODE", "db")
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+SESSION_COOKIE_AGE = int(os.environ.get("SESSION_COOKIE_AGE", str(60 * 60 * 24 * 14)))
+
+# MESSAGES — MESSAGE_STORAGE_MODE: cookie (default; never touches the session),
+# session, or fallback (cookie, spilling into the session when too big).
+MESSAGE_STORAGE = {
+    'cookie': 'django.contrib.messages.storage.cookie.CookieStorage',
+    'session': 'django.contrib.messages.storage.session.SessionStorage',
+    'fallback': 'django.contrib.messages.storage.fallback.FallbackStorage',
+}[os.environ.get("MESSAGE_STORAGE_MODE", "cookie")]
+
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", "300"))
+ENROLLMENT_CACHE_TIMEOUT = int(os.environ.get("ENROLLMENT_CACHE_TIMEOUT", "3600"))   # per student
+COURSES_PAGE_SIZE = int(os.environ.get("COURSES_PAGE_SIZE", "24"))
+SEARCH_RESULTS_LIMIT = int(os.environ.get("SEARCH_RESULTS_LIMIT", "50"))
+MODERATION_PAGE_SIZE = int(os.environ.get("MODERATION_PAGE_SIZE", "50"))   # admin feedback queue
+
+# JSON API (courses/api.py) — seconds clients (max-age) and CDNs (s-maxage) may reuse a
+# response; after that they revalidate with If-None-Match and usually get a 304.
+API_MAX_AGE = int(os.environ.get("API_MAX_AGE", "60"))
+API_CDN_MAX_AGE = int(os.environ.get("API_CDN_MAX_AGE", "300"))
+
 # PASSWORD SETTINGS
 AUTH_PASSWORD_VALIDATORS = []
 
+# PASSWORD HASHING — PASSWORD_HASHER picks the hasher for new passwords: pbkdf2, scrypt,
+# or argon2 (needs argon2-cffi). Stored hashes are upgraded on the next successful login
+# when the hasher or its cost changes (see courses/hashers.py).
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "pbkdf2")
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", "1000000"))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get("PASSWORD_SCRYPT_WORK_FACTOR", str(2 ** 14)))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get("PASSWORD_ARGON2_TIME_COST", "2"))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", "102400"))  # KiB
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'courses.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'courses.hashers.ScryptPasswordHasher',
+    'argon2': 'courses.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+
+# AUTH RATE LIMITS — token buckets checked before any password hashing (courses/ratelimit.py).
+# "N/s", "N/m" or "N/h"; empty disables.
+AUTH_RATE_LIMIT_IP = os.environ.get("AUTH_RATE_LIMIT_IP", "20/m")
+AUTH_RATE_LIMIT_USERNAME = os.environ.get("AUTH_RATE_LIMIT_USERNAME", "5/m")
+# TRUSTED_PROXY_COUNT — reverse proxies in front of the app that append to X-Forwarded-For.
+# The client IP is the entry the outermost trusted proxy added; with 0 it is REMOTE_ADDR.
+# Render (which sets RENDER=true) has one, so that is the default there: with 0, every
+# request would come from the proxy and share one IP bucket. Keep 0 with no proxy in
+# front, or clients can pick their own IP by sending the header.
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", "1" if os.environ.get("RENDER") else "0"))
+
 # TIME + LANG
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Kolkata'
@@ -78,7 +212,80 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [ BASE_DIR / 'courses' / 'static' ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Hashed, pre-compressed files (Django 5.1 dropped the old STATICFILES_STORAGE setting)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'courses.storage.StaticFilesStorage'},
+}
+# STATIC_MANIFEST_STRICT: a static file missing from collectstatic's manifest is an error
+# rather than served unhashed (and uncached). Off with DEBUG and under `manage.py test`,
+# which run without collectstatic.
+STATIC_MANIFEST_STRICT = os.environ.get("STATIC_MANIFEST_STRICT", str(not (DEBUG or TESTING))) == "True"
+
+# TAILWIND — production serves courses/css/site.css built by `manage.py build_css` (build.sh,
+# Render's build command, runs it before collectstatic; TAILWIND_CLI is the standalone
+# tailwindcss v3 binary). TAILWIND_CDN=True, the default with DEBUG, compiles in the browser
+# instead so template edits show up at once. With it off, a missing site.css fails the
+# courses.E001 check (collectstatic, check) and the {% tailwind_css %} tag.
+TAILWIND_CDN = os.environ.get("TAILWIND_CDN", str(DEBUG)) == "True"
+TAILWIND_CLI = os.environ.get("TAILWIND_CLI", "tailwindcss")
+
+# RESPONSIVE IMAGES — widths `manage.py build_images` writes for {% responsive_image %}
+RESPONSIVE_IMAGE_WIDTHS = [48, 96, 160, 320, 640, 1280]
 
 # Django default IDs
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# WHATSAPP NOTIFICATIONS — queued in courses.Notification, sent by `manage.py send_notifications`
+WHATSAPP_API_BASE = os.environ.get("WHATSAPP_API_BASE", "https://graph.facebook.com/v17.0")
+TWILIO_API_BASE = os.environ.get("TWILIO_API_BASE", "https://api.twilio.com/2010-04-01")
+NOTIFICATION_TIMEOUT = float(os.environ.get("NOTIFICATION_TIMEOUT", "10"))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get("NOTIFICATION_BATCH_SIZE", "50"))
+NOTIFICATION_WORKERS = int(os.environ.get("NOTIFICATION_WORKERS", "4"))
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get("NOTIFICATION_MAX_ATTEMPTS", "5"))
+NOTIFICATION_RETRY_BASE_SECONDS = int(os.environ.get("NOTIFICATION_RETRY_BASE_SECONDS", "30"))
+NOTIFICATION_RETRY_MAX_SECONDS = int(os.environ.get("NOTIFICATION_RETRY_MAX_SECONDS", "3600"))
+# Also send straight from the async register view (ASGI deployments only; see german_school/asgi.py)
+NOTIFICATION_SEND_INLINE = os.environ.get("NOTIFICATION_SEND_INLINE", "False") == "True"
+
+# ANNOUNCEMENTS — `manage.py send_announcements` fans a course announcement out to its
+# registrations in chunks and sends them over aiohttp, at most ANNOUNCEMENT_CONCURRENCY in
+# flight and at most ANNOUNCEMENT_RATE_LIMITS messages per second per provider (keep these
+# under the account's Meta / Twilio throughput limits).
+ANNOUNCEMENT_CHUNK_SIZE = int(os.environ.get("ANNOUNCEMENT_CHUNK_SIZE", "500"))
+ANNOUNCEMENT_CONCURRENCY = int(os.environ.get("ANNOUNCEMENT_CONCURRENCY", "20"))
+ANNOUNCEMENT_RATE_LIMITS = {
+    'meta': float(os.environ.get("ANNOUNCEMENT_META_RATE", "20")),
+    'twilio': float(os.environ.get("ANNOUNCEMENT_TWILIO_RATE", "20")),
+}
+
+# RETENTION — `manage.py apply_retention` archives rows older than RETENTION_DAYS (see
+# courses/retention.py) to gzipped JSONL in RETENTION_ARCHIVE_DIR, then deletes them in
+# primary-key batches of RETENTION_BATCH_SIZE. Expired sessions are deleted without an archive.
+RETENTION_ARCHIVE_DIR = os.environ.get("RETENTION_ARCHIVE_DIR", str(BASE_DIR / "archive"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "1000"))
+RETENTION_DAYS = {
+    'feedback': int(os.environ.get("RETENTION_FEEDBACK_DAYS", str(2 * 365))),
+    'registrations': int(os.environ.get("RETENTION_REGISTRATION_DAYS", str(3 * 365))),
+    'signups': int(os.environ.get("RETENTION_SIGNUP_DAYS", "30")),   # never logged in
+}
+
+# PERFORMANCE INSTRUMENTATION — see courses/instrumentation.py
+# SERVER_TIMING_HEADER shows query counts and timings to every client: off unless DEBUG.
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", str(DEBUG)) == "True"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+INSTRUMENTATION_SAMPLES = int(os.environ.get("INSTRUMENTATION_SAMPLES", "1000"))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'courses': {'handlers': ['console'], 'level': os.environ.get("COURSES_LOG_LEVEL", "INFO")},
+    },
+}
+if TESTING:
+    # Cold caches make some test requests slow; the tests of the log capture it themselves.
+    LOGGING['loggers']['courses.performance'] = {'level': 'ERROR'}